@@ -0,0 +1,171 @@
+import os
+import time
+from contextlib import contextmanager
+
+from bulk import IDS_SUBQUERY, id_list
+from maintenance import connect_db
+
+
+ARCHIVE_FILE_NAME = "archive.db"
+ARCHIVE_SEARCH_LIMIT = 200
+ARCHIVE_BATCH_SIZE = 200
+ARCHIVE_AFTER_DAYS_CHOICES = (
+    (0, "Никогда"),
+    (90, "3 месяца"),
+    (180, "Полгода"),
+    (365, "Год"),
+    (730, "2 года"),
+)
+
+# Таблицы, строки которых переезжают в архив вместе с заметкой: (таблица, столбец с id заметки, первичный ключ)
+ARCHIVE_TABLES = (
+    ("notes", "id", "id INTEGER PRIMARY KEY"),
+    ("note_revisions", "note_id", "id INTEGER PRIMARY KEY"),
+    ("note_tags", "note_id", None),
+)
+
+
+def archive_path_for(db_file):
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), ARCHIVE_FILE_NAME)
+
+
+def archive_exists(db_file):
+    return os.path.exists(archive_path_for(db_file))
+
+
+def _columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _sync_archive_table(conn, table, primary_key):
+    """Создаёт таблицу в архиве по образцу основной и добавляет столбцы, появившиеся в основной позже"""
+    main_columns = [(row[1], row[2]) for row in conn.execute(f"PRAGMA main.table_info({table})")]
+    archive_columns = set(_columns(conn, "archive", table))
+    if not archive_columns:
+        definitions = [primary_key] if primary_key else []
+        key_name = primary_key.split()[0] if primary_key else None
+        definitions += [f"{name} {column_type}" for name, column_type in main_columns if name != key_name]
+        if table == "notes":
+            definitions.append("archived_ts INTEGER")
+        elif table == "note_tags":
+            definitions.append("PRIMARY KEY (tag_id, note_id)")
+        conn.execute(f"CREATE TABLE archive.{table} ({', '.join(definitions)})")
+        return
+    for name, column_type in main_columns:
+        if name not in archive_columns:
+            conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {name} {column_type}")
+
+
+@contextmanager
+def attached_archive(db_file):
+    """
+    Соединение с основной базой, к которой подключён архив (схема archive). Архив подключается
+    только на время операции, поэтому обычные запросы списка и резервные копии его не касаются.
+    Основная база работает в режиме журнала отката, и транзакция над обеими базами атомарна.
+    """
+    conn = connect_db(db_file)
+    try:
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_path_for(db_file),))
+        for table, column, primary_key in ARCHIVE_TABLES:
+            _sync_archive_table(conn, table, primary_key)
+        conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_notes_archived ON notes(archived_ts)")
+        conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_revisions_note ON note_revisions(note_id, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_note_tags_note ON note_tags(note_id)")
+        conn.commit()
+        yield conn
+    finally:
+        conn.close()
+
+
+def _move_rows(conn, source, target, note_ids, extra=None):
+    """Копирует строки заметок note_ids из схемы source в target и удаляет их из source"""
+    ids = id_list(note_ids)
+    for table, column, primary_key in ARCHIVE_TABLES:
+        target_columns = set(_columns(conn, target, table))
+        columns = [name for name in _columns(conn, source, table) if name in target_columns]
+        column_list = ", ".join(columns)
+        if extra and table == "notes":
+            conn.execute(f"""
+                INSERT OR REPLACE INTO {target}.{table} ({column_list}, {extra[0]})
+                SELECT {column_list}, ? FROM {source}.{table} WHERE {column} IN ({IDS_SUBQUERY})
+            """, (extra[1], ids))
+        elif table == "note_tags" and target == "main":
+            # Связи с тегами, удалёнными после архивации, не восстанавливаются
+            conn.execute(f"""
+                INSERT OR IGNORE INTO main.note_tags ({column_list})
+                SELECT {column_list} FROM archive.note_tags
+                WHERE note_id IN ({IDS_SUBQUERY}) AND tag_id IN (SELECT id FROM main.tags)
+            """, (ids,))
+        else:
+            conn.execute(f"""
+                INSERT OR REPLACE INTO {target}.{table} ({column_list})
+                SELECT {column_list} FROM {source}.{table} WHERE {column} IN ({IDS_SUBQUERY})
+            """, (ids,))
+    for table, column, primary_key in reversed(ARCHIVE_TABLES):
+        conn.execute(f"DELETE FROM {source}.{table} WHERE {column} IN ({IDS_SUBQUERY})", (ids,))
+
+
+def archive_notes(conn, note_ids, exclude=(), accessed_before=None):
+    """
+    Переносит заметки с историей и тегами в архив одной транзакцией; возвращает перенесённые id.
+    Заметки из exclude не переносятся. Если задан accessed_before, условие «давно не открывалась»
+    проверяется заново внутри транзакции — заметку могли открыть, пока искались кандидаты.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    condition = f"id IN ({IDS_SUBQUERY}) AND id NOT IN ({IDS_SUBQUERY})"
+    params = [id_list(note_ids), id_list(exclude)]
+    if accessed_before is not None:
+        condition += " AND pinned = 0 AND accessed_ts < ?"
+        params.append(accessed_before)
+    cursor = conn.execute(f"SELECT id FROM main.notes WHERE {condition}", params)
+    note_ids = [row[0] for row in cursor.fetchall()]
+    if note_ids:
+        _move_rows(conn, "main", "archive", note_ids, extra=("archived_ts", int(time.time())))
+    conn.commit()
+    return note_ids
+
+
+def restore_notes(conn, note_ids):
+    """
+    Возвращает заметки из архива в основную базу. Заметки, id которых уже есть в основной базе
+    (например, после восстановления старой резервной копии), остаются в архиве.
+    """
+    cursor = conn.execute(f"""
+        SELECT id FROM archive.notes
+        WHERE id IN ({IDS_SUBQUERY}) AND id NOT IN (SELECT id FROM main.notes)
+    """, (id_list(note_ids),))
+    note_ids = [row[0] for row in cursor.fetchall()]
+    if note_ids:
+        _move_rows(conn, "archive", "main", note_ids)
+    conn.commit()
+    return note_ids
+
+
+def stale_cutoff(days):
+    return int(time.time()) - days * 24 * 60 * 60
+
+
+def stale_note_ids(conn, days):
+    """Незакреплённые заметки, которые не открывались дольше days дней"""
+    cursor = conn.execute("SELECT id FROM notes WHERE pinned = 0 AND accessed_ts < ?", (stale_cutoff(days),))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def search_archive(db_file, text="", limit=ARCHIVE_SEARCH_LIMIT):
+    """Ищет в архиве по заголовку и простому тексту: [(id, title, archived_ts, modified_ts), ...]"""
+    if not archive_exists(db_file):
+        return []
+    pattern = f"%{text.strip()}%"
+    with attached_archive(db_file) as conn:
+        return conn.execute("""
+            SELECT id, title, archived_ts, modified_ts FROM archive.notes
+            WHERE title LIKE ? OR plain_text LIKE ?
+            ORDER BY archived_ts DESC, id DESC
+            LIMIT ?
+        """, (pattern, pattern, limit)).fetchall()
+
+
+def get_archived_content(db_file, note_id):
+    with attached_archive(db_file) as conn:
+        row = conn.execute("SELECT content FROM archive.notes WHERE id = ?", (note_id,)).fetchone()
+    return row[0] if row else None
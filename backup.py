@@ -0,0 +1,189 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from archive import archive_path_for
+
+
+BACKUP_DIR_NAME = "backups"
+BACKUP_PREFIX = "notes-"
+ARCHIVE_BACKUP_PREFIX = "archive-"
+BACKUP_PAGES = 64
+BACKUP_STEP_SLEEP = 0.005
+BACKUP_GENERATIONS = 7
+BACKUP_INTERVAL_MINUTES = 60
+
+_backup_lock = threading.Lock()
+
+
+def backup_dir_for(db_file):
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), BACKUP_DIR_NAME)
+
+
+def list_backups(backup_dir, prefix=BACKUP_PREFIX):
+    """Возвращает список резервных копий (путь, время, размер) — от новых к старым"""
+    if not os.path.isdir(backup_dir):
+        return []
+
+    backups = []
+    for name in os.listdir(backup_dir):
+        if not name.startswith(prefix) or not (name.endswith(".db") or name.endswith(".db.gz")):
+            continue
+        path = os.path.join(backup_dir, name)
+        stat = os.stat(path)
+        backups.append({"path": path, "name": name, "mtime": stat.st_mtime, "size": stat.st_size})
+    backups.sort(key=lambda b: b["name"], reverse=True)
+    return backups
+
+
+def rotate_backups(backup_dir, keep=BACKUP_GENERATIONS, prefix=BACKUP_PREFIX):
+    for old_backup in list_backups(backup_dir, prefix)[keep:]:
+        try:
+            os.remove(old_backup["path"])
+        except OSError as e:
+            print(f"Не удалось удалить старую резервную копию {old_backup['name']}: {e}")
+
+
+def quick_check(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        result = conn.execute("PRAGMA quick_check").fetchone()
+        return bool(result) and result[0] == "ok"
+    finally:
+        conn.close()
+
+
+def create_backup(db_file, backup_dir=None, pages=BACKUP_PAGES, step_sleep=BACKUP_STEP_SLEEP,
+                  compress=True, keep=BACKUP_GENERATIONS, prefix=BACKUP_PREFIX):
+    """
+    Делает онлайн-копию базы через sqlite3.Connection.backup небольшими порциями страниц
+    с паузами между ними, чтобы не мешать автосохранению. Имя копии начинается с prefix.
+
+    Returns:
+        dict: Сведения о копии (путь, длительность, число страниц, шагов и перезапусков, размер, результат проверки)
+    """
+    backup_dir = backup_dir or backup_dir_for(db_file)
+    os.makedirs(backup_dir, exist_ok=True)
+
+    if not _backup_lock.acquire(blocking=False):
+        return {"ok": False, "message": "Резервное копирование уже выполняется"}
+
+    stats = {"ok": False, "path": None, "started_at": datetime.now().isoformat(timespec="seconds"),
+             "duration": 0.0, "pages": 0, "steps": 0, "restarts": 0, "size": 0, "message": ""}
+    started = time.perf_counter()
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    base_name = f"{prefix}{stamp}.db"
+    suffix = 1
+    while any(os.path.exists(os.path.join(backup_dir, base_name + ext)) for ext in ("", ".gz")):
+        base_name = f"{prefix}{stamp}-{suffix}.db"
+        suffix += 1
+    temp_path = os.path.join(backup_dir, base_name + ".part")
+    last_remaining = [None]
+
+    def on_progress(status, remaining, total):
+        stats["steps"] += 1
+        stats["pages"] = total
+        if last_remaining[0] is not None and remaining > last_remaining[0]:
+            stats["restarts"] += 1
+        last_remaining[0] = remaining
+
+    try:
+        source = sqlite3.connect(db_file)
+        target = sqlite3.connect(temp_path)
+        try:
+            source.backup(target, pages=pages, progress=on_progress, sleep=step_sleep)
+        finally:
+            source.close()
+            target.close()
+
+        if not quick_check(temp_path):
+            stats["message"] = "Копия не прошла проверку PRAGMA quick_check"
+            os.remove(temp_path)
+            return stats
+
+        if compress:
+            final_path = os.path.join(backup_dir, base_name + ".gz")
+            with open(temp_path, "rb") as src, gzip.open(final_path + ".part", "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(final_path + ".part", final_path)
+            os.remove(temp_path)
+        else:
+            final_path = os.path.join(backup_dir, base_name)
+            os.replace(temp_path, final_path)
+
+        rotate_backups(backup_dir, keep, prefix)
+
+        stats.update(ok=True, path=final_path, size=os.path.getsize(final_path), message="ok")
+        return stats
+    except (OSError, sqlite3.Error) as e:
+        stats["message"] = str(e)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return stats
+    finally:
+        stats["duration"] = time.perf_counter() - started
+        _backup_lock.release()
+
+
+def backup_archive_if_changed(db_file, backup_dir=None, **kwargs):
+    """
+    Копирует архив (archive.db) рядом с копиями основной базы, если он изменился после последней
+    своей копии. Архив меняется редко, поэтому обычно этот шаг ничего не делает и возвращает None.
+    """
+    archive_path = archive_path_for(db_file)
+    if not os.path.exists(archive_path):
+        return None
+    backup_dir = backup_dir or backup_dir_for(db_file)
+    backups = list_backups(backup_dir, ARCHIVE_BACKUP_PREFIX)
+    if backups and max(backup["mtime"] for backup in backups) >= os.path.getmtime(archive_path):
+        return None
+    return create_backup(archive_path, backup_dir, prefix=ARCHIVE_BACKUP_PREFIX, **kwargs)
+
+
+def restore_backup(backup_path, db_file):
+    """
+    Восстанавливает базу из резервной копии. Копия сначала проверяется,
+    затем переносится в рабочую базу через тот же backup API.
+    """
+    restore_path = backup_path
+    temp_path = None
+    if backup_path.endswith(".gz"):
+        temp_path = db_file + ".restore"
+        with gzip.open(backup_path, "rb") as src, open(temp_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        restore_path = temp_path
+
+    try:
+        if not quick_check(restore_path):
+            raise sqlite3.DatabaseError("Резервная копия повреждена")
+
+        source = sqlite3.connect(restore_path)
+        target = sqlite3.connect(db_file)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def start_backup_thread(db_file, on_finished=None, **kwargs):
+    """
+    Запускает create_backup в фоновом потоке, затем копирует архив, если он изменился.
+    on_finished(stats) вызывается из этого потока; сведения о копии архива — в stats["archive"].
+    """
+    def run():
+        stats = create_backup(db_file, **kwargs)
+        stats["archive"] = backup_archive_if_changed(db_file, **kwargs) if stats["ok"] else None
+        if on_finished:
+            on_finished(stats)
+
+    thread = threading.Thread(target=run, name="boranotes-backup", daemon=True)
+    thread.start()
+    return thread
@@ -1,20 +1,65 @@
 import sys
 import os
 import sqlite3
+import multiprocessing
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
 
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QPushButton, QListWidget, QListWidgetItem,
-    QTextEdit, QHBoxLayout, QLineEdit, QLabel, QMessageBox, QCheckBox, QSplitter, QMenu, QGridLayout, QWidgetAction 
+    QTextEdit, QHBoxLayout, QLineEdit, QLabel, QMessageBox, QCheckBox, QSplitter, QMenu, QGridLayout, QWidgetAction,
+    QFileDialog, QProgressDialog, QDialog, QInputDialog, QListView, QStyledItemDelegate, QStyle
 )
 from PyQt6.QtGui import (
     QFont, QIcon, QTextCursor, QTextCharFormat, QShortcut, QKeySequence, QColor,
-    QDesktopServices, QTextFrameFormat, QTextBlockFormat, QSyntaxHighlighter
+    QDesktopServices, QTextFrameFormat, QTextBlockFormat, QSyntaxHighlighter, QTextDocument, QTextDocumentFragment,
+    QFontMetrics, QPen
 )
-from PyQt6.QtCore import Qt, QTimer, QMimeData, QPoint, QUrl, QSize
+from PyQt6.QtCore import Qt, QTimer, QMimeData, QPoint, QUrl, QSize, pyqtSignal
 
 from themes import get_theme
 from about import get_about_content, get_about_title
+from exporter import export_notes
+from backup import (
+    BACKUP_INTERVAL_MINUTES, backup_dir_for, create_backup, list_backups, restore_backup, start_backup_thread
+)
+from archive import (
+    ARCHIVE_AFTER_DAYS_CHOICES, ARCHIVE_BATCH_SIZE, archive_notes, attached_archive, get_archived_content,
+    restore_notes, search_archive, stale_cutoff, stale_note_ids
+)
+from changes import (
+    CHANGE_POLL_INTERVAL_MS, CHANGE_REFRESH_LIMIT, ChangeWatcher, create_change_log, fetch_changed_notes, fetch_note_contents,
+    own_changes, trim_change_log
+)
+from bulk import (
+    BULK_UNDO_DEPTH, bulk_add_tag, bulk_delete_notes, bulk_remove_tag, bulk_set_pinned, undo_bulk_change
+)
+from instance import InstanceServer, instance_server_name, parse_arguments, send_to_running_instance
+from journal import (
+    FSYNC_INTERVAL_MS, SNAPSHOT_INTERVAL_MS, EditJournal, journal_path_for, read_pending_operations
+)
+from diagnostics import format_report, sqlite_cache_stats, start_tracing, store_stats, take_snapshot, write_report
+from docpool import DocumentPool
+from latency import LATENCY_REFRESH_MS, LatencyMonitor
+from maintenance import MAINTENANCE_CHECK_INTERVAL_MS, MAINTENANCE_IDLE_SECONDS, connect_db, start_maintenance_thread
+from notestore import NoteStore
+from noteslist import LIST_BATCH_SIZE, LIST_FILL_INTERVAL_MS, count_list_notes, iter_list_batches, name_sort_key
+from plaintext import backfill_plain_text, create_plain_text_columns, text_stats
+from ranks import RANK_REBALANCE_LENGTH, create_rank_column, first_rank, move_note, rebalance_ranks
+from prefetch import PREFETCH_DOCUMENTS, PREFETCH_IDLE_MS, PREFETCH_NEIGHBOURS, NotePrefetcher
+from tags import (
+    TagRegistry, create_tag, create_tag_tables, delete_tag, dump_tag_filter, icons_from_map, migrate_categories,
+    parse_tag_filter, parse_tag_ids, tag_filter_clause
+)
+from session import SESSION_LIST_ROWS, SESSION_MAX_CONTENT, database_fingerprint, read_session, session_path_for, write_session
+from revisions import (
+    create_revisions_table, get_revision_content, list_revisions, record_revision, thin_all_revisions
+)
 
 
 def resource_path(relative_path):
@@ -29,127 +74,220 @@ MONTHS = {
     7: 'июля', 8: 'августа', 9: 'сентября', 10: 'октября', 11: 'ноября', 12: 'декабря'
 }
 
+
+@lru_cache(maxsize=4096)
+def _format_day(year, month, day):
+    return f"{day} {MONTHS[month]} {year}"
+
+
+@lru_cache(maxsize=8192)
+def _format_minute(minute):
+    date_obj = datetime.fromtimestamp(minute * 60)
+    return f"{_format_day(date_obj.year, date_obj.month, date_obj.day)} {date_obj.hour:02d}:{date_obj.minute:02d}"
+
+
+def format_note_date(timestamp):
+    if not timestamp:
+        return ""
+    return _format_minute(int(timestamp) // 60)
+
+JOURNAL_PLAIN_TEXT_LIMIT = 256
+ACCESS_FLUSH_INTERVAL_MS = 30000
+
+
+NOTE_DATE_ROLE = Qt.ItemDataRole.UserRole.value + 1
+NOTE_ICONS_ROLE = Qt.ItemDataRole.UserRole.value + 2
+NOTE_PINNED_ROLE = Qt.ItemDataRole.UserRole.value + 3
+
+
+def apply_journal_operations(document, operations):
+    cursor = QTextCursor(document)
+    for operation in operations:
+        end_limit = document.characterCount() - 1
+        position = min(operation["p"], end_limit)
+        cursor.setPosition(position)
+        cursor.setPosition(min(position + operation["r"], end_limit), QTextCursor.MoveMode.KeepAnchor)
+        cursor.removeSelectedText()
+        if "h" in operation:
+            cursor.insertFragment(QTextDocumentFragment.fromHtml(operation["h"]))
+        elif operation["t"]:
+            cursor.insertText(operation["t"])
+
 class CustomTextEdit(QTextEdit):
+    # Текст изменился: (начало, конец) изменённого диапазона. Внутри edit_transaction
+    # сигнал откладывается до конца правки и отправляется один раз с общим диапазоном.
+    edited = pyqtSignal(int, int)
     
     def __init__(self, parent=None):
         super().__init__(parent)
         self.default_font = QFont("Calibri", 11)
         self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.customContextMenuRequested.connect(self.show_custom_context_menu)
+        self._edit_depth = 0
+        self._edit_pending = False
+        self._edit_range = None
+        self.textChanged.connect(self._on_text_changed)
+        self._context_menu = None
+        self._context_menu_theme = None
+        self._selection_actions = []
+        self._select_all_action = None
+        self.latency_monitor = None
+
+    def keyPressEvent(self, event):
+        if self.latency_monitor is not None and self.latency_monitor.enabled:
+            document = self.document()
+            self.latency_monitor.key_pressed(document.characterCount(), len(document.allFormats()))
+        super().keyPressEvent(event)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.latency_monitor is not None:
+            self.latency_monitor.painted()
+
+    @contextmanager
+    def edit_transaction(self, cursor=None):
+        """
+        Объединяет программные правки в один шаг отмены (beginEditBlock/endEditBlock).
+        Отдаёт курсор, через который нужно править; вложенные транзакции допускаются.
+        """
+        cursor = cursor if cursor is not None else self.textCursor()
+        self._edit_depth += 1
+        cursor.beginEditBlock()
+        try:
+            yield cursor
+        finally:
+            cursor.endEditBlock()
+            self._edit_depth -= 1
+            if not self._edit_depth and self._edit_pending:
+                self._emit_edited()
+
+    def track_edit_range(self, position, removed, added):
+        if self.sender() is not self.document():
+            return
+        start, end = position, position + max(removed, added)
+        if self._edit_range is not None:
+            start, end = min(start, self._edit_range[0]), max(end, self._edit_range[1])
+        self._edit_range = (start, end)
+
+    def _on_text_changed(self):
+        self._edit_pending = True
+        if not self._edit_depth:
+            self._emit_edited()
+
+    def _emit_edited(self):
+        start, end = self._edit_range if self._edit_range is not None else (0, self.document().characterCount())
+        self._edit_pending = False
+        self._edit_range = None
+        self.edited.emit(start, end)
 
     def show_custom_context_menu(self, position):
-        custom_menu = QMenu(self)
-        custom_menu.setFont(QFont("Calibri", 9))
-        
         main_window = self.window()
         if not main_window or not hasattr(main_window, 'current_theme'):
             return  
         
-        has_selected_text = self.textCursor().hasSelection()
-        has_any_text = not self.document().isEmpty()
+        if self._context_menu is None or self._context_menu_theme != main_window.current_theme:
+            self.invalidate_context_menu()
+            self._context_menu_theme = main_window.current_theme
+            self._context_menu = self.build_context_menu(get_theme(main_window.current_theme))
         
-        theme_name = main_window.current_theme
-        theme = get_theme(theme_name)
+        has_selected_text = self.textCursor().hasSelection()
+        for action in self._selection_actions:
+            action.setEnabled(has_selected_text)
+        self._select_all_action.setEnabled(not self.document().isEmpty())
+
+        self._context_menu.exec(self.mapToGlobal(position))
+
+    def invalidate_context_menu(self):
+        if self._context_menu is not None:
+            self._context_menu.deleteLater()
+        self._context_menu = None
+        self._context_menu_theme = None
+        self._selection_actions = []
+        self._select_all_action = None
+
+    def build_context_menu(self, theme):
+        custom_menu = QMenu(self)
+        custom_menu.setFont(QFont("Calibri", 9))
         custom_menu.setStyleSheet(theme["menu_style"])
 
         format_menu = custom_menu.addMenu(" ✒️  Форматирование                ")
         format_menu.setStyleSheet(theme["menu_style"])
         
-        bold_action = format_menu.addAction("Ctrl + B  | Жирный  ")
-        italic_action = format_menu.addAction("Ctrl + I  | Курсив  ")
-        underline_action = format_menu.addAction("Ctrl + U  | Подчеркнутый  ")
-        strikethrough_action = format_menu.addAction("Ctrl + T  | Зачеркнутый  ")  
-        highlight_action = format_menu.addAction("Ctrl + H  | Выделить ")
+        for label, format_type in (
+            ("Ctrl + B  | Жирный  ", "bold"),
+            ("Ctrl + I  | Курсив  ", "italic"),
+            ("Ctrl + U  | Подчеркнутый  ", "underline"),
+            ("Ctrl + T  | Зачеркнутый  ", "strikethrough"),
+            ("Ctrl + H  | Выделить ", "highlight"),
+        ):
+            action = format_menu.addAction(label)
+            action.triggered.connect(lambda checked=False, f=format_type: self.apply_formatting(f))
+            self._selection_actions.append(action)
         format_menu.addSeparator()
         clear_format_action = format_menu.addAction("Очистить форматирование")
-
-        bold_action.setEnabled(has_selected_text)
-        italic_action.setEnabled(has_selected_text)
-        underline_action.setEnabled(has_selected_text)
-        strikethrough_action.setEnabled(has_selected_text)
-        highlight_action.setEnabled(has_selected_text)
-        clear_format_action.setEnabled(has_selected_text)
+        clear_format_action.triggered.connect(self.clear_formatting)
+        self._selection_actions.append(clear_format_action)
         
         special_symbols_menu = custom_menu.addMenu(" 🔣  Специальные символы                ")
         special_symbols_menu.setStyleSheet(theme["menu_style"])
         
-        empty_circle_action = special_symbols_menu.addAction("○ Пустой кружок")
-        full_circle_action = special_symbols_menu.addAction("● Тёмный кружок")
-        dark_arrow_action = special_symbols_menu.addAction("➤ Тёмная стрелочка")
-        check_mark_action = special_symbols_menu.addAction("✔ Галочка/готово!")
-        cross_mark_action = special_symbols_menu.addAction("✘ Крестик/не готово!")
-        music_note_action = special_symbols_menu.addAction("♫ Музыкальная нота")
-        heart_note_action = special_symbols_menu.addAction("♥︎ Заполененное сердечко")
+        for label, symbol in (
+            ("○ Пустой кружок", "○"),
+            ("● Тёмный кружок", "●"),
+            ("➤ Тёмная стрелочка", "➤"),
+            ("✔ Галочка/готово!", "✔"),
+            ("✘ Крестик/не готово!", "✘"),
+            ("♫ Музыкальная нота", "♫"),
+            ("♥︎ Заполененное сердечко", "♥︎"),
+        ):
+            action = special_symbols_menu.addAction(label)
+            action.triggered.connect(lambda checked=False, c=symbol: self.insert_special_character(c))
         
         special_emoji_menu = custom_menu.addMenu(" 😊  Специальные эмоджи                ")
         special_emoji_menu.setStyleSheet(theme["menu_style"])
         
-        purple_heart_action = special_emoji_menu.addAction("💜 Фиолетовое сердечко")
-        pushpin_action = special_emoji_menu.addAction("📌 Канцелярская кнопка")
-        star_action = special_emoji_menu.addAction("⭐ Звездочка")
-        calendar_action = special_emoji_menu.addAction("📅 Календарик")
-        note_action = special_emoji_menu.addAction("📝 Заметка")
-        exclamation_action = special_emoji_menu.addAction("‼️ Восклицательный знак")
-        coffee_action = special_emoji_menu.addAction("☕ Кофеек")
-        cake_action = special_emoji_menu.addAction("🍰 Тортик")
-        pill_action = special_emoji_menu.addAction("💊 Витаминка")
-        done_action = special_emoji_menu.addAction("✅ Сделано!")
-        cross_action = special_emoji_menu.addAction("❌ Крестик")
-        merch_action = special_emoji_menu.addAction("💸 На мерч бтс")
+        for label, symbol in (
+            ("💜 Фиолетовое сердечко", "💜"),
+            ("📌 Канцелярская кнопка", "📌"),
+            ("⭐ Звездочка", "⭐"),
+            ("📅 Календарик", "📅"),
+            ("📝 Заметка", "📝"),
+            ("‼️ Восклицательный знак", "❗"),
+            ("☕ Кофеек", "☕"),
+            ("🍰 Тортик", "🍰"),
+            ("💊 Витаминка", "💊"),
+            ("✅ Сделано!", "✅"),
+            ("❌ Крестик", "❌"),
+            ("💸 На мерч бтс", "💸"),
+        ):
+            action = special_emoji_menu.addAction(label)
+            action.triggered.connect(lambda checked=False, c=symbol: self.insert_special_character(c))
 
         custom_menu.addSeparator()
         copy_action = custom_menu.addAction(" 📋  Копировать ")
         copy_action.triggered.connect(self.copy)
-        copy_action.setEnabled(has_selected_text)
+        self._selection_actions.append(copy_action)
         
         cut_action = custom_menu.addAction(" ✂️  Вырезать ")
         cut_action.triggered.connect(self.cut)
-        cut_action.setEnabled(has_selected_text)
+        self._selection_actions.append(cut_action)
         
         paste_action = custom_menu.addAction(" 📌  Вставить ")
         paste_action.triggered.connect(self.paste)
         
-        select_all_action = custom_menu.addAction(" ✅  Выделить всё ")
-        select_all_action.triggered.connect(self.selectAll)
-        select_all_action.setEnabled(has_any_text)
+        self._select_all_action = custom_menu.addAction(" ✅  Выделить всё ")
+        self._select_all_action.triggered.connect(self.selectAll)
 
         custom_menu.addSeparator()
-
-        bold_action.triggered.connect(lambda: self.apply_formatting('bold'))
-        italic_action.triggered.connect(lambda: self.apply_formatting('italic'))
-        underline_action.triggered.connect(lambda: self.apply_formatting('underline'))
-        strikethrough_action.triggered.connect(lambda: self.apply_formatting('strikethrough'))
-        highlight_action.triggered.connect(lambda: self.apply_formatting('highlight'))
-        
-        clear_format_action.triggered.connect(self.clear_formatting)
-        
-        empty_circle_action.triggered.connect(lambda: self.insert_special_character("○"))
-        full_circle_action.triggered.connect(lambda: self.insert_special_character("●"))
-        dark_arrow_action.triggered.connect(lambda: self.insert_special_character("➤"))
-        check_mark_action.triggered.connect(lambda: self.insert_special_character("✔"))
-        cross_mark_action.triggered.connect(lambda: self.insert_special_character("✘"))
-        music_note_action.triggered.connect(lambda: self.insert_special_character("♫"))
-        heart_note_action.triggered.connect(lambda: self.insert_special_character("♥︎"))
-
-        purple_heart_action.triggered.connect(lambda: self.insert_special_character("💜"))
-        pushpin_action.triggered.connect(lambda: self.insert_special_character("📌"))
-        star_action.triggered.connect(lambda: self.insert_special_character("⭐"))
-        calendar_action.triggered.connect(lambda: self.insert_special_character("📅"))
-        note_action.triggered.connect(lambda: self.insert_special_character("📝"))
-        exclamation_action.triggered.connect(lambda: self.insert_special_character("❗"))
-        coffee_action.triggered.connect(lambda: self.insert_special_character("☕"))
-        cake_action.triggered.connect(lambda: self.insert_special_character("🍰"))
-        pill_action.triggered.connect(lambda: self.insert_special_character("💊"))
-        done_action.triggered.connect(lambda: self.insert_special_character("✅"))
-        cross_action.triggered.connect(lambda: self.insert_special_character("❌"))
-        merch_action.triggered.connect(lambda: self.insert_special_character("💸"))
-
-        custom_menu.exec(self.mapToGlobal(position))
+        return custom_menu
 
     def apply_formatting(self, format_type):
-        cursor = self.textCursor()
-        if not cursor.hasSelection():
+        if not self.textCursor().hasSelection():
             return 
+        with self.edit_transaction() as cursor:
+            self._merge_formatting(cursor, format_type)
+
+    def _merge_formatting(self, cursor, format_type):
         
         format = QTextCharFormat()
         current_format = cursor.charFormat()
@@ -177,28 +315,335 @@ class CustomTextEdit(QTextEdit):
         cursor.mergeCharFormat(format)
 
     def insert_special_character(self, character):
-        cursor = self.textCursor()
-        cursor.insertText(character)
+        with self.edit_transaction() as cursor:
+            cursor.insertText(character)
         self.setTextCursor(cursor)
 
     def clear_formatting(self, format_type=None):
-        cursor = self.textCursor()
         format = QTextCharFormat()
         format.setFont(self.default_font)
         format.setBackground(QColor("transparent"))
-        cursor.mergeCharFormat(format)
+        with self.edit_transaction() as cursor:
+            cursor.mergeCharFormat(format)
 
     def insertFromMimeData(self, source: QMimeData):
-        cursor = self.textCursor()
         default_format = QTextCharFormat()
         default_format.setFont(self.default_font)
-        cursor.insertText(source.text())
-        cursor.select(QTextCursor.SelectionType.Document)
-        cursor.mergeCharFormat(default_format)
+        with self.edit_transaction() as cursor:
+            cursor.insertText(source.text())
+            cursor.select(QTextCursor.SelectionType.Document)
+            cursor.mergeCharFormat(default_format)
+
+class NoteListDelegate(QStyledItemDelegate):
+    """
+    Рисует строку списка заметок по данным элемента: значок закрепления, категории, заголовок и дату.
+    Все строки одной высоты, поэтому список может работать с setUniformItemSizes(True).
+    """
+
+    MARGIN = 5
+    PADDING = 5
+    MIN_HEIGHT = 40
+    RADIUS = 4
+
+    def __init__(self, colors, parent=None):
+        super().__init__(parent)
+        self.colors = {}
+        self._font_key = None
+        self._metrics = None
+        self._row_height = 0
+        self.set_colors(colors)
+
+    def set_colors(self, colors):
+        self.colors = {name: QColor(value) for name, value in colors.items()}
+
+    def _update_metrics(self, font):
+        font_key = font.key()
+        if font_key != self._font_key:
+            self._font_key = font_key
+            self._metrics = QFontMetrics(font)
+            content_height = max(self.MIN_HEIGHT, 2 * self._metrics.lineSpacing())
+            self._row_height = content_height + 2 * (self.PADDING + self.MARGIN)
+        return self._metrics
+
+    def sizeHint(self, option, index):
+        self._update_metrics(option.font)
+        return QSize(option.rect.width(), self._row_height)
+
+    def paint(self, painter, option, index):
+        metrics = self._update_metrics(option.font)
+        is_selected = bool(option.state & QStyle.StateFlag.State_Selected)
+        is_pinned = bool(index.data(NOTE_PINNED_ROLE))
+
+        if is_pinned:
+            background = self.colors["pinned_selected_background" if is_selected else "pinned_background"]
+        else:
+            background = self.colors["selected_background" if is_selected else "background"]
+
+        painter.save()
+        painter.setRenderHint(painter.RenderHint.Antialiasing)
+
+        if index.row() > 0 and not is_pinned and index.siblingAtRow(index.row() - 1).data(NOTE_PINNED_ROLE):
+            painter.setPen(QPen(self.colors["separator"], 1))
+            painter.drawLine(option.rect.left() + self.MARGIN, option.rect.top(),
+                             option.rect.right() - self.MARGIN, option.rect.top())
+
+        rect = option.rect.adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+        painter.setPen(QPen(self.colors["selected_border" if is_selected else "border"], 0.5))
+        painter.setBrush(background)
+        painter.drawRoundedRect(rect, self.RADIUS, self.RADIUS)
+
+        text_rect = rect.adjusted(self.PADDING, self.PADDING, -self.PADDING, -self.PADDING)
+        line_height = metrics.lineSpacing()
+        title = index.data(Qt.ItemDataRole.DisplayRole) or ""
+        prefix = " ".join(part for part in ("⭐" if is_pinned else "", index.data(NOTE_ICONS_ROLE) or "") if part)
+        if prefix:
+            title = f"{prefix} {title}"
+
+        painter.setFont(option.font)
+        painter.setPen(self.colors["selected_text" if is_selected else "text"])
+        painter.drawText(text_rect.left(), text_rect.top(), text_rect.width(), line_height,
+                         Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter,
+                         metrics.elidedText(title, Qt.TextElideMode.ElideRight, text_rect.width()))
+        painter.drawText(text_rect.left(), text_rect.top() + line_height, text_rect.width(), line_height,
+                         Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter,
+                         metrics.elidedText(index.data(NOTE_DATE_ROLE) or "", Qt.TextElideMode.ElideRight, text_rect.width()))
+        painter.restore()
+
+
+class NotesListWidget(QListWidget):
+    """Список заметок; в режиме своего порядка заметки можно перетаскивать мышью"""
+
+    # Заметки перетащены на новое место: [id, ...]
+    notes_moved = pyqtSignal(list)
+
+    def set_reorder_enabled(self, enabled):
+        self.setDragDropMode(QListWidget.DragDropMode.InternalMove if enabled else QListWidget.DragDropMode.NoDragDrop)
+        self.setDefaultDropAction(Qt.DropAction.MoveAction)
+
+    def dropEvent(self, event):
+        note_ids = [item.data(Qt.ItemDataRole.UserRole) for item in self.selectedItems()]
+        super().dropEvent(event)
+        if note_ids:
+            self.notes_moved.emit(note_ids)
+
+
+class ArchiveDialog(QDialog):
+    """Архив заметок: поиск по запросу и возврат выбранных заметок в список"""
+
+    def __init__(self, theme_name, parent=None):
+        super().__init__(parent)
+        self.restored_ids = []
+        self.setWindowTitle("Архив заметок")
+        self.resize(760, 480)
+
+        theme = get_theme(theme_name)
+        self.setStyleSheet(theme["dialog_style"])
+
+        layout = QVBoxLayout(self)
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Поиск в архиве по названию и тексту")
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(300)
+        self.search_timer.timeout.connect(self.search)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        layout.addWidget(self.search_input)
+
+        splitter = QSplitter(Qt.Orientation.Horizontal)
+        self.results_list = QListWidget()
+        self.results_list.setStyleSheet(theme["notes_list"])
+        self.results_list.setSelectionMode(QListWidget.SelectionMode.ExtendedSelection)
+        self.results_list.currentRowChanged.connect(self.show_preview)
+        self.results_list.itemSelectionChanged.connect(
+            lambda: self.restore_button.setEnabled(bool(self.results_list.selectedItems())))
+        self.results_list.itemDoubleClicked.connect(self.restore_selected)
+        splitter.addWidget(self.results_list)
+
+        self.preview = QTextEdit()
+        self.preview.setReadOnly(True)
+        self.preview.setFont(QFont("Calibri", 11))
+        self.preview.setStyleSheet(theme["text_editor"])
+        splitter.addWidget(self.preview)
+        splitter.setSizes([260, 500])
+        layout.addWidget(splitter)
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addStretch()
+        self.restore_button = QPushButton("Вернуть из архива")
+        self.restore_button.clicked.connect(self.restore_selected)
+        self.restore_button.setEnabled(False)
+        close_button = QPushButton("Закрыть")
+        close_button.clicked.connect(self.reject)
+        buttons_layout.addWidget(self.restore_button)
+        buttons_layout.addWidget(close_button)
+        layout.addLayout(buttons_layout)
+
+        self.search()
+
+    def search(self):
+        self.results_list.clear()
+        try:
+            rows = search_archive(DB_FILE, self.search_input.text())
+        except sqlite3.Error as e:
+            print(f"Ошибка при поиске в архиве: {e}")
+            rows = []
+
+        for note_id, title, archived_ts, modified_ts in rows:
+            item = QListWidgetItem(f"{title or 'Без Названия'}\nв архиве с {format_note_date(archived_ts)}")
+            item.setData(Qt.ItemDataRole.UserRole, note_id)
+            self.results_list.addItem(item)
+
+        if not rows:
+            self.preview.setPlainText("Ничего не найдено." if self.search_input.text().strip() else "Архив пуст.")
+
+    def show_preview(self, row):
+        item = self.results_list.item(row)
+        if not item:
+            return
+        try:
+            content = get_archived_content(DB_FILE, item.data(Qt.ItemDataRole.UserRole))
+        except sqlite3.Error as e:
+            print(f"Ошибка при загрузке заметки из архива: {e}")
+            content = None
+        self.preview.setHtml(content or "")
+
+    def restore_selected(self):
+        self.restored_ids = [item.data(Qt.ItemDataRole.UserRole) for item in self.results_list.selectedItems()]
+        if self.restored_ids:
+            self.accept()
+
+
+class MemoryReportDialog(QDialog):
+    """Отчёт о памяти со снятием нового снимка и сохранением в файл"""
+
+    def __init__(self, app_window, theme_name, parent=None):
+        super().__init__(parent)
+        self.app_window = app_window
+        self.report_text = ""
+        self.setWindowTitle("Отчёт о памяти")
+        self.resize(760, 520)
+
+        theme = get_theme(theme_name)
+        self.setStyleSheet(theme["dialog_style"])
+
+        layout = QVBoxLayout(self)
+        self.report_view = QTextEdit()
+        self.report_view.setReadOnly(True)
+        self.report_view.setLineWrapMode(QTextEdit.LineWrapMode.NoWrap)
+        self.report_view.setFont(QFont("Consolas", 9))
+        self.report_view.setStyleSheet(theme["text_editor"])
+        layout.addWidget(self.report_view)
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addStretch()
+        refresh_button = QPushButton("Снять новый снимок")
+        refresh_button.clicked.connect(self.refresh)
+        save_button = QPushButton("Сохранить в файл")
+        save_button.clicked.connect(self.save_report)
+        close_button = QPushButton("Закрыть")
+        close_button.clicked.connect(self.reject)
+        buttons_layout.addWidget(refresh_button)
+        buttons_layout.addWidget(save_button)
+        buttons_layout.addWidget(close_button)
+        layout.addLayout(buttons_layout)
+
+        self.refresh()
+
+    def refresh(self):
+        self.report_text = self.app_window.memory_report()
+        self.report_view.setPlainText(self.report_text)
+
+    def save_report(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Сохранить отчёт о памяти", "boranotes-memory.txt", "Текст (*.txt)")
+        if not path:
+            return
+        try:
+            write_report(path, self.report_text)
+        except OSError as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось сохранить отчёт: {str(e)}")
+
+
+class RevisionHistoryDialog(QDialog):
+
+    def __init__(self, note_id, note_title, theme_name, parent=None):
+        super().__init__(parent)
+        self.note_id = note_id
+        self.selected_content = None
+        self.setWindowTitle(f"История изменений — {note_title or 'Без Названия'}")
+        self.resize(760, 480)
+
+        theme = get_theme(theme_name)
+        self.setStyleSheet(theme["dialog_style"])
+
+        layout = QVBoxLayout(self)
+        splitter = QSplitter(Qt.Orientation.Horizontal)
+
+        self.revisions_list = QListWidget()
+        self.revisions_list.setStyleSheet(theme["notes_list"])
+        self.revisions_list.currentRowChanged.connect(self.show_revision)
+        splitter.addWidget(self.revisions_list)
+
+        self.preview = QTextEdit()
+        self.preview.setReadOnly(True)
+        self.preview.setFont(QFont("Calibri", 11))
+        self.preview.setStyleSheet(theme["text_editor"])
+        splitter.addWidget(self.preview)
+        splitter.setSizes([220, 540])
+        layout.addWidget(splitter)
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addStretch()
+        self.restore_button = QPushButton("Восстановить эту версию")
+        self.restore_button.clicked.connect(self.restore_selected)
+        self.restore_button.setEnabled(False)
+        close_button = QPushButton("Закрыть")
+        close_button.clicked.connect(self.reject)
+        buttons_layout.addWidget(self.restore_button)
+        buttons_layout.addWidget(close_button)
+        layout.addLayout(buttons_layout)
+
+        self.load_revisions()
+
+    def load_revisions(self):
+        try:
+            with connect_db(DB_FILE) as conn:
+                revisions = list_revisions(conn.cursor(), self.note_id)
+        except sqlite3.Error as e:
+            print(f"Ошибка при загрузке истории изменений: {e}")
+            revisions = []
+
+        for revision_id, created_at, title, is_keyframe, size in revisions:
+            item = QListWidgetItem(f"{title or 'Без Названия'}\n{format_note_date(created_at)}")
+            item.setData(Qt.ItemDataRole.UserRole, revision_id)
+            self.revisions_list.addItem(item)
+
+        if not revisions:
+            self.preview.setPlainText("Для этой заметки пока нет сохранённых версий.")
+
+    def show_revision(self, row):
+        item = self.revisions_list.item(row)
+        if not item:
+            self.restore_button.setEnabled(False)
+            return
+
+        try:
+            with connect_db(DB_FILE) as conn:
+                content = get_revision_content(conn.cursor(), self.note_id, item.data(Qt.ItemDataRole.UserRole))
+        except sqlite3.Error as e:
+            print(f"Ошибка при загрузке версии заметки: {e}")
+            content = None
+
+        self.preview.setHtml(content or "")
+        self.selected_content = content
+        self.restore_button.setEnabled(content is not None)
+
+    def restore_selected(self):
+        if self.selected_content is not None:
+            self.accept()
 
 class NotesApp(QWidget):
     
-    def __init__(self):
+    def __init__(self, instance_server=None):
         super().__init__()
         self.setWindowIcon(QIcon(resource_path('icon.ico')))
         self.setWindowTitle("BORA NOTES")
@@ -207,7 +652,9 @@ class NotesApp(QWidget):
 
         self.current_note_id = None
         self.skip_delete_confirmation = False
-        self._notes_cache = {}
+        self._instance_server = instance_server
+        self._notes_cache = NoteStore()
+        self._tags = TagRegistry()
         self.need_save = False
         self.is_notes_list_visible = True
         self.initial_notes_list_width = 200
@@ -216,11 +663,132 @@ class NotesApp(QWidget):
         self._save_timer = QTimer()
         self._save_timer.setInterval(1000)
         self._save_timer.timeout.connect(self._perform_auto_save)
+        self._is_setting_content = False
+        self._document_pool = DocumentPool(on_evict=self._on_document_evicted)
+        self._blank_document = None
+
+        self._list_queue = queue.Queue()
+        self._list_generation = 0
+        self._list_select_id = None
+        self._list_loading = False
+        self._list_stale = False
+        self._list_items = {}
+        self._list_fill_timer = QTimer()
+        self._list_fill_timer.setInterval(LIST_FILL_INTERVAL_MS)
+        self._list_fill_timer.timeout.connect(self.fill_notes_list)
+
+        self._prefetcher = NotePrefetcher(DB_FILE)
+        self._latency = LatencyMonitor(on_warning=self.on_latency_warning)
+        self._latency_timer = QTimer()
+        self._latency_timer.setInterval(LATENCY_REFRESH_MS)
+        self._latency_timer.timeout.connect(self.update_latency_label)
+        self._recent_note_ids = deque(maxlen=8)
+        self._prefetch_timer = QTimer()
+        self._prefetch_timer.setSingleShot(True)
+        self._prefetch_timer.setInterval(PREFETCH_IDLE_MS)
+        self._prefetch_timer.timeout.connect(self.start_prefetch)
+        self._prefetch_poll_timer = QTimer()
+        self._prefetch_poll_timer.setInterval(50)
+        self._prefetch_poll_timer.timeout.connect(self.collect_prefetched)
+
+        self._pending_access_times = {}
+        self._access_flush_timer = QTimer()
+        self._access_flush_timer.setSingleShot(True)
+        self._access_flush_timer.setInterval(ACCESS_FLUSH_INTERVAL_MS)
+        self._access_flush_timer.timeout.connect(self.flush_access_times)
+
+        self._journal = None
+        self._journal_timer = QTimer()
+        self._journal_timer.setSingleShot(True)
+        self._journal_timer.setInterval(FSYNC_INTERVAL_MS)
+        self._journal_timer.timeout.connect(self.flush_journal)
+
+        self.backup_stats = deque(maxlen=20)
+        self._backup_timer = QTimer()
+        self._backup_timer.setInterval(BACKUP_INTERVAL_MINUTES * 60 * 1000)
+        self._backup_timer.timeout.connect(self.run_backup)
+        self._backfill_stop = threading.Event()
+        self._menus = {}
+        self._menus_built = 0
+        self._list_items_created = 0
+        self._memory_snapshot = None
+        self._menu_note_id = None
+        self._bulk_undo = deque(maxlen=BULK_UNDO_DEPTH)
+        self._rank_rebalance = None
+        self._rank_queue = queue.Queue()
+        self._deferred_note_moves = []
+        self._rank_poll_timer = QTimer()
+        self._rank_poll_timer.setInterval(200)
+        self._rank_poll_timer.timeout.connect(self.collect_rank_rebalance)
+        self._archive_queue = queue.Queue()
+        self._archive_candidates = []
+        self._archive_cutoff = None
+        self._auto_archived = []
+        self._archive_poll_timer = QTimer()
+        self._archive_poll_timer.setInterval(200)
+        self._archive_poll_timer.timeout.connect(self.collect_auto_archived)
+        self._last_edit_time = time.monotonic()
+        self._maintenance_stop = threading.Event()
+        self._maintenance_thread = None
+        self._maintenance_timer = QTimer()
+        self._maintenance_timer.setInterval(MAINTENANCE_CHECK_INTERVAL_MS)
+        self._maintenance_timer.timeout.connect(self.run_idle_maintenance)
+        self._change_watcher = None
+        self._pending_changes = {}
+        self._pending_changes_complete = True
+        self._applying_changes = False
+        self._change_timer = QTimer()
+        self._change_timer.setInterval(CHANGE_POLL_INTERVAL_MS)
+        self._change_timer.timeout.connect(self.poll_external_changes)
+
+        session = read_session(session_path_for(DB_FILE))
+        if session:
+            self.current_theme = session.get("theme", self.current_theme)
+        else:
+            self.load_theme_setting()
+        self.initUI()
 
+        self.text_editor.setAcceptRichText(True)
+        self.setup_shortcuts()
+        self.splitter.splitterMoved.connect(self.check_list_visibility)
+        self.title_input.textChanged.connect(self.update_note_title)
+        self.title_input.textChanged.connect(self.journal_title_change)
+
+        if session:
+            self.show_session_snapshot(session)
+            QTimer.singleShot(0, lambda: self.finish_startup(session))
+        else:
+            self.finish_startup()
+
+    def finish_startup(self, session=None):
+        """
+        Открывает базу и запускает фоновые задачи. Если окно уже нарисовано по снимку сеанса,
+        снимок сверяется с базой по отпечатку и при расхождении заменяется данными из неё.
+        """
         self.create_database()
+        self.recover_from_journal()
+        try:
+            self._change_watcher = ChangeWatcher(DB_FILE)
+            self._change_timer.start()
+        except sqlite3.Error as e:
+            print(f"Ошибка при запуске отслеживания изменений базы: {e}")
+        session_is_current = (bool(session) and self.current_note_id is not None
+                              and session.get("fingerprint") == database_fingerprint(DB_FILE))
+        threading.Thread(target=self.thin_revision_history, name="boranotes-revisions", daemon=True).start()
+        threading.Thread(target=self.backfill_plain_text, name="boranotes-plain-text", daemon=True).start()
+
+        self._journal = self.open_journal()
+        if self._journal:
+            self._save_timer.setInterval(SNAPSHOT_INTERVAL_MS)
+
+        if self.get_setting("auto_backup", "True") == "True":
+            self._backup_timer.start()
+        self._maintenance_timer.start()
+        if self.get_setting("latency_monitor", "False") == "True":
+            self.set_latency_monitor_enabled(True, save=False)
         
         try:
-            with sqlite3.connect(DB_FILE) as conn:
+            with connect_db(DB_FILE) as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT value FROM settings WHERE key = 'sort_method'")
                 if not cursor.fetchone():
@@ -229,21 +797,70 @@ class NotesApp(QWidget):
                     conn.commit()
         except sqlite3.Error as e:
             print(f"Ошибка при установке сортировки по умолчанию: {e}")
-        
-        self.load_theme_setting()
-        self.initUI()
-        self.load_notes()
+
+        if session:
+            saved_theme = self.get_setting("theme")
+            if saved_theme and saved_theme != self.current_theme:
+                self.apply_theme(saved_theme, save=False)
 
         if self.is_first_launch():
+            self.load_notes()
             self.new_note()
-            self.notes_list.setCurrentRow(0)
+        elif session_is_current:
+            self.load_notes(select_id=self.current_note_id)
+            self.text_editor.verticalScrollBar().setValue(session.get("scroll", 0))
         else:
+            if session:
+                self.current_note_id = None
+                self.set_editor_content("", "")
+                self._document_pool.clear()
+            self.load_notes()
             self.load_last_note()
+        self.start_auto_archive()
+        if self._instance_server is not None:
+            self._instance_server.set_handler(self.handle_instance_command)
+
+    def show_session_snapshot(self, session):
+        """Рисует первый экран списка и открытую заметку из снимка сеанса, не обращаясь к базе"""
+        for note_id, title, created_ts, tag_ids, is_pinned, icons in session.get("rows", []):
+            self._add_note_item((note_id, title, created_ts, tuple(tag_ids), format_note_date(created_ts), icons),
+                                is_pinned)
+        self._list_stale = True
+
+        note_id = session.get("note_id")
+        if note_id is None or session.get("content") is None:
+            return
+        self.current_note_id = note_id
+        self.set_editor_content(session.get("title", ""), session["content"])
+        cursor = self.text_editor.textCursor()
+        cursor.setPosition(min(session.get("cursor", 0), self.text_editor.document().characterCount() - 1))
+        self.text_editor.setTextCursor(cursor)
+        self.select_note_in_list(note_id)
 
-        self.text_editor.setAcceptRichText(True)
-        self.setup_shortcuts()
-        self.splitter.splitterMoved.connect(self.check_list_visibility)
-        self.title_input.textChanged.connect(self.update_note_title)
+    def save_session(self):
+        rows = []
+        for i in range(self.notes_list.count()):
+            if len(rows) >= SESSION_LIST_ROWS:
+                break
+            item = self.notes_list.item(i)
+            note = self._notes_cache.get(item.data(Qt.ItemDataRole.UserRole))
+            if note is not None:
+                rows.append([note.id, note.title, note.created_ts, list(note.tag_ids), note.pinned,
+                             item.data(NOTE_ICONS_ROLE)])
+
+        content = self.text_editor.toHtml() if self.current_note_id is not None else None
+        if content is not None and len(content) > SESSION_MAX_CONTENT:
+            content = None
+        write_session(session_path_for(DB_FILE), {
+            "fingerprint": database_fingerprint(DB_FILE),
+            "theme": self.current_theme,
+            "rows": rows,
+            "note_id": self.current_note_id,
+            "title": self.title_input.text(),
+            "content": content,
+            "cursor": self.text_editor.textCursor().position(),
+            "scroll": self.text_editor.verticalScrollBar().value(),
+        })
 
     def initUI(self):
         layout = QVBoxLayout()
@@ -263,15 +880,26 @@ class NotesApp(QWidget):
         self.search_bar.textChanged.connect(self.search_notes)
         left_layout.addWidget(self.search_bar)
 
-        self.notes_list = QListWidget()
-        self.notes_list.setWordWrap(True)  
-        self.notes_list.setTextElideMode(Qt.TextElideMode.ElideNone)
+        self.notes_list = NotesListWidget()
+        self.notes_list.setUniformItemSizes(True)
+        self.notes_list.setLayoutMode(QListView.LayoutMode.Batched)
+        self.notes_list.setBatchSize(LIST_BATCH_SIZE)
+        self.note_delegate = NoteListDelegate(get_theme(self.current_theme)["note_row"], self.notes_list)
+        self.notes_list.setItemDelegate(self.note_delegate)
+        self.notes_list.setSelectionMode(QListWidget.SelectionMode.ExtendedSelection)
         self.notes_list.itemClicked.connect(self.load_note)
-        self.notes_list.currentItemChanged.connect(self.on_item_selection_changed)
+        self.notes_list.notes_moved.connect(self.on_notes_moved)
+        delete_shortcut = QShortcut(QKeySequence(QKeySequence.StandardKey.Delete), self.notes_list)
+        delete_shortcut.setContext(Qt.ShortcutContext.WidgetShortcut)
+        delete_shortcut.activated.connect(self.delete_selected_notes)
         self.notes_list.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.notes_list.customContextMenuRequested.connect(self.show_notes_list_context_menu)
         left_layout.addWidget(self.notes_list)
 
+        self.list_progress_label = QLabel()
+        self.list_progress_label.hide()
+        left_layout.addWidget(self.list_progress_label)
+
         self.right_container = QWidget()
         self.right_container.setMinimumWidth(90)
         self.right_layout = QVBoxLayout(self.right_container)
@@ -337,9 +965,10 @@ class NotesApp(QWidget):
 
         self.text_editor = CustomTextEdit()
         self.text_editor.setFont(QFont("Calibri", 11))
-        self.text_editor.textChanged.connect(self.auto_save)
-        self.text_editor.textChanged.connect(self.auto_format)
-        self.text_editor.textChanged.connect(self.update_counter)
+        self.text_editor.edited.connect(self.on_text_edited)
+        self.text_editor.latency_monitor = self._latency
+        self.text_editor.document().contentsChange.connect(self.journal_contents_change)
+        self.text_editor.document().contentsChange.connect(self.text_editor.track_edit_range)
         self.text_editor.selectionChanged.connect(self.update_color_button_state)  
         self.text_editor.setViewportMargins(1, 0, 0, 0)
 
@@ -369,11 +998,11 @@ class NotesApp(QWidget):
         self.sort_button.setToolTip("Сортировка заметок")
         bottom_layout.addWidget(self.sort_button)
 
-        self.category_button = QPushButton("🗂️")
-        self.category_button.setFixedSize(25, 23)
-        self.category_button.clicked.connect(self.show_category_menu)
-        self.category_button.setToolTip("Категории заметок")
-        bottom_layout.addWidget(self.category_button)
+        self.tag_button = QPushButton("🏷️")
+        self.tag_button.setFixedSize(25, 23)
+        self.tag_button.clicked.connect(self.show_tag_menu)
+        self.tag_button.setToolTip("Теги заметок")
+        bottom_layout.addWidget(self.tag_button)
 
         self.settings_button = QPushButton("⚙️")
         self.settings_button.setFixedSize(25, 23)
@@ -391,42 +1020,65 @@ class NotesApp(QWidget):
 
         bottom_layout.addStretch()
 
+        self.latency_label = QLabel()
+        self.latency_label.hide()
+        bottom_layout.addWidget(self.latency_label)
+
         self.counter_label = QLabel()
         bottom_layout.addWidget(self.counter_label)
 
         layout.addWidget(bottom_panel)
         self.setLayout(layout)
         
-        self.apply_theme(self.current_theme)
+        self.apply_theme(self.current_theme, save=False)
+
+    def cached_menu(self, name, build):
+        """
+        Возвращает меню из кэша, а при первом обращении строит его функцией build.
+        Меню строятся под текущую тему; apply_theme сбрасывает кэш через invalidate_menus.
+        """
+        entry = self._menus.get(name)
+        if entry is None:
+            entry = self._menus[name] = build(get_theme(self.current_theme))
+            self._menus_built += 1
+        return entry
+
+    def invalidate_menus(self):
+        for menu, actions in self._menus.values():
+            menu.deleteLater()
+        self._menus.clear()
+        self.text_editor.invalidate_context_menu()
 
     def show_title_context_menu(self, position):
+        context_menu, actions = self.cached_menu("title", self.build_title_menu)
+        
+        has_selected_text = self.title_input.hasSelectedText()
+        actions["copy"].setEnabled(has_selected_text)
+        actions["cut"].setEnabled(has_selected_text)
+        
+        context_menu.exec(self.title_input.mapToGlobal(position))
+
+    def build_title_menu(self, theme):
         context_menu = QMenu(self)
         context_menu.setFont(QFont("Calibri", 9))
-        
-        theme = get_theme(self.current_theme)
         context_menu.setStyleSheet(theme["menu_style"])
         
-        has_selected_text = self.title_input.hasSelectedText()
-        has_any_text = bool(self.title_input.text())
-        
         copy_action = context_menu.addAction(" 📋  Копировать ")
         copy_action.triggered.connect(self.title_input.copy)
-        copy_action.setEnabled(has_selected_text)
 
         cut_action = context_menu.addAction(" ✂️  Вырезать ")
         cut_action.triggered.connect(self.title_input.cut)
-        cut_action.setEnabled(has_selected_text)
         
         paste_action = context_menu.addAction(" 📌  Вставить ")
         paste_action.triggered.connect(self.title_input.paste)
         
-        context_menu.exec(self.title_input.mapToGlobal(position))
+        return context_menu, {"copy": copy_action, "cut": cut_action}
 
     def open_spotify(self):
         show_spotify_confirmation = True
         
         try:
-            with sqlite3.connect(DB_FILE) as conn:
+            with connect_db(DB_FILE) as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT value FROM settings WHERE key = 'show_spotify_confirmation'")
                 result = cursor.fetchone()
@@ -453,7 +1105,7 @@ class NotesApp(QWidget):
             
             if checkbox.isChecked():
                 try:
-                    with sqlite3.connect(DB_FILE) as conn:
+                    with connect_db(DB_FILE) as conn:
                         cursor = conn.cursor()
                         cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", 
                                     ("show_spotify_confirmation", "False"))
@@ -471,161 +1123,412 @@ class NotesApp(QWidget):
             return
             
         title = self.title_input.text().strip()
-        is_pinned = self._notes_cache[self.current_note_id].get('pinned', False)
+        cached_note = self._notes_cache.get(self.current_note_id)
         
-        for i in range(self.notes_list.count()):
-            item = self.notes_list.item(i)
-            if item and item.data(Qt.ItemDataRole.UserRole) == self.current_note_id:
-                current_text = item.text()
-                date_line = current_text.split('\n')[1] if '\n' in current_text else ""
-                new_title = title if title else "Без Названия"
-                display_title = f"⭐ {new_title}" if is_pinned else new_title
-                item.setText(f"{display_title}\n{date_line}")
-                break
+        item = self._list_items.get(self.current_note_id)
+        if item is not None:
+            item.setText(title if title else "Без Названия")
         
-        if self.current_note_id in self._notes_cache:
-            self._notes_cache[self.current_note_id]['title'] = title
+        if cached_note:
+            cached_note.title = title
 
     def show_notes_list_context_menu(self, position):
-        theme = get_theme(self.current_theme)
+        item = self.notes_list.itemAt(position)
+        
+        if not item:
+            context_menu, actions = self.cached_menu("notes_list_empty", self.build_notes_list_empty_menu)
+            context_menu.exec(self.notes_list.mapToGlobal(position))
+            return
+        
+        selected_ids = self.selected_note_ids()
+        if len(selected_ids) > 1 and item.isSelected():
+            self.show_bulk_context_menu(position, selected_ids)
+            return
+        
+        context_menu, actions = self.cached_menu("notes_list", self.build_notes_list_menu)
+        note_id = item.data(Qt.ItemDataRole.UserRole)
+        self._menu_note_id = note_id
+        is_pinned = self._notes_cache[note_id].pinned
+        pinned_count = self._notes_cache.pinned_count
+        
+        pin_action = actions["pin"]
+        if is_pinned:
+            pin_action.setText("⭐ Открепить")
+            pin_action.setEnabled(True)
+        elif pinned_count >= 3:
+            pin_action.setText("⭐ Закрепить (достигнут лимит)")
+            pin_action.setEnabled(False)
+        else:
+            pin_action.setText("⭐ Закрепить")
+            pin_action.setEnabled(True)
+        
+        note = self._notes_cache[note_id]
+        for tag_id, action in actions["add_tag"].items():
+            action.setVisible(not note.has_tag(tag_id))
+        
+        actions["remove_tag_menu"].menuAction().setVisible(bool(note.tag_ids))
+        for tag_id, action in actions["remove_tag"].items():
+            action.setVisible(note.has_tag(tag_id))
+        
+        context_menu.exec(self.notes_list.mapToGlobal(position))
+
+    def build_notes_list_menu(self, theme):
         context_menu = QMenu(self)
         context_menu.setStyleSheet(theme["menu_style"])
+        actions = {}
         
-        item = self.notes_list.itemAt(position)
+        actions["pin"] = context_menu.addAction("⭐ Закрепить")
+        actions["pin"].triggered.connect(lambda: self.toggle_pin_status(self._menu_note_id))
         
-        if item:
-            note_id = item.data(Qt.ItemDataRole.UserRole)
-            is_pinned = self._notes_cache[note_id].get('pinned', False)
-            
-            pinned_count = sum(1 for note in self._notes_cache.values() if note.get('pinned', False))
-            
-            pin_action = context_menu.addAction("⭐ Открепить" if is_pinned else "⭐ Закрепить")
-            pin_action.triggered.connect(lambda: self.toggle_pin_status(note_id))
-            
-            if not is_pinned and pinned_count >= 3:
-                pin_action.setEnabled(False)
-                pin_action.setText("⭐ Закрепить (достигнут лимит)")
-            
-            delete_action = context_menu.addAction(" ❌ Удалить запись ")
-            delete_action.triggered.connect(self.delete_note)
-            
-            context_menu.addSeparator()
-            
-            current_categories = self._notes_cache[note_id].get('categories', [])
-            
-            category_menu = context_menu.addMenu("🗂️ Добавить в категорию")
-            category_menu.setStyleSheet(theme["menu_style"])
-            
-            categories = [
-                {"icon": "📓", "name": "Личное", "id": "personal"},
-                {"icon": "📚", "name": "Учеба", "id": "study"},
-                {"icon": "👔", "name": "Работа", "id": "work"},
-                {"icon": "🏡", "name": "Ежедневное", "id": "daily"},
-                {"icon": "☁️", "name": "Вдохновение", "id": "inspiration"}
-            ]
+        delete_action = context_menu.addAction(" ❌ Удалить запись ")
+        delete_action.triggered.connect(self.delete_note)
+
+        history_action = context_menu.addAction("🕘 История изменений")
+        history_action.triggered.connect(lambda: self.show_note_history(self._menu_note_id))
+
+        archive_action = context_menu.addAction("🗄️ Убрать в архив")
+        archive_action.triggered.connect(lambda: self.archive_note_ids([self._menu_note_id]))
+        
+        context_menu.addSeparator()
+        
+        tag_menu = context_menu.addMenu("🏷️ Добавить тег")
+        tag_menu.setStyleSheet(theme["menu_style"])
+        remove_tag_menu = context_menu.addMenu("🗑️ Убрать тег")
+        remove_tag_menu.setStyleSheet(theme["menu_style"])
+        actions["remove_tag_menu"] = remove_tag_menu
+        actions["add_tag"] = {}
+        actions["remove_tag"] = {}
+        
+        for tag, depth in self._tags.tree():
+            text = f"{'    ' * depth}{tag.display_icon} {tag.name}"
+            action = tag_menu.addAction(text)
+            action.triggered.connect(lambda checked, tag_id=tag.id: self.add_note_tag(self._menu_note_id, tag_id))
+            actions["add_tag"][tag.id] = action
             
-            if len(current_categories) >= 2:
-                category_menu.setEnabled(False)
-                category_menu.setTitle("🗂️ Добавить в категорию (достигнут лимит)")
-            else:
-                for category in categories:
-                    if category["id"] not in current_categories:
-                        action = category_menu.addAction(f"{category['icon']} {category['name']}")
-                        action.triggered.connect(lambda checked, cat=category["id"]: self.add_note_to_category(note_id, cat))
+            action = remove_tag_menu.addAction(text)
+            action.triggered.connect(lambda checked, tag_id=tag.id: self.remove_note_tag(self._menu_note_id, tag_id))
+            actions["remove_tag"][tag.id] = action
+        
+        tag_menu.addSeparator()
+        new_tag_action = tag_menu.addAction("➕ Новый тег…")
+        new_tag_action.triggered.connect(lambda: self.create_tag_dialog(note_id=self._menu_note_id))
+        return context_menu, actions
+
+    def show_bulk_context_menu(self, position, note_ids):
+        context_menu, actions = self.cached_menu("notes_bulk", self.build_bulk_menu)
+        notes = [self._notes_cache[note_id] for note_id in note_ids if note_id in self._notes_cache]
+        
+        actions["count"].setText(f"Выбрано заметок: {len(note_ids)}")
+        actions["pin"].setVisible(any(not note.pinned for note in notes))
+        actions["unpin"].setVisible(any(note.pinned for note in notes))
+        for tag_id, action in actions["add_tag"].items():
+            action.setVisible(any(not note.has_tag(tag_id) for note in notes))
+        has_tags = False
+        for tag_id, action in actions["remove_tag"].items():
+            visible = any(note.has_tag(tag_id) for note in notes)
+            action.setVisible(visible)
+            has_tags = has_tags or visible
+        actions["remove_tag_menu"].menuAction().setVisible(has_tags)
+        self.update_bulk_undo_action(actions["undo"])
+        
+        context_menu.exec(self.notes_list.mapToGlobal(position))
+
+    def build_bulk_menu(self, theme):
+        context_menu = QMenu(self)
+        context_menu.setStyleSheet(theme["menu_style"])
+        actions = {"add_tag": {}, "remove_tag": {}}
+        
+        actions["count"] = context_menu.addAction("")
+        actions["count"].setEnabled(False)
+        context_menu.addSeparator()
+        
+        actions["pin"] = context_menu.addAction("⭐ Закрепить выбранные")
+        actions["pin"].triggered.connect(lambda: self.set_selected_pinned(True))
+        actions["unpin"] = context_menu.addAction("⭐ Открепить выбранные")
+        actions["unpin"].triggered.connect(lambda: self.set_selected_pinned(False))
+        
+        delete_action = context_menu.addAction(" ❌ Удалить выбранные ")
+        delete_action.triggered.connect(self.delete_selected_notes)
+        
+        archive_action = context_menu.addAction("🗄️ Убрать выбранные в архив")
+        archive_action.triggered.connect(lambda: self.archive_note_ids(self.selected_note_ids()))
+        
+        context_menu.addSeparator()
+        
+        tag_menu = context_menu.addMenu("🏷️ Добавить тег")
+        tag_menu.setStyleSheet(theme["menu_style"])
+        remove_tag_menu = context_menu.addMenu("🗑️ Убрать тег")
+        remove_tag_menu.setStyleSheet(theme["menu_style"])
+        actions["remove_tag_menu"] = remove_tag_menu
+        for tag, depth in self._tags.tree():
+            text = f"{'    ' * depth}{tag.display_icon} {tag.name}"
+            action = tag_menu.addAction(text)
+            action.triggered.connect(lambda checked, tag_id=tag.id: self.tag_selected_notes(tag_id, True))
+            actions["add_tag"][tag.id] = action
             
-            if current_categories:
-                remove_category_menu = context_menu.addMenu("🗑️ Убрать из категории")
-                remove_category_menu.setStyleSheet(theme["menu_style"])
-                
-                for cat_id in current_categories:
-                    category_info = next((c for c in categories if c["id"] == cat_id), None)
-                    if category_info:
-                        action = remove_category_menu.addAction(f"{category_info['icon']} {category_info['name']}")
-                        action.triggered.connect(lambda checked, cat=cat_id: self.remove_note_from_category(note_id, cat))
+            action = remove_tag_menu.addAction(text)
+            action.triggered.connect(lambda checked, tag_id=tag.id: self.tag_selected_notes(tag_id, False))
+            actions["remove_tag"][tag.id] = action
+        
+        export_menu = context_menu.addMenu("📤 Экспортировать выбранные")
+        export_menu.setStyleSheet(theme["menu_style"])
+        for target, target_name in (("directory", "📁 В папку"), ("zip", "🗜️ В ZIP-архив"), ("jsonl", "🧾 В JSONL-файл")):
+            target_menu = export_menu.addMenu(target_name)
+            target_menu.setStyleSheet(theme["menu_style"])
+            for export_format, format_name in (("txt", "Простой текст (.txt)"), ("md", "Markdown (.md)"),
+                                               ("html", "HTML (.html)")):
+                action = target_menu.addAction(format_name)
+                action.triggered.connect(lambda checked, t=target, f=export_format:
+                                         self.export_all_notes(t, f, note_ids=self.selected_note_ids()))
+        
+        context_menu.addSeparator()
+        actions["undo"] = context_menu.addAction("")
+        actions["undo"].triggered.connect(self.undo_last_bulk_change)
+        return context_menu, actions
+
+    def update_bulk_undo_action(self, action):
+        if self._bulk_undo:
+            action.setText(f"↩️ Отменить: {self._bulk_undo[-1].description}")
+            action.setEnabled(True)
+        else:
+            action.setText("↩️ Отменить")
+            action.setEnabled(False)
+
+    def selected_note_ids(self):
+        return [item.data(Qt.ItemDataRole.UserRole) for item in self.notes_list.selectedItems()]
+
+    def run_bulk_change(self, change_function, *args):
+        """
+        Выполняет массовое действие над заметками в одной транзакции и кладёт его в стек отмены.
+        Список после этого перестраивается вызывающим один раз.
+        """
+        self._perform_auto_save()
+        try:
+            with connect_db(DB_FILE) as conn, own_changes(conn, self._change_watcher):
+                change = change_function(conn.cursor(), *args)
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось выполнить действие над заметками: {str(e)}")
+            return None
+        self._bulk_undo.append(change)
+        return change
+
+    def delete_selected_notes(self):
+        note_ids = self.selected_note_ids()
+        if len(note_ids) <= 1:
+            self.delete_note()
+            return
+        
+        if not self.skip_delete_confirmation:
+            reply = QMessageBox.question(self, "Удаление",
+                                         f"Удалить выбранные заметки ({len(note_ids)})? Действие можно отменить.",
+                                         QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+        
+        next_note_id = self.note_after_removal(note_ids)
+        if self.run_bulk_change(bulk_delete_notes, note_ids, f"удаление заметок ({len(note_ids)})") is None:
+            return
+        self.drop_notes(note_ids, next_note_id)
+
+    def note_after_removal(self, note_ids):
+        """Заметка, которую открыть, когда note_ids уйдут из списка: ближайшая ниже них, иначе выше"""
+        removed = set(note_ids)
+        rows = sorted(self.notes_list.row(self._list_items[note_id]) for note_id in removed if note_id in self._list_items)
+        if not rows:
+            return None
+        for row in list(range(rows[-1] + 1, self.notes_list.count())) + list(range(rows[0] - 1, -1, -1)):
+            candidate = self.notes_list.item(row).data(Qt.ItemDataRole.UserRole)
+            if candidate not in removed:
+                return candidate
+        return None
+
+    def drop_notes(self, note_ids, next_note_id=None):
+        """Забывает заметки, которых больше нет в основной базе, и перестраивает список один раз"""
+        for note_id in note_ids:
+            self._notes_cache.remove(note_id)
+            if self._journal:
+                self._journal.checkpoint(note_id)
+            self._document_pool.remove(note_id)
+            self._prefetcher.forget(note_id)
+        
+        if self.current_note_id in set(note_ids):
+            self.current_note_id = None
+            self.need_save = False
+            self.set_editor_content("", "")
+            self.load_notes(select_id=next_note_id)
+            if next_note_id is not None:
+                self.open_note(next_note_id)
         else:
-            new_action = context_menu.addAction(" ✏️ Создать запись ")
-            new_action.triggered.connect(self.new_note)
+            self.load_notes(select_id=self.current_note_id)
+
+    def set_selected_pinned(self, pinned):
+        note_ids = [note_id for note_id in self.selected_note_ids()
+                    if note_id in self._notes_cache and self._notes_cache[note_id].pinned != pinned]
+        if not note_ids:
+            return
+        if pinned and self._notes_cache.pinned_count + len(note_ids) > 3:
+            QMessageBox.information(self, "Ошибка", "Можно закрепить не более 3 заметок")
+            return
         
-        context_menu.exec(self.notes_list.mapToGlobal(position))
+        description = f"{'закрепление' if pinned else 'открепление'} заметок ({len(note_ids)})"
+        if self.run_bulk_change(bulk_set_pinned, note_ids, pinned, description) is None:
+            return
+        for note_id in note_ids:
+            self._notes_cache.set_pinned(note_id, pinned)
+        self.load_notes(select_id=self.current_note_id)
+
+    def tag_selected_notes(self, tag_id, add):
+        note_ids = self.selected_note_ids()
+        tag_name = self._tags.path(tag_id)
+        if add:
+            change = self.run_bulk_change(bulk_add_tag, note_ids, tag_id, f"тег «{tag_name}» для заметок ({len(note_ids)})")
+        else:
+            change = self.run_bulk_change(bulk_remove_tag, note_ids, tag_id, f"снятие тега «{tag_name}» ({len(note_ids)})")
+        if change is None:
+            return
+        for note_id in change.note_ids:
+            if add:
+                self._notes_cache.add_tag(note_id, tag_id)
+            else:
+                self._notes_cache.remove_tag(note_id, tag_id)
+        self.load_notes(select_id=self.current_note_id)
 
+    def undo_last_bulk_change(self):
+        if not self._bulk_undo:
+            return
+        change = self._bulk_undo.pop()
+        try:
+            with connect_db(DB_FILE) as conn, own_changes(conn, self._change_watcher):
+                undo_bulk_change(conn.cursor(), change)
+        except sqlite3.Error as e:
+            self._bulk_undo.append(change)
+            QMessageBox.warning(self, "Ошибка", f"Не удалось отменить действие: {str(e)}")
+            return
+        
+        if change.kind == "pin":
+            for note_id, pinned in change.pinned.items():
+                if note_id in self._notes_cache:
+                    self._notes_cache.set_pinned(note_id, pinned)
+        elif change.kind == "add_tag":
+            for note_id in change.note_ids:
+                self._notes_cache.remove_tag(note_id, change.tag_id)
+        elif change.kind == "remove_tag":
+            for note_id in change.note_ids:
+                self._notes_cache.add_tag(note_id, change.tag_id)
+        
+        select_id = self.current_note_id
+        if change.kind == "delete" and select_id is None and change.note_ids:
+            select_id = change.note_ids[0]
+        self.load_notes(select_id=select_id)
+        if select_id != self.current_note_id:
+            self.open_note(select_id)
+
+    def build_notes_list_empty_menu(self, theme):
+        context_menu = QMenu(self)
+        context_menu.setStyleSheet(theme["menu_style"])
+        
+        new_action = context_menu.addAction(" ✏️ Создать запись ")
+        new_action.triggered.connect(self.new_note)
+        return context_menu, {}
 
-    def add_note_to_category(self, note_id, category):
+
+    def add_note_tag(self, note_id, tag_id):
         try:
-            with sqlite3.connect(DB_FILE) as conn:
+            with connect_db(DB_FILE) as conn:
                 cursor = conn.cursor()
-
-                cursor.execute("SELECT COUNT(*) FROM categories WHERE note_id = ?", (note_id,))
-                category_count = cursor.fetchone()[0]
-                
-                if category_count >= 2:
-                    QMessageBox.information(self, "Ограничение", "Заметка может быть добавлена максимум в 2 категории")
-                    return
-                
-                cursor.execute("INSERT OR IGNORE INTO categories (note_id, category) VALUES (?, ?)", 
-                            (note_id, category))
+                cursor.execute("INSERT OR IGNORE INTO note_tags (tag_id, note_id) VALUES (?, ?)", (tag_id, note_id))
                 conn.commit()
                 
-                if note_id in self._notes_cache:
-                    categories = self._notes_cache[note_id].get('categories', [])
-                    if category not in categories:
-                        categories.append(category)
-                        self._notes_cache[note_id]['categories'] = categories
+                self._notes_cache.add_tag(note_id, tag_id)
                 
-                current_row = self.notes_list.currentRow()
-                self.load_notes()
-
-                for i in range(self.notes_list.count()):
-                    item = self.notes_list.item(i)
-                    if item and item.data(Qt.ItemDataRole.UserRole) == note_id:
-                        self.notes_list.setCurrentRow(i)
-                        break
+                self.load_notes(select_id=note_id)
                 
         except sqlite3.Error as e:
-            QMessageBox.warning(self, "Ошибка", f"Не удалось добавить заметку в категорию: {str(e)}")
+            QMessageBox.warning(self, "Ошибка", f"Не удалось добавить тег: {str(e)}")
 
-    def remove_note_from_category(self, note_id, category):
+    def remove_note_tag(self, note_id, tag_id):
         try:
-            with sqlite3.connect(DB_FILE) as conn:
+            with connect_db(DB_FILE) as conn:
                 cursor = conn.cursor()
-                cursor.execute("DELETE FROM categories WHERE note_id = ? AND category = ?", 
-                            (note_id, category))
+                cursor.execute("DELETE FROM note_tags WHERE tag_id = ? AND note_id = ?", (tag_id, note_id))
                 conn.commit()
                 
-                if note_id in self._notes_cache:
-                    categories = self._notes_cache[note_id].get('categories', [])
-                    if category in categories:
-                        categories.remove(category)
-                        self._notes_cache[note_id]['categories'] = categories
+                self._notes_cache.remove_tag(note_id, tag_id)
                 
-                current_row = self.notes_list.currentRow()
-                self.load_notes()
-                
-                for i in range(self.notes_list.count()):
-                    item = self.notes_list.item(i)
-                    if item and item.data(Qt.ItemDataRole.UserRole) == note_id:
-                        self.notes_list.setCurrentRow(i)
-                        break
+                self.load_notes(select_id=note_id)
                 
         except sqlite3.Error as e:
-            QMessageBox.warning(self, "Ошибка", f"Не удалось удалить заметку из категории: {str(e)}")
+            QMessageBox.warning(self, "Ошибка", f"Не удалось убрать тег: {str(e)}")
 
-    def apply_theme(self, theme_name):
+    def reload_tags(self):
+        """Перечитывает теги и сбрасывает меню, в которых они перечислены"""
+        try:
+            with connect_db(DB_FILE) as conn:
+                self._tags.load(conn.cursor())
+        except sqlite3.Error as e:
+            print(f"Ошибка при загрузке тегов: {e}")
+        for name in ("tags", "notes_list", "notes_bulk"):
+            entry = self._menus.pop(name, None)
+            if entry is not None:
+                entry[0].deleteLater()
+
+    def create_tag_dialog(self, note_id=None):
+        path, ok = QInputDialog.getText(self, "Новый тег",
+                                        "Название тега (вложенные теги через «/», например Работа/Проекты):")
+        if not ok or not path.strip():
+            return
+        try:
+            with connect_db(DB_FILE) as conn:
+                tag_id = create_tag(conn.cursor(), path)
+                conn.commit()
+        except (sqlite3.Error, ValueError) as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось создать тег: {str(e)}")
+            return
+        self.reload_tags()
+        if note_id is not None:
+            self.add_note_tag(note_id, tag_id)
+
+    def confirm_delete_tag(self, tag_id):
+        tag = self._tags.get(tag_id)
+        if tag is None:
+            return
+        reply = QMessageBox.question(self, "Удаление тега",
+                                     f"Удалить тег «{self._tags.path(tag_id)}» и все вложенные в него? "
+                                     "Сами заметки останутся.",
+                                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+        removed = set(self._tags.descendants(tag_id))
+        try:
+            with connect_db(DB_FILE) as conn:
+                delete_tag(conn.cursor(), self._tags, tag_id)
+                conn.commit()
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось удалить тег: {str(e)}")
+            return
+        self._notes_cache.drop_tags(removed)
+        self.reload_tags()
+
+        tag_filter = self.get_tag_filter()
+        for key in ("all", "any", "none"):
+            tag_filter[key] = [t for t in tag_filter[key] if t not in removed]
+        self.set_tag_filter(tag_filter)
+
+    def apply_theme(self, theme_name, save=True):
         self.current_theme = theme_name
         theme = get_theme(theme_name)
+        self.invalidate_menus()
         
         self.setStyleSheet(theme["main_window"])
-        self.notes_list.setStyleSheet(theme["notes_list"] + """
-            QListWidget::item {
-                padding: 5px;
-                min-height: 40px;
-            }
-        """)
+        self.notes_list.setStyleSheet(theme["notes_list"])
         self.search_bar.setStyleSheet(theme["search_bar"])
         self.editor_container.setStyleSheet(theme["editor_container"])
         self.text_editor.setStyleSheet(theme["text_editor"])
         self.title_input.setStyleSheet(theme["title_input"])
         self.separator.setStyleSheet(theme["separator"])
         self.counter_label.setStyleSheet(theme["counter_label"])
+        self.list_progress_label.setStyleSheet(theme["counter_label"])
+        self.latency_label.setStyleSheet(theme["counter_label"])
         if hasattr(self, 'empty_state_label') and self.empty_state_label:
             self.empty_state_label.setStyleSheet(theme["empty_state_label"])
         
@@ -633,7 +1536,7 @@ class NotesApp(QWidget):
         self.btn_new.setStyleSheet(theme["button_style"])
         self.btn_delete.setStyleSheet(theme["button_style"])
         self.sort_button.setStyleSheet(theme["sort_button"])
-        self.category_button.setStyleSheet(theme["sort_button"])  
+        self.tag_button.setStyleSheet(theme["sort_button"])  
         self.settings_button.setStyleSheet(theme["settings_button"])
         self.spotify_button.setStyleSheet(theme["settings_button"])
         
@@ -645,75 +1548,85 @@ class NotesApp(QWidget):
 
         QApplication.instance().setStyleSheet(theme["tooltip_style"])
         
-        current_item = self.notes_list.currentItem()
-        for i in range(self.notes_list.count()):
-            item = self.notes_list.item(i)
-            if item and item.data(Qt.ItemDataRole.UserRole) in self._notes_cache:
-                note_id = item.data(Qt.ItemDataRole.UserRole)
-                if self._notes_cache[note_id].get('pinned', False):
-                    is_selected = (item == current_item)
-                    
-                    if theme_name == "light":
-                        if is_selected:
-                            item.setBackground(QColor("#eecbe3"))  
-                        else:
-                            item.setBackground(QColor("#f1dbea"))  
-                    else:
-                        if is_selected:
-                            item.setBackground(QColor("#858585")) 
-                        else:
-                            item.setBackground(QColor("#484444")) 
+        self.note_delegate.set_colors(theme["note_row"])
+        self.notes_list.viewport().update()
         
-        self.update_highlight_color()
-        self.save_theme_setting(theme_name)
+        current_document = self.text_editor.document()
+        self.update_highlight_color(current_document)
+        for entry in self._document_pool.entries():
+            if entry.document is not current_document:
+                self.update_highlight_color(entry.document)
+        if save:
+            self.save_theme_setting(theme_name)
 
 
-    def update_highlight_color(self):
-        doc = self.text_editor.document()
+    def update_highlight_color(self, doc=None):
+        doc = doc or self.text_editor.document()
         highlight_color = QColor("#775c88") if self.current_theme == "dark" else QColor("#e4d5ff")
         old_highlight_color = QColor("#e4d5ff") if self.current_theme == "dark" else QColor("#775c88")
         
         processed_blocks = 0
         skipped_blocks = 0
         
-        cursor = QTextCursor(doc)
-        block = doc.firstBlock()
+        with self.text_editor.edit_transaction(QTextCursor(doc)) as cursor:
+            block = doc.firstBlock()
         
-        while block.isValid():
-            cursor.setPosition(block.position())
-            has_relevant_formatting = False
+            while block.isValid():
+                cursor.setPosition(block.position())
+                has_relevant_formatting = False
             
-            it = block.begin()
-            while not it.atEnd():
-                fragment = it.fragment()
-                if fragment.isValid():
-                    char_format = fragment.charFormat()
-                    bg_color = char_format.background().color()
+                it = block.begin()
+                while not it.atEnd():
+                    fragment = it.fragment()
+                    if fragment.isValid():
+                        char_format = fragment.charFormat()
+                        bg_color = char_format.background().color()
                     
-                    if bg_color.name() in [old_highlight_color.name(), "#e4d5ff", "#775c88"]:
-                        has_relevant_formatting = True
-                        break
-                it += 1
+                        if bg_color.name() in [old_highlight_color.name(), "#e4d5ff", "#775c88"]:
+                            has_relevant_formatting = True
+                            break
+                    it += 1
             
-            if has_relevant_formatting:
-                cursor.movePosition(QTextCursor.MoveOperation.StartOfBlock)
-                cursor.movePosition(QTextCursor.MoveOperation.EndOfBlock,
-                                QTextCursor.MoveMode.KeepAnchor)
+                if has_relevant_formatting:
+                    cursor.movePosition(QTextCursor.MoveOperation.StartOfBlock)
+                    cursor.movePosition(QTextCursor.MoveOperation.EndOfBlock,
+                                    QTextCursor.MoveMode.KeepAnchor)
                 
-                new_format = QTextCharFormat()
-                new_format.setBackground(highlight_color)
-                cursor.mergeCharFormat(new_format)
+                    new_format = QTextCharFormat()
+                    new_format.setBackground(highlight_color)
+                    cursor.mergeCharFormat(new_format)
                 
-                processed_blocks += 1
-            else:
-                skipped_blocks += 1
+                    processed_blocks += 1
+                else:
+                    skipped_blocks += 1
             
-            block = block.next()
+                block = block.next()
 
 
+    def get_setting(self, key, default=None):
+        try:
+            with connect_db(DB_FILE) as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT value FROM settings WHERE key = ?", (key,))
+                result = cursor.fetchone()
+                if result:
+                    return result[0]
+        except sqlite3.Error as e:
+            print(f"Ошибка при чтении настройки {key}: {e}")
+        return default
+
+    def set_setting(self, key, value):
+        try:
+            with connect_db(DB_FILE) as conn:
+                cursor = conn.cursor()
+                cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, str(value)))
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Ошибка при сохранении настройки {key}: {e}")
+
     def load_theme_setting(self):
         try:
-            with sqlite3.connect(DB_FILE) as conn:
+            with connect_db(DB_FILE) as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='settings'")
                 if cursor.fetchone() is None:
@@ -732,7 +1645,7 @@ class NotesApp(QWidget):
 
     def save_theme_setting(self, theme_name):
         try:
-            with sqlite3.connect(DB_FILE) as conn:
+            with connect_db(DB_FILE) as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='settings'")
                 if cursor.fetchone() is None:
@@ -747,11 +1660,45 @@ class NotesApp(QWidget):
             print(f"Ошибка при сохранении темы: {e}")
 
     def show_settings(self):
+        settings_menu, actions = self.cached_menu("settings", self.build_settings_menu)
+        
+        auto_backup = self.get_setting("auto_backup", "True") == "True"
+        actions["auto_backup"].setText(f"Каждые {BACKUP_INTERVAL_MINUTES} мин." + ("   ✓" if auto_backup else ""))
+
+        compress_backups = self.get_setting("backup_compress", "True") == "True"
+        actions["compress"].setText("Сжимать копии" + ("   ✓" if compress_backups else ""))
+
+        if self.backup_stats:
+            last = self.backup_stats[-1]
+            actions["backup_status"].setText(
+                f"Последняя копия: {last['started_at'][11:16]}, {last['duration']:.2f} с, {last['size'] / 1024:.0f} КБ"
+                if last["ok"] else f"Последняя копия не удалась: {last['message']}")
+        actions["backup_status"].setVisible(bool(self.backup_stats))
+
+        archive_days = self.get_setting("archive_after_days", "0")
+        for days, (action, text) in actions["archive_after"].items():
+            action.setText(text + ("   ✓" if archive_days == str(days) else ""))
+
+        prefetch_enabled = self.get_setting("prefetch", "True") == "True"
+        actions["prefetch"].setText("Фоновая подгрузка заметок" + ("   ✓" if prefetch_enabled else ""))
+        requests = self._prefetcher.hits + self._prefetcher.misses
+        if requests:
+            actions["prefetch_status"].setText(
+                f"Попаданий подгрузки: {self._prefetcher.hit_rate():.0%} "
+                f"({self._prefetcher.hits} из {requests}, "
+                f"впустую: {self._prefetcher.wasted})")
+        actions["prefetch_status"].setVisible(bool(requests))
+
+        actions["latency"].setText("Замер задержки ввода" + ("   ✓" if self._latency.enabled else ""))
+        actions["latency_export"].setEnabled(bool(self._latency.histograms))
+    
+        settings_menu.exec(self.settings_button.mapToGlobal(QPoint(0, -settings_menu.sizeHint().height())))
+
+    def build_settings_menu(self, theme):
         settings_menu = QMenu(self)
         settings_menu.setFont(QFont("Calibri", 9))
-        
-        theme = get_theme(self.current_theme)
         settings_menu.setStyleSheet(theme["menu_style"])
+        actions = {}
         
         theme_menu = settings_menu.addMenu("Тема оформления")
         theme_menu.setStyleSheet(theme["menu_style"])
@@ -762,12 +1709,312 @@ class NotesApp(QWidget):
         light_theme.triggered.connect(lambda: self.apply_theme("light"))
         dark_theme.triggered.connect(lambda: self.apply_theme("dark"))
 
+        export_menu = settings_menu.addMenu("Экспорт заметок")
+        export_menu.setStyleSheet(theme["menu_style"])
+
+        export_targets = [
+            {"name": "📁 В папку", "id": "directory"},
+            {"name": "🗜️ В ZIP-архив", "id": "zip"},
+            {"name": "🧾 В JSONL-файл", "id": "jsonl"}
+        ]
+        export_formats = [
+            {"name": "Простой текст (.txt)", "id": "txt"},
+            {"name": "Markdown (.md)", "id": "md"},
+            {"name": "HTML (.html)", "id": "html"}
+        ]
+
+        for target in export_targets:
+            target_menu = export_menu.addMenu(target["name"])
+            target_menu.setStyleSheet(theme["menu_style"])
+            for export_format in export_formats:
+                action = target_menu.addAction(export_format["name"])
+                action.triggered.connect(lambda checked, t=target["id"], f=export_format["id"]: self.export_all_notes(t, f))
+
+        backup_menu = settings_menu.addMenu("Резервные копии")
+        backup_menu.setStyleSheet(theme["menu_style"])
+
+        backup_now_action = backup_menu.addAction("💾 Создать копию сейчас")
+        backup_now_action.triggered.connect(lambda: self.run_backup(manual=True))
+
+        actions["auto_backup"] = backup_menu.addAction(f"Каждые {BACKUP_INTERVAL_MINUTES} мин.")
+        actions["auto_backup"].triggered.connect(
+            lambda: self.set_auto_backup(self.get_setting("auto_backup", "True") != "True"))
+
+        actions["compress"] = backup_menu.addAction("Сжимать копии")
+        actions["compress"].triggered.connect(
+            lambda: self.set_setting("backup_compress", self.get_setting("backup_compress", "True") != "True"))
+
+        actions["backup_status"] = backup_menu.addAction("")
+        actions["backup_status"].setEnabled(False)
+
+        backup_menu.addSeparator()
+
+        restore_menu = backup_menu.addMenu("Восстановить из копии")
+        restore_menu.setStyleSheet(theme["menu_style"])
+        restore_menu.aboutToShow.connect(lambda: self.fill_restore_menu(restore_menu))
+
+        archive_menu = settings_menu.addMenu("Архив")
+        archive_menu.setStyleSheet(theme["menu_style"])
+        open_archive_action = archive_menu.addAction("🗄️ Открыть архив…")
+        open_archive_action.triggered.connect(self.show_archive)
+        archive_menu.addSeparator()
+        archive_label = archive_menu.addAction("Убирать в архив заметки, не открывавшиеся:")
+        archive_label.setEnabled(False)
+        actions["archive_after"] = {}
+        for days, text in ARCHIVE_AFTER_DAYS_CHOICES:
+            action = archive_menu.addAction(text)
+            action.triggered.connect(lambda checked, d=days: self.set_archive_after_days(d))
+            actions["archive_after"][days] = (action, text)
+        archive_menu.addSeparator()
+        # Восстановление из копии возвращает только основную базу; копии архива лежат рядом, в archive-*.db
+        archive_backup_note = archive_menu.addAction("Копии архива (archive-….db) восстанавливаются вручную")
+        archive_backup_note.setEnabled(False)
+
+        actions["prefetch"] = settings_menu.addAction("Фоновая подгрузка заметок")
+        actions["prefetch"].triggered.connect(
+            lambda: self.set_prefetch_enabled(self.get_setting("prefetch", "True") != "True"))
+        actions["prefetch_status"] = settings_menu.addAction("")
+        actions["prefetch_status"].setEnabled(False)
+
+        actions["latency"] = settings_menu.addAction("Замер задержки ввода")
+        actions["latency"].triggered.connect(lambda: self.set_latency_monitor_enabled(not self._latency.enabled))
+        actions["latency_export"] = settings_menu.addAction("Сохранить замеры задержки в JSON")
+        actions["latency_export"].triggered.connect(self.export_latency_stats)
+
+        memory_action = settings_menu.addAction("Отчёт о памяти")
+        memory_action.triggered.connect(self.show_memory_report)
+
         settings_menu.addSeparator()
         
         about_action = settings_menu.addAction("О программе")
         about_action.triggered.connect(self.show_about_info)
-    
-        settings_menu.exec(self.settings_button.mapToGlobal(QPoint(0, -settings_menu.sizeHint().height())))
+        return settings_menu, actions
+
+    def archive_note_ids(self, note_ids):
+        """Переносит заметки в архивную базу одной транзакцией и убирает их из списка"""
+        note_ids = [note_id for note_id in note_ids if note_id is not None]
+        if not note_ids:
+            return
+        self._perform_auto_save()
+        self.save_pooled_documents()
+        next_note_id = self.note_after_removal(note_ids)
+        try:
+            with attached_archive(DB_FILE) as conn:
+                archived = archive_notes(conn, note_ids)
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось перенести заметки в архив: {str(e)}")
+            return
+        self.drop_notes(archived, next_note_id)
+
+    def show_archive(self):
+        dialog = ArchiveDialog(self.current_theme, self)
+        if dialog.exec() != QDialog.DialogCode.Accepted or not dialog.restored_ids:
+            return
+        try:
+            with attached_archive(DB_FILE) as conn:
+                restored = restore_notes(conn, dialog.restored_ids)
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось вернуть заметки из архива: {str(e)}")
+            return
+        if not restored:
+            QMessageBox.information(self, "Архив", "Эти заметки уже есть в списке")
+            return
+        self._save_current_note()
+        self.load_notes(select_id=restored[0])
+        self.open_note(restored[0])
+
+    def set_archive_after_days(self, days):
+        self.set_setting("archive_after_days", days)
+        self.start_auto_archive()
+
+    def start_auto_archive(self):
+        """
+        Ищет давно не открывавшиеся заметки в фоновом потоке (если задан срок). Сам перенос идёт
+        небольшими пачками в основном потоке, чтобы открытые в это время заметки не попали в архив.
+        """
+        try:
+            days = int(self.get_setting("archive_after_days", "0"))
+        except ValueError:
+            days = 0
+        if days <= 0 or self._archive_poll_timer.isActive():
+            return
+        self._archive_cutoff = stale_cutoff(days)
+        self._archive_candidates = []
+        self._auto_archived = []
+        threading.Thread(target=self._auto_archive_worker, args=(days,),
+                         name="boranotes-archive", daemon=True).start()
+        self._archive_poll_timer.start()
+
+    def _auto_archive_worker(self, days):
+        note_ids = []
+        try:
+            with connect_db(DB_FILE) as conn:
+                note_ids = stale_note_ids(conn, days)
+        except sqlite3.Error as e:
+            print(f"Ошибка при поиске заметок для архивации: {e}")
+        self._archive_queue.put(note_ids)
+
+    def archive_protected_ids(self):
+        """Заметки, которые нельзя убирать в архив: открытая, разобранные в пуле и недавно открытые"""
+        protected = {entry.note_id for entry in self._document_pool.entries()}
+        protected.update(self._pending_access_times)
+        if self.current_note_id is not None:
+            protected.add(self.current_note_id)
+        return protected
+
+    def collect_auto_archived(self):
+        """Переносит очередную пачку кандидатов; исключения перечитываются перед каждой транзакцией"""
+        try:
+            self._archive_candidates = self._archive_queue.get_nowait()
+        except queue.Empty:
+            if not self._archive_candidates:
+                return
+
+        batch = self._archive_candidates[:ARCHIVE_BATCH_SIZE]
+        self._archive_candidates = self._archive_candidates[ARCHIVE_BATCH_SIZE:]
+        if batch:
+            try:
+                with attached_archive(DB_FILE) as conn:
+                    self._auto_archived += archive_notes(conn, batch, exclude=self.archive_protected_ids(),
+                                                         accessed_before=self._archive_cutoff)
+            except sqlite3.Error as e:
+                print(f"Ошибка при автоматической архивации: {e}")
+                self._archive_candidates = []
+        if self._archive_candidates:
+            return
+
+        self._archive_poll_timer.stop()
+        archived, self._auto_archived = self._auto_archived, []
+        if archived:
+            print(f"Перенесено в архив: {len(archived)}")
+            self.drop_notes(archived)
+
+    def fill_restore_menu(self, restore_menu):
+        """Список копий читается с диска только при открытии подменю"""
+        restore_menu.clear()
+        backups = list_backups(backup_dir_for(DB_FILE))
+        for backup in backups:
+            action = restore_menu.addAction(f"{format_note_date(backup['mtime'])}  ({backup['size'] / 1024:.0f} КБ)")
+            action.triggered.connect(lambda checked, path=backup["path"]: self.restore_from_backup(path))
+        if not backups:
+            action = restore_menu.addAction("Копий пока нет")
+            action.setEnabled(False)
+
+    def export_all_notes(self, target, export_format, note_ids=None):
+        if target == "directory":
+            target_path = QFileDialog.getExistingDirectory(self, "Папка для экспорта")
+        elif target == "zip":
+            target_path, _ = QFileDialog.getSaveFileName(self, "Экспорт в ZIP", "boranotes.zip", "ZIP (*.zip)")
+        else:
+            target_path, _ = QFileDialog.getSaveFileName(self, "Экспорт в JSONL", "boranotes.jsonl", "JSONL (*.jsonl)")
+
+        if not target_path:
+            return
+
+        self._perform_auto_save()
+
+        progress_dialog = QProgressDialog("Экспорт заметок...", "Отмена", 0, 0, self)
+        progress_dialog.setWindowTitle("Экспорт")
+        progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        progress_dialog.setMinimumDuration(300)
+        progress_dialog.setStyleSheet(get_theme(self.current_theme)["message_box"])
+
+        def on_progress(done, total):
+            progress_dialog.setMaximum(total)
+            progress_dialog.setValue(done)
+            QApplication.processEvents()
+            return not progress_dialog.wasCanceled()
+
+        try:
+            exported = export_notes(DB_FILE, target_path, target=target, export_format=export_format,
+                                    progress=on_progress, note_ids=note_ids)
+        except (OSError, sqlite3.Error) as e:
+            progress_dialog.close()
+            QMessageBox.warning(self, "Ошибка", f"Не удалось экспортировать заметки: {str(e)}")
+            return
+
+        progress_dialog.close()
+        QMessageBox.information(self, "Экспорт", f"Экспортировано заметок: {exported}")
+
+    def run_idle_maintenance(self):
+        """Обслуживание базы в простое: только если пользователь давно не печатал и прошлый запуск закончен"""
+        if self.need_save or time.monotonic() - self._last_edit_time < MAINTENANCE_IDLE_SECONDS:
+            return
+        if self._maintenance_thread is not None and self._maintenance_thread.is_alive():
+            return
+        self._maintenance_stop.clear()
+        self._maintenance_thread = start_maintenance_thread(DB_FILE, stop=self._maintenance_stop,
+                                                            on_finished=self._on_maintenance_finished)
+
+    def _on_maintenance_finished(self, result, error):
+        if error is not None:
+            print(f"Обслуживание базы прервано: {error}")
+        else:
+            task, message = result
+            print(f"Обслуживание базы ({task}): {message}")
+
+    def run_backup(self, manual=False):
+        self._perform_auto_save()
+        compress = self.get_setting("backup_compress", "True") == "True"
+        start_backup_thread(DB_FILE, on_finished=self._on_backup_finished, compress=compress)
+
+    def _on_backup_finished(self, stats):
+        self.backup_stats.append(stats)
+        if stats["ok"]:
+            print(f"Резервная копия создана: {stats['path']} — {stats['duration']:.2f} с, "
+                  f"{stats['pages']} страниц, {stats['steps']} шагов, {stats['restarts']} перезапусков")
+        else:
+            print(f"Ошибка резервного копирования: {stats['message']}")
+        archive_stats = stats.get("archive")
+        if archive_stats:
+            print(f"Копия архива создана: {archive_stats['path']}" if archive_stats["ok"]
+                  else f"Ошибка копирования архива: {archive_stats['message']}")
+
+    def set_auto_backup(self, enabled):
+        self.set_setting("auto_backup", enabled)
+        if enabled:
+            self._backup_timer.start()
+        else:
+            self._backup_timer.stop()
+
+    def restore_from_backup(self, backup_path):
+        msg = QMessageBox()
+        msg.setWindowTitle("Восстановление")
+        msg.setText("Заменить текущие заметки содержимым резервной копии? Перед этим будет сделана копия текущего состояния.")
+        msg.setStyleSheet(get_theme(self.current_theme)["message_box"])
+        yes_button = QPushButton("Да")
+        no_button = QPushButton("Нет")
+        msg.addButton(yes_button, QMessageBox.ButtonRole.YesRole)
+        msg.addButton(no_button, QMessageBox.ButtonRole.NoRole)
+        msg.exec()
+
+        if msg.clickedButton() != yes_button:
+            return
+
+        self._perform_auto_save()
+        safety_backup = create_backup(DB_FILE, keep=len(list_backups(backup_dir_for(DB_FILE))) + 1)
+        if not safety_backup["ok"]:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось сохранить текущее состояние: {safety_backup['message']}")
+            return
+
+        try:
+            restore_backup(backup_path, DB_FILE)
+        except (OSError, sqlite3.Error) as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось восстановить резервную копию: {str(e)}")
+            return
+
+        self.cancel_prefetch()
+        self.create_database()
+        if self._change_watcher is not None:
+            self._change_watcher.reset()
+        threading.Thread(target=self.backfill_plain_text, name="boranotes-plain-text", daemon=True).start()
+        self._notes_cache.clear()
+        self.current_note_id = None
+        self.set_editor_content("", "")
+        self._document_pool.clear()
+        self.load_notes()
+        self.load_last_note()
+        self.need_save = False
 
     def show_about_info(self):
         about_title = get_about_title()
@@ -779,7 +2026,7 @@ class NotesApp(QWidget):
         </div>
         """
         
-        with sqlite3.connect(DB_FILE) as conn:
+        with connect_db(DB_FILE) as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT id FROM notes WHERE title = ?", (about_title,))
             result = cursor.fetchone()
@@ -794,22 +2041,20 @@ class NotesApp(QWidget):
                         break
                 return
 
-        with sqlite3.connect(DB_FILE) as conn:
+        with connect_db(DB_FILE) as conn:
             cursor = conn.cursor()
+            now = int(time.time())
+            rank = first_rank(cursor)
             cursor.execute(
-                "INSERT INTO notes (title, content, created_at, last_accessed) VALUES (?, ?, datetime('now', 'localtime'), datetime('now', 'localtime'))",
-                (about_title, html_content)
+                "INSERT INTO notes (title, content, created_ts, accessed_ts, modified_ts, rank) VALUES (?, ?, ?, ?, ?, ?)",
+                (about_title, html_content, now, now, now, rank)
             )
             conn.commit()
             note_id = cursor.lastrowid
+        self.check_rank_length(len(rank))
 
-        self.load_notes()
-        for i in range(self.notes_list.count()):
-            item = self.notes_list.item(i)
-            if item.data(Qt.ItemDataRole.UserRole) == note_id:
-                self.notes_list.setCurrentItem(item)
-                self.load_note()
-                break
+        self.load_notes(select_id=note_id)
+        self.open_note(note_id)
 
     def resizeEvent(self, event):
         self.left_container.setMaximumWidth(self.width() - 90)
@@ -833,53 +2078,579 @@ class NotesApp(QWidget):
             self.splitter.setSizes([self.initial_notes_list_width, self.splitter.sizes()[1]])
         self.is_notes_list_visible = not self.is_notes_list_visible
 
+    def _write_note(self, note_id, title, content, plain_text):
+        plain_text, word_count, char_count = text_stats(plain_text)
+        with connect_db(DB_FILE) as conn:
+            cursor = conn.cursor()
+            now = int(time.time())
+            cursor.execute("""
+                UPDATE notes SET title = ?, content = ?, plain_text = ?, word_count = ?, char_count = ?,
+                                 modified_ts = ?, accessed_ts = ?
+                WHERE id = ?
+            """, (title, content, plain_text, word_count, char_count, now, now, note_id))
+            try:
+                record_revision(cursor, note_id, title, content)
+            except sqlite3.Error as e:
+                print(f"Ошибка при сохранении версии заметки: {e}")
+            conn.commit()
+
+        self._notes_cache.update(note_id, title=title, content=content, modified_ts=now)
+        if self._journal:
+            self._journal.checkpoint(note_id)
+
+    def _save_current_note(self):
+        if not (self.need_save and self.current_note_id):
+            return False
+
+        self._write_note(self.current_note_id, self.title_input.text().strip(),
+                         self.text_editor.toHtml(), self.text_editor.toPlainText())
+        self.text_editor.document().setModified(False)
+        self.need_save = False
+        return True
+
+    def _on_document_evicted(self, note_id, document):
+        if not document.isModified():
+            return
+        cached_note = self._notes_cache.get(note_id)
+        title = cached_note.title if cached_note else ""
+        try:
+            self._write_note(note_id, title or "", document.toHtml(), document.toPlainText())
+        except sqlite3.Error as e:
+            print(f"Ошибка при сохранении вытесненной заметки: {e}")
+        document.setModified(False)
+
+    def save_pooled_documents(self):
+        for entry in self._document_pool.entries():
+            if entry.note_id != self.current_note_id:
+                self._on_document_evicted(entry.note_id, entry.document)
+
     def _perform_auto_save(self):
-        if self.need_save and self.current_note_id:
-            title = self.title_input.text().strip()
-            content = self.text_editor.toHtml()
+        if self._save_current_note():
+            current_sort = self.get_setting("sort_method")
+            
+            if current_sort not in ["date_desc", "date_asc", "custom"]:
+                self.move_saved_note_item(self.current_note_id, current_sort)
+        self._save_timer.stop()
+
+    def move_saved_note_item(self, note_id, sort):
+        """
+        Переставляет строку сохранённой заметки на её место при сортировке по имени или времени изменения,
+        не перестраивая список. Закреплённые заметки упорядочены по дате создания и остаются на месте.
+        """
+        if self._list_loading:
+            self.load_notes(select_id=note_id)
+            return
+        item = self._list_items.get(note_id)
+        if item is None or item.data(NOTE_PINNED_ROLE):
+            return
+
+        row = self.notes_list.row(item)
+        scroll_position = self.notes_list.verticalScrollBar().value()
+        self.notes_list.takeItem(row)
+        low, high = 0, self.notes_list.count()
+        while low < high:
+            middle = (low + high) // 2
+            if self.notes_list.item(middle).data(NOTE_PINNED_ROLE):
+                low = middle + 1
+            else:
+                high = middle
+        if sort == "modified_asc":
+            low = self.notes_list.count()
+        elif sort in ("name_asc", "name_desc"):
+            cached_note = self._notes_cache.get(note_id)
+            key = name_sort_key(cached_note.title if cached_note else self.title_input.text().strip())
+            high = self.notes_list.count()
+            while low < high:
+                middle = (low + high) // 2
+                text = self.notes_list.item(middle).text()
+                other = name_sort_key("" if text == "Без Названия" else text)
+                if (other > key) if sort == "name_desc" else (other < key):
+                    low = middle + 1
+                else:
+                    high = middle
+        self.notes_list.insertItem(low, item)
+        search_text = self.search_bar.text().strip().lower()
+        if search_text:
+            item.setHidden(not self.note_matches_search(item, search_text))
+        self.notes_list.setCurrentItem(item)
+        self.notes_list.verticalScrollBar().setValue(scroll_position)
 
-            with sqlite3.connect(DB_FILE) as conn:
+    def poll_external_changes(self):
+        """
+        Проверяет, не изменили ли базу другие соединения (другое окно, скрипт, синхронизация).
+        Изменения копятся, пока список перестраивается, и применяются разом после этого.
+        """
+        if self._change_watcher is None:
+            return
+        try:
+            result = self._change_watcher.poll()
+        except sqlite3.Error as e:
+            print(f"Ошибка при проверке изменений базы: {e}")
+            return
+        if result is not None:
+            changes, complete = result
+            for note_id, ops in changes.items():
+                self._pending_changes.setdefault(note_id, set()).update(ops)
+            self._pending_changes_complete = self._pending_changes_complete and complete
+
+        if not self._pending_changes and self._pending_changes_complete:
+            return
+        if self._list_loading or self._applying_changes:
+            return
+        changes, complete = self._pending_changes, self._pending_changes_complete
+        self._pending_changes = {}
+        self._pending_changes_complete = True
+        self._applying_changes = True
+        try:
+            self.apply_external_changes(changes, complete)
+        finally:
+            self._applying_changes = False
+
+    def apply_external_changes(self, changes, complete):
+        """
+        Обновляет только затронутые строки списка. Свои же записи тоже попадают в журнал,
+        но совпадают с тем, что уже есть в памяти, и ничего не меняют. Вставки, смена
+        закрепления и изменения, влияющие на фильтр или сортировку, перестраивают список целиком.
+        """
+        if not complete or len(changes) > CHANGE_REFRESH_LIMIT:
+            for note_id in [entry.note_id for entry in self._document_pool.entries()]:
+                if note_id != self.current_note_id and not self._document_pool.peek(note_id).document.isModified():
+                    self._document_pool.remove(note_id)
+            for note in self._notes_cache.values():
+                if note.id != self.current_note_id:
+                    note.content = None
+            self.check_open_note_changed()
+            self.load_notes(select_id=self.current_note_id)
+            return
+
+        try:
+            with connect_db(DB_FILE) as conn:
                 cursor = conn.cursor()
-                cursor.execute("UPDATE notes SET title = ?, content = ?, last_accessed = datetime('now', 'localtime') WHERE id = ?", 
-                            (title, content, self.current_note_id))
-                conn.commit()
+                rows = fetch_changed_notes(cursor, changes)
+                cached_ids = [note_id for note_id in changes if note_id != self.current_note_id and (
+                    note_id in self._document_pool
+                    or (note_id in self._notes_cache and self._notes_cache[note_id].content is not None))]
+                contents = fetch_note_contents(cursor, cached_ids) if cached_ids else {}
+        except sqlite3.Error as e:
+            print(f"Ошибка при загрузке изменённых заметок: {e}")
+            return
 
-            self._notes_cache[self.current_note_id] = {'title': title, 'content': content}
-            
-            current_sort = None
-            try:
-                cursor.execute("SELECT value FROM settings WHERE key = 'sort_method'")
-                result = cursor.fetchone()
-                if result:
-                    current_sort = result[0]
-            except sqlite3.Error:
-                pass
-            
-            if current_sort in ["modified_desc", "modified_asc"]:
-                self.notes_list.blockSignals(True)
-                current_row = self.notes_list.currentRow()
-                self.load_notes()  
-                
-                for i in range(self.notes_list.count()):
-                    if self.notes_list.item(i).data(Qt.ItemDataRole.UserRole) == self.current_note_id:
-                        self.notes_list.setCurrentRow(i)
-                        break
-                
-                self.notes_list.blockSignals(False)
+        current_sort = self.get_setting("sort_method", "date_desc")
+        filtered = bool(tag_filter_clause(self.get_tag_filter(), self._tags)[0])
+        icon_map = self._tags.icon_map()
+        reload_list = False
+        for note_id, ops in changes.items():
+            item = self._list_items.get(note_id)
+            row = rows.get(note_id)
+            if row is None:
+                if note_id == self.current_note_id:
+                    continue
+                if item is not None:
+                    self.notes_list.takeItem(self.notes_list.row(item))
+                    del self._list_items[note_id]
+                self._notes_cache.remove(note_id)
+                self._document_pool.remove(note_id)
+                self._prefetcher.forget(note_id)
+                continue
+
+            title, created_ts, pinned, tag_ids = row
+            cached_note = self._notes_cache.get(note_id)
+            if note_id in contents and cached_note is not None and contents[note_id] != cached_note.content:
+                # Текст изменён в другой программе: кэш и разобранный документ больше не годятся
+                entry = self._document_pool.peek(note_id)
+                if entry is not None and entry.document.isModified():
+                    print(f"Заметка {note_id} изменена в другой программе; при сохранении останется версия этого окна")
+                else:
+                    self._notes_cache.drop_content(note_id)
+                    self._document_pool.remove(note_id)
+                if current_sort.startswith("modified"):
+                    reload_list = True
+
+            if item is None:
+                if "insert" in ops or "tags" in ops:
+                    reload_list = True
+                continue
+            if bool(item.data(NOTE_PINNED_ROLE)) != pinned or ("tags" in ops and filtered):
+                reload_list = True
+            display_title = title if title else "Без Названия"
+            if item.text() != display_title and note_id != self.current_note_id:
+                item.setText(display_title)
+                if current_sort.startswith("name"):
+                    reload_list = True
+            item.setData(NOTE_ICONS_ROLE, icons_from_map(icon_map, tag_ids))
+            if note_id != self.current_note_id:
+                self._notes_cache.update(note_id, title=title, tag_ids=tag_ids)
             else:
-                self.notes_list.blockSignals(True)
-                current_row = self.notes_list.currentRow()
-                self.load_notes()
-                self.notes_list.setCurrentRow(current_row)
-                self.notes_list.blockSignals(False)
-            
+                self._notes_cache.update(note_id, tag_ids=tag_ids)
+
+        if changes.get(self.current_note_id, set()) & {"update", "delete"}:
+            self.check_open_note_changed()
+        if reload_list:
+            self.load_notes(select_id=self.current_note_id)
+        else:
+            self.check_empty_state()
+
+    def check_open_note_changed(self):
+        """
+        Сверяет открытую заметку с базой. Если её изменили в другой программе, а здесь правок нет,
+        новая версия просто подгружается; если правки есть — пользователь выбирает, какую оставить.
+        """
+        note_id = self.current_note_id
+        cached_note = self._notes_cache.get(note_id)
+        if note_id is None or cached_note is None:
+            return
+        try:
+            with connect_db(DB_FILE) as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT title, content FROM notes WHERE id = ?", (note_id,))
+                row = cursor.fetchone()
+        except sqlite3.Error as e:
+            print(f"Ошибка при проверке открытой заметки: {e}")
+            return
+        has_edits = self.need_save or self.text_editor.document().isModified()
+
+        if row is None:
+            title, content = self.title_input.text().strip(), self.text_editor.toHtml()
+            QMessageBox.warning(self, "Заметка удалена",
+                                "Открытую заметку удалили в другой программе." +
+                                (" Ваши несохранённые правки будут сохранены в новой заметке." if has_edits else ""))
+            self._notes_cache.remove(note_id)
+            self._document_pool.remove(note_id)
             self.need_save = False
-        self._save_timer.stop()
+            self.current_note_id = None
+            if has_edits:
+                self.new_note()
+                self.title_input.setText(title)
+                self.text_editor.setHtml(content)
+            else:
+                self.set_editor_content("", "")
+                self.load_notes()
+            return
+
+        title, content = row[0] or "", row[1] or ""
+        if cached_note.content is None:
+            cached_note.content = content
+            return
+        # При несохранённых правках заголовок в памяти уже отличается от базы — сравнивается только текст
+        if content == cached_note.content and (has_edits or title == cached_note.title):
+            return
+
+        if has_edits:
+            msg = QMessageBox(self)
+            msg.setWindowTitle("Заметка изменена")
+            msg.setText("Эту заметку изменили в другой программе, а здесь есть несохранённые правки. Какую версию оставить?")
+            msg.setStyleSheet(get_theme(self.current_theme)["message_box"])
+            theirs_button = QPushButton("Загрузить новую версию")
+            mine_button = QPushButton("Оставить мою")
+            msg.addButton(theirs_button, QMessageBox.ButtonRole.AcceptRole)
+            msg.addButton(mine_button, QMessageBox.ButtonRole.RejectRole)
+            msg.exec()
+            if msg.clickedButton() != theirs_button:
+                # Своя версия перезапишет чужую при следующем автосохранении; чужая останется в истории изменений
+                self._notes_cache.update(note_id, title=title, content=content)
+                return
+
+        position = self.text_editor.textCursor().position()
+        scroll = self.text_editor.verticalScrollBar().value()
+        self.set_editor_content(title, content)
+        self._notes_cache.update(note_id, title=title, content=content)
+        cursor = self.text_editor.textCursor()
+        cursor.setPosition(min(position, self.text_editor.document().characterCount() - 1))
+        self.text_editor.setTextCursor(cursor)
+        self.text_editor.verticalScrollBar().setValue(scroll)
+        item = self._list_items.get(note_id)
+        if item is not None:
+            item.setText(title if title else "Без Названия")
+
+    def thin_revision_history(self):
+        try:
+            with connect_db(DB_FILE) as conn:
+                removed = thin_all_revisions(conn.cursor())
+                conn.commit()
+            if removed:
+                print(f"Прорежена история изменений: удалено версий {removed}")
+        except sqlite3.Error as e:
+            print(f"Ошибка при прореживании истории изменений: {e}")
+
+    def backfill_plain_text(self):
+        try:
+            filled = backfill_plain_text(DB_FILE, should_stop=self._backfill_stop.is_set)
+            if filled:
+                print(f"Заполнен простой текст заметок: {filled}")
+        except (OSError, sqlite3.Error) as e:
+            print(f"Ошибка при заполнении простого текста заметок: {e}")
+
+    def show_note_history(self, note_id):
+        if note_id != self.current_note_id:
+            for i in range(self.notes_list.count()):
+                item = self.notes_list.item(i)
+                if item and item.data(Qt.ItemDataRole.UserRole) == note_id:
+                    self.notes_list.setCurrentItem(item)
+                    self.load_note()
+                    break
+        if note_id != self.current_note_id:
+            return
+
+        self._save_current_note()
+        dialog = RevisionHistoryDialog(note_id, self.title_input.text(), self.current_theme, self)
+        if dialog.exec() != QDialog.DialogCode.Accepted or dialog.selected_content is None:
+            return
+
+        title = self.title_input.text().strip()
+        try:
+            with connect_db(DB_FILE) as conn:
+                record_revision(conn.cursor(), note_id, title, self.text_editor.toHtml(), force=True)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Ошибка при сохранении версии заметки: {e}")
+
+        self.set_editor_content(title, dialog.selected_content)
+        self.need_save = True
+        self._save_current_note()
+
+    def open_journal(self):
+        try:
+            return EditJournal(journal_path_for(DB_FILE))
+        except OSError as e:
+            print(f"Не удалось открыть журнал изменений: {e}")
+            return None
+
+    def flush_journal(self):
+        if not self._journal:
+            return
+        try:
+            self._journal.flush()
+        except OSError as e:
+            print(f"Ошибка при записи журнала изменений: {e}")
+
+    def _schedule_journal_flush(self):
+        if not self._journal_timer.isActive():
+            self._journal_timer.start()
+
+    def journal_contents_change(self, position, removed, added):
+        if not self._journal or self._is_setting_content or not self.current_note_id:
+            return
+
+        document = self.text_editor.document()
+        if self.sender() is not document:
+            return
+        end_limit = document.characterCount() - 1
+        start = min(position, end_limit)
+        end = min(position + added, end_limit)
+
+        cursor = QTextCursor(document)
+        cursor.setPosition(start)
+        base_format = cursor.charFormat()
+        is_plain = not cursor.atBlockStart() and end - start <= JOURNAL_PLAIN_TEXT_LIMIT
+        offset = start
+        while is_plain and offset < end:
+            offset += 1
+            cursor.setPosition(offset)
+            is_plain = cursor.charFormat() == base_format
+
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+        if is_plain:
+            self._journal.record_change(self.current_note_id, position, removed, text=cursor.selectedText())
+        else:
+            self._journal.record_change(self.current_note_id, position, removed, html=cursor.selection().toHtml())
+        self._schedule_journal_flush()
+
+    def journal_title_change(self, title):
+        if not self._journal or self._is_setting_content or not self.current_note_id:
+            return
+        self._journal.record_title(self.current_note_id, title.strip())
+        self._schedule_journal_flush()
+
+    def recover_from_journal(self):
+        path = journal_path_for(DB_FILE)
+        try:
+            pending = read_pending_operations(path)
+        except OSError as e:
+            print(f"Не удалось прочитать журнал изменений: {e}")
+            return
+
+        if not pending:
+            return
+
+        document = QTextDocument()
+        document.setDefaultFont(QFont("Calibri", 11))
+        recovered = 0
+        try:
+            with connect_db(DB_FILE) as conn:
+                cursor = conn.cursor()
+                for note_id, entry in pending.items():
+                    cursor.execute("SELECT title, content FROM notes WHERE id = ?", (note_id,))
+                    note = cursor.fetchone()
+                    if not note:
+                        continue
+
+                    title = entry["title"] if entry["title"] is not None else note[0]
+                    content = note[1]
+                    if entry["ops"]:
+                        document.setHtml(note[1] or "")
+                        apply_journal_operations(document, entry["ops"])
+                        content = document.toHtml()
+                        plain_text, word_count, char_count = text_stats(document.toPlainText())
+                        cursor.execute("UPDATE notes SET plain_text = ?, word_count = ?, char_count = ? WHERE id = ?",
+                                    (plain_text, word_count, char_count, note_id))
+
+                    cursor.execute("UPDATE notes SET title = ?, content = ?, modified_ts = ? WHERE id = ?",
+                                (title, content, int(time.time()), note_id))
+                    recovered += 1
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Ошибка при восстановлении из журнала изменений: {e}")
+            return
+
+        with open(path, "w", encoding="utf-8"):
+            pass
+        print(f"Восстановлены несохранённые изменения заметок из журнала: {recovered}")
+
+    def create_note_document(self):
+        document = QTextDocument(self)
+        document.setDefaultFont(self.text_editor.font())
+        document.contentsChange.connect(self.journal_contents_change)
+        document.contentsChange.connect(self.text_editor.track_edit_range)
+        return document
+
+    def _document_for_current_note(self):
+        if self.current_note_id is None:
+            if self._blank_document is None:
+                self._blank_document = self.create_note_document()
+            return self._blank_document
+
+        self._document_pool.active_note_id = self.current_note_id
+        entry = self._document_pool.get(self.current_note_id)
+        if entry is None:
+            entry = self._document_pool.add(self.current_note_id, self.create_note_document())
+        return entry.document
+
+    def remember_editor_view(self):
+        entry = self._document_pool.peek(self.current_note_id)
+        if entry is not None and entry.document is self.text_editor.document():
+            entry.cursor_position = self.text_editor.textCursor().position()
+            entry.scroll_value = self.text_editor.verticalScrollBar().value()
+
+    def _attach_document(self, document):
+        if self.text_editor.document() is not document:
+            self.text_editor.setDocument(document)
+        self.update_counter()
+        self.update_color_button_state()
+
+    def set_editor_content(self, title, content):
+        document = self._document_for_current_note()
+        self._is_setting_content = True
+        try:
+            self.title_input.setText(title)
+            document.setHtml(content or "")
+            document.setModified(False)
+            self._attach_document(document)
+        finally:
+            self._is_setting_content = False
+        self.need_save = False
+
+    def show_pooled_note(self, note_id):
+        entry = self._document_pool.get(note_id)
+        cached_note = self._notes_cache.get(note_id)
+        self._document_pool.active_note_id = note_id
+        self._is_setting_content = True
+        try:
+            self.title_input.setText(cached_note.title if cached_note else "")
+            self._attach_document(entry.document)
+            cursor = self.text_editor.textCursor()
+            cursor.setPosition(min(entry.cursor_position, entry.document.characterCount() - 1))
+            self.text_editor.setTextCursor(cursor)
+            self.text_editor.verticalScrollBar().setValue(entry.scroll_value)
+        finally:
+            self._is_setting_content = False
+        self.need_save = False
+
+    def set_prefetch_enabled(self, enabled):
+        self.set_setting("prefetch", enabled)
+        if not enabled:
+            self.cancel_prefetch()
+
+    def prefetch_candidates(self):
+        """Заметки, которые вероятнее всего откроют следующими: соседи по списку и недавно открытые"""
+        candidates = []
+        row = self.notes_list.currentRow()
+        for offset in range(1, PREFETCH_NEIGHBOURS + 1):
+            for neighbour_row in (row + offset, row - offset):
+                item = self.notes_list.item(neighbour_row) if neighbour_row >= 0 else None
+                if item is not None and not item.isHidden():
+                    candidates.append(item.data(Qt.ItemDataRole.UserRole))
+        candidates.extend(reversed(self._recent_note_ids))
+
+        result = []
+        for note_id in candidates:
+            if note_id is None or note_id == self.current_note_id or note_id in result:
+                continue
+            cached_note = self._notes_cache.get(note_id)
+            if cached_note is not None and cached_note.content is not None:
+                continue
+            result.append(note_id)
+        return result
+
+    def start_prefetch(self):
+        if self.need_save or self.get_setting("prefetch", "True") != "True":
+            return
+        note_ids = self.prefetch_candidates()
+        if note_ids:
+            self._prefetcher.schedule(note_ids)
+            self._prefetch_poll_timer.start()
+
+    def cancel_prefetch(self):
+        self._prefetch_timer.stop()
+        self._prefetch_poll_timer.stop()
+        self._prefetcher.cancel()
+
+    def collect_prefetched(self):
+        documents_built = 0
+        for note_id, title, content in self._prefetcher.take_results():
+            cached_note = self._notes_cache.get(note_id)
+            if cached_note is None or cached_note.content is not None:
+                continue
+            cached_note.content = content
+            for released_id in self._prefetcher.remember(note_id, len(content)):
+                released_note = self._notes_cache.get(released_id)
+                if released_note is not None and released_id != self.current_note_id:
+                    released_note.content = None
+
+            if (documents_built < PREFETCH_DOCUMENTS and note_id not in self._document_pool
+                    and len(self._document_pool) < self._document_pool.max_documents):
+                document = self.create_note_document()
+                document.setHtml(content)
+                document.setModified(False)
+                self._document_pool.add(note_id, document)
+                documents_built += 1
+
+        if not self._prefetcher.busy:
+            self._prefetch_poll_timer.stop()
+
+    def closeEvent(self, event):
+        self._backfill_stop.set()
+        self._maintenance_stop.set()
+        self._change_timer.stop()
+        self._prefetcher.stop()
+        self._save_current_note()
+        self.save_pooled_documents()
+        self.flush_access_times()
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+        if self._change_watcher is not None:
+            self._change_watcher.close()
+            self._change_watcher = None
+        self.save_session()
+        super().closeEvent(event)
 
 
     def create_database(self):
-        with sqlite3.connect(DB_FILE) as conn:
+        with connect_db(DB_FILE) as conn:
             cursor = conn.cursor()
+            # Действует только для новой базы; существующую переводит обслуживание (run_idle_maintenance)
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
             cursor.execute("CREATE TABLE IF NOT EXISTS notes (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, content TEXT, created_at TEXT, last_accessed TEXT)")
             
             try:
@@ -887,268 +2658,341 @@ class NotesApp(QWidget):
             except sqlite3.OperationalError:
                 cursor.execute("ALTER TABLE notes ADD COLUMN pinned INTEGER DEFAULT 0")
             
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS categories (
-                    note_id INTEGER,
-                    category TEXT,
-                    PRIMARY KEY (note_id, category),
-                    FOREIGN KEY (note_id) REFERENCES notes(id) ON DELETE CASCADE
-                )
-            """)
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_last_accessed ON notes(last_accessed)")
+            try:
+                cursor.execute("SELECT modified_at FROM notes LIMIT 1")
+            except sqlite3.OperationalError:
+                cursor.execute("ALTER TABLE notes ADD COLUMN modified_at TEXT")
+                cursor.execute("UPDATE notes SET modified_at = last_accessed")
+
+            try:
+                cursor.execute("SELECT created_ts FROM notes LIMIT 1")
+            except sqlite3.OperationalError:
+                cursor.execute("ALTER TABLE notes ADD COLUMN created_ts INTEGER")
+                cursor.execute("ALTER TABLE notes ADD COLUMN accessed_ts INTEGER")
+                cursor.execute("ALTER TABLE notes ADD COLUMN modified_ts INTEGER")
+                cursor.execute("""
+                    UPDATE notes SET
+                        created_ts = CAST(strftime('%s', created_at, 'utc') AS INTEGER),
+                        accessed_ts = CAST(strftime('%s', last_accessed, 'utc') AS INTEGER),
+                        modified_ts = CAST(strftime('%s', COALESCE(modified_at, last_accessed), 'utc') AS INTEGER)
+                """)
+                cursor.execute("UPDATE notes SET created_ts = 0 WHERE created_ts IS NULL")
+                cursor.execute("UPDATE notes SET accessed_ts = created_ts WHERE accessed_ts IS NULL")
+                cursor.execute("UPDATE notes SET modified_ts = created_ts WHERE modified_ts IS NULL")
+
+            cursor.execute("DROP INDEX IF EXISTS idx_last_accessed")
+            cursor.execute("DROP INDEX IF EXISTS idx_modified_at")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_created_ts ON notes(pinned, created_ts)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_modified_ts ON notes(pinned, modified_ts)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_accessed_ts ON notes(accessed_ts)")
+            create_rank_column(cursor)
+            create_revisions_table(cursor)
+            create_plain_text_columns(cursor)
             cursor.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
-            
-            cursor.execute("SELECT value FROM settings WHERE key = 'current_category'")
-            if not cursor.fetchone():
-                cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", 
-                            ("current_category", "all"))
-            
+            create_tag_tables(cursor)
+            migrate_categories(cursor)
+            create_change_log(cursor)
+            trim_change_log(cursor)
             conn.commit()
+            self._tags.load(cursor)
 
-    def show_category_menu(self):
-        category_menu = QMenu(self)
-        category_menu.setFont(QFont("Calibri", 9))
-        
-        theme = get_theme(self.current_theme)
-        category_menu.setStyleSheet(theme["menu_style"])
-        
-        current_category = "all"
-        try:
-            with sqlite3.connect(DB_FILE) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT value FROM settings WHERE key = 'current_category'")
-                result = cursor.fetchone()
-                if result:
-                    current_category = result[0]
-        except sqlite3.Error:
-            pass
-        
-        categories = [
-            {"icon": "📓", "name": "Личное", "id": "personal"},
-            {"icon": "📚", "name": "Учеба", "id": "study"},
-            {"icon": "👔", "name": "Работа", "id": "work"},
-            {"icon": "🏡", "name": "Ежедневное", "id": "daily"},
-            {"icon": "☁️", "name": "Вдохновение", "id": "inspiration"}
-        ]
-        
-        for category in categories:
-            action_text = f"{category['icon']} {category['name']}"
-            if current_category == category['id']:
-                action_text += "   ✓"
-            
-            action = category_menu.addAction(action_text)
-            action.triggered.connect(lambda checked, cat=category['id']: self.filter_by_category(cat))
-
-        no_category_action = category_menu.addAction("🚫 Без категории")
-        if current_category == "no_category":
-            no_category_action.setText("🚫 Без категории   ✓")
-        no_category_action.triggered.connect(lambda: self.filter_by_category("no_category"))
-        
-        category_menu.addSeparator()
-        
-        all_action = category_menu.addAction("Убрать фильтр по категориям")
-        if current_category == "all":
-            all_action.setText("Убрать фильтр по категориям   ✓")
-        all_action.triggered.connect(lambda: self.filter_by_category("all"))
+    def show_tag_menu(self):
+        tag_menu, actions = self.cached_menu("tags", self.build_tag_menu)
         
-        menu_height = category_menu.sizeHint().height()
-        category_menu.exec(self.category_button.mapToGlobal(QPoint(0, -menu_height)))
-
-    def filter_by_category(self, category):
         try:
-            with sqlite3.connect(DB_FILE) as conn:
-                cursor = conn.cursor()
-                cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", 
-                            ("current_category", category))
-                conn.commit()
+            with connect_db(DB_FILE) as conn:
+                self._tags.refresh_counts(conn.cursor())
         except sqlite3.Error as e:
-            print(f"Ошибка при сохранении выбранной категории: {e}")
+            print(f"Ошибка при обновлении счётчиков тегов: {e}")
+        
+        tag_filter = self.get_tag_filter()
+        single = [] if tag_filter["all"] or tag_filter["none"] or tag_filter["untagged"] else tag_filter["any"]
+        for tag_id, action in actions["only"].items():
+            tag = self._tags.get(tag_id)
+            action.setText(self.tag_menu_text(tag_id) + f" ({tag.note_count})" + ("   ✓" if single == [tag_id] else ""))
+        for mode, mode_actions in actions["modes"].items():
+            for tag_id, action in mode_actions.items():
+                action.setText(self.tag_menu_text(tag_id) + ("   ✓" if tag_id in tag_filter[mode] else ""))
+        action, text = actions["untagged"]
+        action.setText(text + ("   ✓" if tag_filter["untagged"] else ""))
+        actions["delete_menu"].menuAction().setVisible(bool(actions["delete"]))
+        
+        menu_height = tag_menu.sizeHint().height()
+        tag_menu.exec(self.tag_button.mapToGlobal(QPoint(0, -menu_height)))
+
+    def tag_menu_text(self, tag_id):
+        tag = self._tags.get(tag_id)
+        depth = self._tags.path(tag_id).count("/")
+        return f"{'    ' * depth}{tag.display_icon} {tag.name}"
+
+    def build_tag_menu(self, theme):
+        tag_menu = QMenu(self)
+        tag_menu.setFont(QFont("Calibri", 9))
+        tag_menu.setStyleSheet(theme["menu_style"])
+        actions = {"only": {}, "modes": {}, "delete": {}}
+        tags = self._tags.tree()
+        
+        for tag, depth in tags:
+            action = tag_menu.addAction(self.tag_menu_text(tag.id))
+            action.triggered.connect(lambda checked, tag_id=tag.id: self.set_tag_filter({"any": [tag_id]}))
+            actions["only"][tag.id] = action
+        
+        untagged_text = "🚫 Без тегов"
+        untagged_action = tag_menu.addAction(untagged_text)
+        untagged_action.triggered.connect(lambda: self.set_tag_filter({"untagged": True}))
+        actions["untagged"] = (untagged_action, untagged_text)
+        
+        tag_menu.addSeparator()
+        
+        for mode, title in (("all", "Все из отмеченных (И)"), ("any", "Любой из отмеченных (ИЛИ)"),
+                            ("none", "Кроме отмеченных (НЕ)")):
+            mode_menu = tag_menu.addMenu(title)
+            mode_menu.setStyleSheet(theme["menu_style"])
+            mode_menu.setEnabled(bool(tags))
+            actions["modes"][mode] = {}
+            for tag, depth in tags:
+                action = mode_menu.addAction(self.tag_menu_text(tag.id))
+                action.triggered.connect(lambda checked, m=mode, tag_id=tag.id: self.toggle_tag_filter(m, tag_id))
+                actions["modes"][mode][tag.id] = action
+        
+        tag_menu.addSeparator()
+        
+        new_action = tag_menu.addAction("➕ Новый тег…")
+        new_action.triggered.connect(lambda: self.create_tag_dialog())
+        delete_menu = tag_menu.addMenu("🗑️ Удалить тег")
+        delete_menu.setStyleSheet(theme["menu_style"])
+        actions["delete_menu"] = delete_menu
+        for tag, depth in tags:
+            action = delete_menu.addAction(self.tag_menu_text(tag.id))
+            action.triggered.connect(lambda checked, tag_id=tag.id: self.confirm_delete_tag(tag_id))
+            actions["delete"][tag.id] = action
+        
+        tag_menu.addSeparator()
+        
+        clear_action = tag_menu.addAction("Убрать фильтр по тегам")
+        clear_action.triggered.connect(lambda: self.set_tag_filter({}))
+        return tag_menu, actions
+
+    def get_tag_filter(self):
+        return parse_tag_filter(self.get_setting("tag_filter", ""))
+
+    def toggle_tag_filter(self, mode, tag_id):
+        tag_filter = self.get_tag_filter()
+        tag_filter["untagged"] = False
+        if tag_id in tag_filter[mode]:
+            tag_filter[mode].remove(tag_id)
+        else:
+            for key in ("all", "any", "none"):
+                if tag_id in tag_filter[key]:
+                    tag_filter[key].remove(tag_id)
+            tag_filter[mode].append(tag_id)
+        self.set_tag_filter(tag_filter)
+
+    def set_tag_filter(self, tag_filter):
+        self.set_setting("tag_filter", dump_tag_filter(tag_filter))
         
         current_id = None
         if self.notes_list.currentItem():
             current_id = self.notes_list.currentItem().data(Qt.ItemDataRole.UserRole)
         
-        self.load_notes()
-        
-        if current_id:
-            for i in range(self.notes_list.count()):
-                item = self.notes_list.item(i)
-                if item and item.data(Qt.ItemDataRole.UserRole) == current_id:
-                    self.notes_list.setCurrentRow(i)
-                    break
+        self.load_notes(select_id=current_id)
 
-    def load_notes(self):
-        self.notes_list.clear()
-        
-        self.notes_list.setWordWrap(True)
-        self.notes_list.setUniformItemSizes(False)
-        
-        current_sort = "date_desc"  
-        try:
-            with sqlite3.connect(DB_FILE) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT value FROM settings WHERE key = 'sort_method'")
-                result = cursor.fetchone()
-                if result:
-                    current_sort = result[0]
-        except sqlite3.Error:
-            pass
-        
-        current_category = "all"  
+    def load_notes(self, select_id=None):
+        """
+        Перестраивает список заметок. Запросы выполняются в фоновом потоке,
+        а элементы добавляются пачками по LIST_BATCH_SIZE за один проход цикла событий.
+        Заметка select_id выделяется, как только попадает в список.
+        """
+        self._list_generation += 1
+        self._list_select_id = select_id
+        self._list_loading = True
+        self._list_loaded = 0
+        self._list_total = None
+
+        if not self._list_stale:
+            self.clear_notes_list()
+
+        current_sort = self.get_setting("sort_method", "date_desc")
+        self.notes_list.set_reorder_enabled(current_sort == "custom")
+        condition, params = tag_filter_clause(self.get_tag_filter(), self._tags)
+
+        threading.Thread(target=self._load_notes_worker, name="boranotes-list",
+                         args=(self._list_generation, condition, params, current_sort, self._tags.icon_map()),
+                         daemon=True).start()
+        self._list_fill_timer.start()
+
+    def _load_notes_worker(self, generation, condition, params, sort, tag_icons):
         try:
-            with sqlite3.connect(DB_FILE) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT value FROM settings WHERE key = 'current_category'")
-                result = cursor.fetchone()
-                if result:
-                    current_category = result[0]
-        except sqlite3.Error:
-            pass
-        
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-            
-            if current_category == "all":
-                cursor.execute("SELECT id, title, created_at FROM notes WHERE pinned = 1 ORDER BY created_at DESC")
-            elif current_category == "no_category":
-                cursor.execute("""
-                    SELECT n.id, n.title, n.created_at 
-                    FROM notes n 
-                    WHERE n.pinned = 1 
-                    AND NOT EXISTS (SELECT 1 FROM categories c WHERE c.note_id = n.id)
-                    ORDER BY n.created_at DESC
-                """)
-            else:
-                cursor.execute("""
-                    SELECT n.id, n.title, n.created_at 
-                    FROM notes n 
-                    JOIN categories c ON n.id = c.note_id 
-                    WHERE n.pinned = 1 AND c.category = ? 
-                    ORDER BY n.created_at DESC
-                """, (current_category,))
-            
-            pinned_notes = cursor.fetchall()
-            
-            sort_clause = ""
-            if current_sort == "date_desc":
-                sort_clause = "ORDER BY n.created_at DESC"
-            elif current_sort == "date_asc":
-                sort_clause = "ORDER BY n.created_at ASC"
-            elif current_sort == "name_asc":
-                sort_clause = "ORDER BY CASE WHEN n.title = '' THEN 'Без названия' ELSE n.title END COLLATE NOCASE ASC"
-            elif current_sort == "name_desc":
-                sort_clause = "ORDER BY CASE WHEN n.title = '' THEN 'Без названия' ELSE n.title END COLLATE NOCASE DESC"
-            elif current_sort == "modified_desc":
-                sort_clause = "ORDER BY n.last_accessed DESC"
-            else:  
-                sort_clause = "ORDER BY n.last_accessed ASC"
-            
-            if current_category == "all":
-                cursor.execute(f"SELECT id, title, created_at FROM notes WHERE pinned = 0 {sort_clause.replace('n.', '')}")
-            elif current_category == "no_category":
-                cursor.execute(f"""
-                    SELECT n.id, n.title, n.created_at 
-                    FROM notes n 
-                    WHERE n.pinned = 0 
-                    AND NOT EXISTS (SELECT 1 FROM categories c WHERE c.note_id = n.id)
-                    {sort_clause}
-                """)
+            with connect_db(DB_FILE) as conn:
+                self._list_queue.put((generation, "total", count_list_notes(conn.cursor(), condition, params)))
+            for is_pinned, rows in iter_list_batches(DB_FILE, condition, params, sort):
+                if generation != self._list_generation:
+                    return
+                notes = []
+                for note_id, title, created_ts, tag_ids in rows:
+                    tag_ids = parse_tag_ids(tag_ids)
+                    notes.append((note_id, title, created_ts, tag_ids, format_note_date(created_ts),
+                                  icons_from_map(tag_icons, tag_ids)))
+                self._list_queue.put((generation, "notes", (is_pinned, notes)))
+        except sqlite3.Error as e:
+            print(f"Ошибка при загрузке списка заметок: {e}")
+        self._list_queue.put((generation, "done", None))
+
+    def fill_notes_list(self):
+        while True:
+            try:
+                generation, kind, payload = self._list_queue.get_nowait()
+            except queue.Empty:
+                return
+            if generation != self._list_generation:
+                continue
+            if kind != "total" and self._list_stale:
+                self._list_stale = False
+                self.clear_notes_list()
+
+            if kind == "total":
+                self._list_total = payload
+            elif kind == "notes":
+                is_pinned, notes = payload
+                for note in notes:
+                    self._add_note_item(note, is_pinned)
+                self._list_loaded += len(notes)
+                self.update_list_progress()
+                return
             else:
-                cursor.execute(f"""
-                    SELECT n.id, n.title, n.created_at 
-                    FROM notes n 
-                    JOIN categories c ON n.id = c.note_id 
-                    WHERE n.pinned = 0 AND c.category = ? 
-                    {sort_clause}
-                """, (current_category,))
-            
-            regular_notes = cursor.fetchall()
-            
-            for note in pinned_notes:
-                cursor.execute("SELECT category FROM categories WHERE note_id = ?", (note[0],))
-                categories = [row[0] for row in cursor.fetchall()]
-                self._add_note_item(note, is_pinned=True, categories=categories)
-            
-            if pinned_notes and regular_notes:
-                separator = QListWidgetItem()
-                separator.setFlags(Qt.ItemFlag.NoItemFlags)
-                separator.setSizeHint(QSize(self.notes_list.width() - 10, 1))
-                separator.setBackground(QColor("#e0e0e0" if self.current_theme == "light" else "#444"))
-                self.notes_list.addItem(separator)
-            
-            for note in regular_notes:
-                cursor.execute("SELECT category FROM categories WHERE note_id = ?", (note[0],))
-                categories = [row[0] for row in cursor.fetchall()]
-                self._add_note_item(note, is_pinned=False, categories=categories)
-            
-            self.check_empty_state()
+                self._list_fill_timer.stop()
+                self._list_loading = False
+                self._list_select_id = None
+                self.update_list_progress()
+                self.check_empty_state()
+                return
+
+    def update_list_progress(self):
+        if not self._list_loading or not self._list_total:
+            self.list_progress_label.hide()
+            return
+        self.list_progress_label.setText(f"Загрузка заметок: {self._list_loaded} из {self._list_total}")
+        self.list_progress_label.show()
 
+    def clear_notes_list(self):
+        self.notes_list.clear()
+        self._list_items = {}
+
+    def select_note_in_list(self, note_id):
+        item = self._list_items.get(note_id)
+        if item is not None:
+            self.notes_list.setCurrentItem(item)
+            return True
+        if self._list_loading:
+            self._list_select_id = note_id
+        return False
+
+    def neighbour_note_id(self, row):
+        for neighbour_row in (row + 1, row - 1, row + 2, row - 2):
+            item = self.notes_list.item(neighbour_row) if neighbour_row >= 0 else None
+            if item is not None and item.data(Qt.ItemDataRole.UserRole) is not None:
+                return item.data(Qt.ItemDataRole.UserRole)
+        return None
 
     def load_note(self):
+        if QApplication.keyboardModifiers() & (Qt.KeyboardModifier.ControlModifier | Qt.KeyboardModifier.ShiftModifier):
+            return
+        current_item = self.notes_list.currentItem()
+        if current_item:
+            self.open_note(current_item.data(Qt.ItemDataRole.UserRole))
+
+    def open_note(self, note_id):
         if hasattr(self, '_is_loading') and self._is_loading:
             return
             
         self._is_loading = True
         
-        current_item = self.notes_list.currentItem()
-        if current_item:
-            note_id = current_item.data(Qt.ItemDataRole.UserRole)
+        if note_id is not None:
             if note_id != self.current_note_id:
+                self.cancel_prefetch()
+                self._save_current_note()
+                self.remember_editor_view()
+                if self.current_note_id is not None:
+                    self._recent_note_ids.append(self.current_note_id)
                 self.current_note_id = note_id
+                self._prefetcher.record_open(note_id)
                 
-                if note_id in self._notes_cache:
+                if note_id in self._document_pool and note_id in self._notes_cache:
+                    self.show_pooled_note(note_id)
+                elif note_id in self._notes_cache:
                     cached_note = self._notes_cache[note_id]
-                    self.title_input.setText(cached_note['title'])
                     
-                    if cached_note['content'] is None:
-                        with sqlite3.connect(DB_FILE) as conn:
+                    if cached_note.content is None:
+                        with connect_db(DB_FILE) as conn:
                             cursor = conn.cursor()
-                            cursor.execute("UPDATE notes SET last_accessed = datetime('now', 'localtime') WHERE id = ?", (note_id,))
                             cursor.execute("SELECT content FROM notes WHERE id = ?", (note_id,))
                             content = cursor.fetchone()[0]
-                            self.text_editor.setHtml(content)
-                            self._notes_cache[note_id]['content'] = content
-                            conn.commit()
+                            self.set_editor_content(cached_note.title, content)
+                            cached_note.content = content
                     else:
-                        self.text_editor.setHtml(cached_note['content'])
+                        self.set_editor_content(cached_note.title, cached_note.content)
                 else:
-                    with sqlite3.connect(DB_FILE) as conn:
+                    with connect_db(DB_FILE) as conn:
                         cursor = conn.cursor()
-                        cursor.execute("UPDATE notes SET last_accessed = datetime('now', 'localtime') WHERE id = ?", (note_id,))
                         cursor.execute("SELECT title, content FROM notes WHERE id = ?", (note_id,))
                         note = cursor.fetchone()
                         if note:
-                            self.title_input.setText(note[0])
-                            self.text_editor.setHtml(note[1])
-                            self._notes_cache[note_id] = {'title': note[0], 'content': note[1]}
-                        conn.commit()
+                            self.set_editor_content(note[0], note[1])
+                            self._notes_cache.update(note_id, title=note[0], content=note[1])
+
+                self.mark_note_accessed(note_id)
+                self._prefetch_timer.start()
     
         self._is_loading = False
 
+    def mark_note_accessed(self, note_id):
+        self._pending_access_times[note_id] = int(time.time())
+        if not self._access_flush_timer.isActive():
+            self._access_flush_timer.start()
+
+    def flush_access_times(self):
+        self._access_flush_timer.stop()
+        if not self._pending_access_times:
+            return
+
+        pending = self._pending_access_times
+        self._pending_access_times = {}
+        try:
+            with connect_db(DB_FILE) as conn:
+                cursor = conn.cursor()
+                cursor.executemany("UPDATE notes SET accessed_ts = ? WHERE id = ?",
+                                [(accessed_at, note_id) for note_id, accessed_at in pending.items()])
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Ошибка при сохранении времени открытия заметок: {e}")
+
+    def note_matches_search(self, item, search_text):
+        return (search_text in item.text().lower()
+                or search_text in (item.data(NOTE_DATE_ROLE) or "").lower()
+                or search_text in (item.data(NOTE_ICONS_ROLE) or "").lower())
+
     def search_notes(self):
         search_text = self.search_bar.text().strip().lower()
         for i in range(self.notes_list.count()):
             item = self.notes_list.item(i)
-            item.setHidden(not any(search_text in text.lower() for text in item.text().split('\n')))
+            item.setHidden(not self.note_matches_search(item, search_text))
 
     def load_last_note(self):
-        with sqlite3.connect(DB_FILE) as conn:
+        with connect_db(DB_FILE) as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT id, title, content FROM notes ORDER BY last_accessed DESC LIMIT 1")
+            cursor.execute("SELECT id, title, content FROM notes ORDER BY accessed_ts DESC LIMIT 1")
             result = cursor.fetchone()
 
             if result:
                 self.current_note_id = result[0]
-                self.title_input.setText(result[1])
-                self.text_editor.setHtml(result[2])
-
-                for i in range(self.notes_list.count()):
-                    item = self.notes_list.item(i)
-                    if item.data(Qt.ItemDataRole.UserRole) == self.current_note_id:
-                        self.notes_list.setCurrentItem(item)
-                        break
+                self.set_editor_content(result[1], result[2])
+                self.select_note_in_list(self.current_note_id)
 
     def auto_save(self):
+        if not self._is_setting_content:
+            self.cancel_prefetch()
+            self._last_edit_time = time.monotonic()
+            self._maintenance_stop.set()
         self.need_save = True
         if not self._save_timer.isActive():
             self._save_timer.start()
@@ -1165,6 +3009,8 @@ class NotesApp(QWidget):
         self.empty_state_label.show()
 
     def check_empty_state(self):
+        if self._list_loading:
+            return
         if self.notes_list.count() == 0:
             self.show_empty_state()
         else:
@@ -1172,25 +3018,68 @@ class NotesApp(QWidget):
                 self.empty_state_label.hide()
             self.editor_container.show()
 
+    def find_note_id(self, note):
+        """Заметка по id или точному названию (при совпадении названий — последняя изменённая)"""
+        with connect_db(DB_FILE) as conn:
+            cursor = conn.cursor()
+            if str(note).isdigit():
+                cursor.execute("SELECT id FROM notes WHERE id = ?", (int(note),))
+            else:
+                cursor.execute("SELECT id FROM notes WHERE title = ? ORDER BY modified_ts DESC LIMIT 1", (note,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def handle_instance_command(self, command):
+        """Команда из командной строки этого или повторного запуска: activate, new, open, append"""
+        kind = command.get("command")
+        if kind == "activate":
+            if self.isMinimized():
+                self.showNormal()
+            self.raise_()
+            self.activateWindow()
+            return
+        
+        if kind == "new":
+            self.new_note()
+            if command.get("title"):
+                self.title_input.setText(command["title"])
+            return
+        
+        if kind not in ("open", "append"):
+            print(f"Неизвестная команда: {kind}")
+            return
+        note_id = self.find_note_id(command.get("note", ""))
+        if note_id is None:
+            QMessageBox.warning(self, "Ошибка", f"Заметка «{command.get('note', '')}» не найдена")
+            return
+        if note_id != self.current_note_id:
+            self.load_notes(select_id=note_id)
+            self.open_note(note_id)
+        if kind == "append" and command.get("text"):
+            cursor = self.text_editor.textCursor()
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            if not self.text_editor.document().isEmpty():
+                cursor.insertBlock()
+            cursor.insertText(command["text"])
+            self.text_editor.setTextCursor(cursor)
+            self._perform_auto_save()
+
     def new_note(self):
-        with sqlite3.connect(DB_FILE) as conn:
+        with connect_db(DB_FILE) as conn:
             cursor = conn.cursor()
-            cursor.execute("INSERT INTO notes (title, content, created_at, last_accessed) VALUES (?, ?, datetime('now', 'localtime'), datetime('now', 'localtime'))", ("", ""))
+            now = int(time.time())
+            rank = first_rank(cursor)
+            cursor.execute("INSERT INTO notes (title, content, created_ts, accessed_ts, modified_ts, rank) VALUES (?, ?, ?, ?, ?, ?)",
+                           ("", "", now, now, now, rank))
             conn.commit()
             note_id = cursor.lastrowid
+        self.check_rank_length(len(rank))
 
-        self.load_notes()
+        self._save_current_note()
+        self.remember_editor_view()
+        self.load_notes(select_id=note_id)
         self.current_note_id = note_id
-        self.title_input.clear()
-        self.text_editor.clear()
-        
-        for i in range(self.notes_list.count()):
-            item = self.notes_list.item(i)
-            if item and item.data(Qt.ItemDataRole.UserRole) == note_id:
-                self.notes_list.setCurrentItem(item)
-                break
-                
-        self.check_empty_state()
+        self.set_editor_content("", "")
 
     def delete_note(self):
         if self.current_note_id:
@@ -1217,28 +3106,26 @@ class NotesApp(QWidget):
                     return
 
             try:
-                current_row = self.notes_list.currentRow()
-                with sqlite3.connect(DB_FILE) as conn:
+                next_note_id = self.neighbour_note_id(self.notes_list.currentRow())
+                with connect_db(DB_FILE) as conn:
                     cursor = conn.cursor()
                     cursor.execute("DELETE FROM notes WHERE id = ?", (self.current_note_id,))
+                    cursor.execute("DELETE FROM note_revisions WHERE note_id = ?", (self.current_note_id,))
                     conn.commit()
 
-                if self.current_note_id in self._notes_cache:
-                    del self._notes_cache[self.current_note_id]
+                self._notes_cache.remove(self.current_note_id)
+                if self._journal:
+                    self._journal.checkpoint(self.current_note_id)
 
+                deleted_note_id = self.current_note_id
                 self.current_note_id = None
-                self.title_input.clear()
-                self.text_editor.clear()
-                self.load_notes()
-
-                new_row = min(current_row, self.notes_list.count() - 1)
-                if new_row >= 0:
-                    self.notes_list.setCurrentRow(new_row)
-                    item = self.notes_list.item(new_row)
-                    if item:
-                        self.load_note()
-
-                self.check_empty_state()
+                self.need_save = False
+                self.set_editor_content("", "")
+                self._document_pool.remove(deleted_note_id)
+                self._prefetcher.forget(deleted_note_id)
+                self.load_notes(select_id=next_note_id)
+                if next_note_id is not None:
+                    self.open_note(next_note_id)
 
             except sqlite3.Error as e:
                 QMessageBox.warning(self, "Ошибка", f"Не удалось удалить заметку: {str(e)}")
@@ -1277,7 +3164,8 @@ class NotesApp(QWidget):
         else:
             format.setFontWeight(QFont.Weight.Bold)
         
-        cursor.mergeCharFormat(format)
+        with self.text_editor.edit_transaction(cursor):
+            cursor.mergeCharFormat(format)
 
     def toggle_italic(self):
         cursor = self.text_editor.textCursor()
@@ -1291,7 +3179,8 @@ class NotesApp(QWidget):
         
         format.setFontItalic(not is_italic)
         
-        cursor.mergeCharFormat(format)
+        with self.text_editor.edit_transaction(cursor):
+            cursor.mergeCharFormat(format)
 
     def toggle_underline(self):
         cursor = self.text_editor.textCursor()
@@ -1305,7 +3194,8 @@ class NotesApp(QWidget):
         
         format.setFontUnderline(not is_underline)
         
-        cursor.mergeCharFormat(format)
+        with self.text_editor.edit_transaction(cursor):
+            cursor.mergeCharFormat(format)
 
     def toggle_strikethrough(self):
         cursor = self.text_editor.textCursor()
@@ -1319,7 +3209,8 @@ class NotesApp(QWidget):
         
         format.setFontStrikeOut(not is_strikeout)
         
-        cursor.mergeCharFormat(format)
+        with self.text_editor.edit_transaction(cursor):
+            cursor.mergeCharFormat(format)
 
     def toggle_highlight(self):
         cursor = self.text_editor.textCursor()
@@ -1338,17 +3229,124 @@ class NotesApp(QWidget):
         else:
             format.setBackground(highlight_color)
         
-        cursor.mergeCharFormat(format)
+        with self.text_editor.edit_transaction(cursor):
+            cursor.mergeCharFormat(format)
 
     def undo(self):
-        self.text_editor.undo()
+        if self.notes_list.hasFocus() and self._bulk_undo:
+            self.undo_last_bulk_change()
+        else:
+            self.text_editor.undo()
 
-    def auto_format(self):
-        cursor = self.text_editor.textCursor()
-        cursor.select(QTextCursor.SelectionType.LineUnderCursor)
-        text = cursor.selectedText()
-        if "--" in text:
-            cursor.insertText(text.replace("--", "—"))
+    def on_text_edited(self, start, end):
+        char_count = self.text_editor.document().characterCount()
+        with self._latency.measure("auto_save", char_count):
+            self.auto_save()
+        if self._is_setting_content:
+            return
+        with self._latency.measure("auto_format", char_count):
+            self.auto_format(start, end)
+        with self._latency.measure("update_counter", char_count):
+            self.update_counter()
+
+    def set_latency_monitor_enabled(self, enabled, save=True):
+        if save:
+            self.set_setting("latency_monitor", enabled)
+        self._latency.set_enabled(enabled)
+        if enabled:
+            self._latency_timer.start()
+        else:
+            self._latency_timer.stop()
+            self.latency_label.hide()
+
+    def update_latency_label(self):
+        text = self._latency.status_text()
+        self.latency_label.setText(text)
+        self.latency_label.setVisible(bool(text))
+
+    def on_latency_warning(self, bucket, p95):
+        print(f"Задержка ввода выше порога: p95 {p95:.0f} мс для заметок {bucket}")
+        self.update_latency_label()
+
+    def export_latency_stats(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Сохранить замеры задержки", "boranotes-latency.json", "JSON (*.json)")
+        if not path:
+            return
+        try:
+            self._latency.export_json(path)
+        except OSError as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось сохранить замеры: {str(e)}")
+
+    def memory_stats(self):
+        """Учёт памяти на уровне приложения: кэши, документы, элементы списка, меню и SQLite"""
+        documents = self.findChildren(QTextDocument)
+        characters = sum(document.characterCount() for document in documents)
+        return {
+            "Заметки в памяти": store_stats(self._notes_cache),
+            "Документы": {
+                "documents": len(documents),
+                "pooled": len(self._document_pool.entries()),
+                "characters": characters,
+                "blocks": sum(document.blockCount() for document in documents),
+                "text_bytes": characters * 2,
+            },
+            "Список заметок": {
+                "items": self.notes_list.count(),
+                "indexed_items": len(self._list_items),
+                "items_created": self._list_items_created,
+            },
+            "Меню": {
+                "cached": len(self._menus),
+                "built": self._menus_built,
+                "live_menus": len(self.findChildren(QMenu)),
+            },
+            "Подгрузка": {
+                "unused_bytes": self._prefetcher.unused_bytes(),
+            },
+            "SQLite": sqlite_cache_stats(DB_FILE),
+        }
+
+    def memory_report(self):
+        """Снимает снимок памяти и сравнивает его с предыдущим, если он был"""
+        start_tracing()
+        snapshot = take_snapshot(self.memory_stats())
+        report = format_report(snapshot, self._memory_snapshot)
+        self._memory_snapshot = snapshot
+        return report
+
+    def show_memory_report(self):
+        dialog = MemoryReportDialog(self, self.current_theme, self)
+        dialog.exec()
+        dialog.deleteLater()
+
+    def auto_format(self, start=None, end=None):
+        """Заменяет «--» на тире в абзацах изменённого диапазона (по умолчанию — в абзаце под курсором)"""
+        if self._is_setting_content:
+            return
+        document = self.text_editor.document()
+        if start is None:
+            start = end = self.text_editor.textCursor().position()
+        block = document.findBlock(start)
+        last_block = document.findBlock(min(end, document.characterCount() - 1))
+        
+        replacements = []
+        while block.isValid():
+            text = block.text()
+            offset = text.find("--")
+            while offset != -1:
+                replacements.append(block.position() + offset)
+                offset = text.find("--", offset + 2)
+            if block == last_block:
+                break
+            block = block.next()
+        if not replacements:
+            return
+        
+        with self.text_editor.edit_transaction(QTextCursor(document)) as cursor:
+            for position in sorted(replacements, reverse=True):
+                cursor.setPosition(position)
+                cursor.setPosition(position + 2, QTextCursor.MoveMode.KeepAnchor)
+                cursor.insertText("—")
 
     def update_counter(self):
         text = self.text_editor.toPlainText()
@@ -1357,56 +3355,49 @@ class NotesApp(QWidget):
         self.counter_label.setText(f"Количество слов: {word_count} | Количество символов: {char_count}")
 
     def is_first_launch(self):
-        with sqlite3.connect(DB_FILE) as conn:
+        with connect_db(DB_FILE) as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT COUNT(*) FROM notes")
             count = cursor.fetchone()[0]
             return count == 0
 
     def show_sort_menu(self):
-        sort_menu = QMenu(self)
-        sort_menu.setFont(QFont("Calibri", 9))
-        
-        theme = get_theme(self.current_theme)
-        sort_menu.setStyleSheet(theme["sort_menu_style"])
-
-        current_sort = "date_desc"  
-        try:
-            with sqlite3.connect(DB_FILE) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT value FROM settings WHERE key = 'sort_method'")
-                result = cursor.fetchone()
-                if result:
-                    current_sort = result[0]
-        except sqlite3.Error:
-            pass
-
-        new_to_old = sort_menu.addAction("От новых к старым записям" + ("   ✓" if current_sort == "date_desc" else ""))
-        old_to_new = sort_menu.addAction("От старых к новым записям" + ("   ✓" if current_sort == "date_asc" else ""))
-        
-        sort_menu.addSeparator()
-        
-        name_az = sort_menu.addAction("По имени файла (от А до Я)" + ("   ✓" if current_sort == "name_asc" else ""))
-        name_za = sort_menu.addAction("По имени файла (от Я до А)" + ("   ✓" if current_sort == "name_desc" else ""))
-        
-        sort_menu.addSeparator()
-        
-        modified_new = sort_menu.addAction("По времени последнего изменения (от новых к старым)" + ("   ✓" if current_sort == "modified_desc" else ""))
-        modified_old = sort_menu.addAction("По времени последнего изменения (от старых к новым)" + ("   ✓" if current_sort == "modified_asc" else ""))
+        sort_menu, actions = self.cached_menu("sort", self.build_sort_menu)
 
-        new_to_old.triggered.connect(lambda: self.sort_notes("date_desc"))
-        old_to_new.triggered.connect(lambda: self.sort_notes("date_asc"))
-        name_az.triggered.connect(lambda: self.sort_notes("name_asc"))
-        name_za.triggered.connect(lambda: self.sort_notes("name_desc"))
-        modified_new.triggered.connect(lambda: self.sort_notes("modified_desc"))
-        modified_old.triggered.connect(lambda: self.sort_notes("modified_asc"))
+        current_sort = self.get_setting("sort_method", "date_desc")
+        for sort_type, (action, text) in actions.items():
+            action.setText(text + ("   ✓" if current_sort == sort_type else ""))
 
         menu_height = sort_menu.sizeHint().height()
         sort_menu.exec(self.sort_button.mapToGlobal(QPoint(0, -menu_height)))
 
+    def build_sort_menu(self, theme):
+        sort_menu = QMenu(self)
+        sort_menu.setFont(QFont("Calibri", 9))
+        sort_menu.setStyleSheet(theme["sort_menu_style"])
+        actions = {}
+
+        for group in (
+            (("date_desc", "От новых к старым записям"),
+             ("date_asc", "От старых к новым записям")),
+            (("name_asc", "По имени файла (от А до Я)"),
+             ("name_desc", "По имени файла (от Я до А)")),
+            (("modified_desc", "По времени последнего изменения (от новых к старым)"),
+             ("modified_asc", "По времени последнего изменения (от старых к новым)")),
+            (("custom", "Свой порядок (перетаскивание мышью)"),),
+        ):
+            if actions:
+                sort_menu.addSeparator()
+            for sort_type, text in group:
+                action = sort_menu.addAction(text)
+                action.triggered.connect(lambda checked=False, t=sort_type: self.sort_notes(t))
+                actions[sort_type] = (action, text)
+
+        return sort_menu, actions
+
     def sort_notes(self, sort_type):
         try:
-            with sqlite3.connect(DB_FILE) as conn:
+            with connect_db(DB_FILE) as conn:
                 cursor = conn.cursor()
 
                 cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='settings'")
@@ -1423,20 +3414,107 @@ class NotesApp(QWidget):
         if self.notes_list.currentItem():
             current_id = self.notes_list.currentItem().data(Qt.ItemDataRole.UserRole)
 
-        self.load_notes()
-        
-        if current_id:
-            for i in range(self.notes_list.count()):
-                item = self.notes_list.item(i)
-                if item and item.data(Qt.ItemDataRole.UserRole) == current_id:
-                    self.notes_list.setCurrentRow(i)
-                    break
+        self.load_notes(select_id=current_id)
+
+
+    def on_notes_moved(self, note_ids):
+        """
+        Заметки перетащены в режиме своего порядка. Каждая получает ключ между соседями
+        из своего раздела (закреплённые или нет), поэтому перенос пишет по одной строке на заметку.
+        """
+        moved = set(note_ids)
+        items = sorted((self._list_items[note_id] for note_id in note_ids if note_id in self._list_items),
+                       key=self.notes_list.row)
+        moves = []
+        for item in items:
+            row = self.notes_list.row(item)
+            is_pinned = bool(item.data(NOTE_PINNED_ROLE))
+            before = self.notes_list.item(row - 1) if row > 0 else None
+            after_row = row + 1
+            while after_row < self.notes_list.count() and self.notes_list.item(after_row).data(Qt.ItemDataRole.UserRole) in moved:
+                after_row += 1
+            after = self.notes_list.item(after_row)
+            if (is_pinned and before is not None and not before.data(NOTE_PINNED_ROLE)) or (
+                    not is_pinned and after is not None and after.data(NOTE_PINNED_ROLE)):
+                # Перенос между закреплёнными и остальными заметками не поддерживается
+                self.load_notes(select_id=self.current_note_id)
+                return
+            if after is not None and bool(after.data(NOTE_PINNED_ROLE)) != is_pinned:
+                after = None
+            if before is not None and bool(before.data(NOTE_PINNED_ROLE)) != is_pinned:
+                before = None
+            moves.append((item.data(Qt.ItemDataRole.UserRole),
+                          before.data(Qt.ItemDataRole.UserRole) if before is not None else None,
+                          after.data(Qt.ItemDataRole.UserRole) if after is not None else None))
+
+        if self._rank_poll_timer.isActive():
+            # Ключи сейчас выравниваются — перенос запишется после этого
+            self._deferred_note_moves += moves
+            return
+        longest = self.write_note_moves(moves)
+        if longest is None:
+            # Соседние ключи сбились (например, после восстановления копии) — выравниваем в фоне и повторяем
+            self._deferred_note_moves += moves
+            self.start_rank_rebalance()
+        else:
+            self.check_rank_length(longest)
+
+    def check_rank_length(self, length):
+        """Ключи порядка удлинились (переносы или новые заметки в начале списка) — выравниваем их в фоне"""
+        if length > RANK_REBALANCE_LENGTH:
+            self.start_rank_rebalance()
+
+    def start_rank_rebalance(self):
+        if self._rank_rebalance and self._rank_rebalance.is_alive():
+            return
+        self._rank_rebalance = threading.Thread(target=self._rank_rebalance_worker, name="boranotes-ranks", daemon=True)
+        self._rank_rebalance.start()
+        self._rank_poll_timer.start()
 
+    def _rank_rebalance_worker(self):
+        try:
+            rebalance_ranks(DB_FILE)
+        except sqlite3.Error as e:
+            print(f"Ошибка при выравнивании порядка заметок: {e}")
+        self._rank_queue.put(True)
+
+    def collect_rank_rebalance(self):
+        """Ключи выровнены — записываем переносы, отложенные на это время"""
+        try:
+            self._rank_queue.get_nowait()
+        except queue.Empty:
+            return
+        self._rank_poll_timer.stop()
+        moves, self._deferred_note_moves = self._deferred_note_moves, []
+        if moves and self.write_note_moves(moves) is None:
+            print("Не удалось сохранить порядок заметок: соседние ключи не возрастают")
+            self.load_notes(select_id=self.current_note_id)
+
+    def write_note_moves(self, moves):
+        """Записывает переносы одной транзакцией; возвращает длину самого длинного ключа или None"""
+        longest = 0
+        try:
+            with connect_db(DB_FILE) as conn:
+                cursor = conn.cursor()
+                for note_id, before_id, after_id in moves:
+                    rank = move_note(cursor, note_id, before_id, after_id)
+                    if rank is None:
+                        conn.rollback()
+                        return None
+                    longest = max(longest, len(rank))
+                conn.commit()
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось сохранить порядок заметок: {str(e)}")
+        return longest
 
     def show_color_palette(self):
         if not self.text_editor.textCursor().hasSelection():
             return
-            
+        
+        color_menu, actions = self.cached_menu("color", self.build_color_menu)
+        color_menu.exec(self.btn_color.mapToGlobal(QPoint(0, self.btn_color.height())))
+
+    def build_color_menu(self, theme):
         color_menu = QMenu(self)
         color_menu.setFont(QFont("Calibri", 9))
         
@@ -1558,8 +3636,7 @@ class NotesApp(QWidget):
                 border: none;
             }
         """)
-        
-        color_menu.exec(self.btn_color.mapToGlobal(QPoint(0, self.btn_color.height())))
+        return color_menu, {}
 
     def apply_text_color_and_clear(self, color):
         cursor = self.text_editor.textCursor()
@@ -1576,7 +3653,8 @@ class NotesApp(QWidget):
         else:
             format.setForeground(QColor(color))
         
-        cursor.mergeCharFormat(format)
+        with self.text_editor.edit_transaction(cursor):
+            cursor.mergeCharFormat(format)
         
         cursor.setPosition(end_position)
         self.text_editor.setTextCursor(cursor)
@@ -1584,27 +3662,24 @@ class NotesApp(QWidget):
         QApplication.activePopupWidget().close() if QApplication.activePopupWidget() else None
 
         self.text_editor.setFocus()
-        
-        self.auto_save()
 
     def update_default_text_colors(self):
         default_color = QColor("#2f2f2f") if self.current_theme == "light" else QColor("#ffffff")
         
-        cursor = QTextCursor(self.text_editor.document())
-        
-        while not cursor.atEnd():
-            cursor.movePosition(QTextCursor.MoveOperation.Right, QTextCursor.MoveMode.KeepAnchor)
-            
-            char_format = cursor.charFormat()
-            current_color = char_format.foreground().color()
-            
-            opposite_default = QColor("#ffffff") if self.current_theme == "light" else QColor("#2f2f2f")
-            if current_color.name() == opposite_default.name():
-                new_format = QTextCharFormat()
-                new_format.setForeground(default_color)
-                cursor.mergeCharFormat(new_format)
-            
-            cursor.clearSelection()
+        with self.text_editor.edit_transaction(QTextCursor(self.text_editor.document())) as cursor:
+            while not cursor.atEnd():
+                cursor.movePosition(QTextCursor.MoveOperation.Right, QTextCursor.MoveMode.KeepAnchor)
+                
+                char_format = cursor.charFormat()
+                current_color = char_format.foreground().color()
+                
+                opposite_default = QColor("#ffffff") if self.current_theme == "light" else QColor("#2f2f2f")
+                if current_color.name() == opposite_default.name():
+                    new_format = QTextCharFormat()
+                    new_format.setForeground(default_color)
+                    cursor.mergeCharFormat(new_format)
+                
+                cursor.clearSelection()
 
     def update_color_button_state(self):
         has_selection = self.text_editor.textCursor().hasSelection()
@@ -1646,7 +3721,11 @@ class NotesApp(QWidget):
     def show_size_menu(self):
         if not self.text_editor.textCursor().hasSelection():
             return
-            
+        
+        size_menu, actions = self.cached_menu("size", self.build_size_menu)
+        size_menu.exec(self.btn_size.mapToGlobal(QPoint(0, self.btn_size.height())))
+
+    def build_size_menu(self, theme):
         size_menu = QMenu(self)
         size_menu.setFont(QFont("Calibri", 9))
         
@@ -1732,8 +3811,7 @@ class NotesApp(QWidget):
                 border: none;
             }
         """)
-
-        size_menu.exec(self.btn_size.mapToGlobal(QPoint(0, self.btn_size.height())))
+        return size_menu, {}
 
 
     def apply_font_size_and_clear(self, size):
@@ -1745,7 +3823,8 @@ class NotesApp(QWidget):
 
         format = QTextCharFormat()
         format.setFontPointSize(size)
-        cursor.mergeCharFormat(format)
+        with self.text_editor.edit_transaction(cursor):
+            cursor.mergeCharFormat(format)
         
         cursor.setPosition(end_position)
         self.text_editor.setTextCursor(cursor)
@@ -1753,111 +3832,73 @@ class NotesApp(QWidget):
         QApplication.activePopupWidget().close() if QApplication.activePopupWidget() else None
         
         self.text_editor.setFocus()
-        
-        self.auto_save()
 
     def toggle_pin_status(self, note_id):
-        pinned_count = sum(1 for note in self._notes_cache.values() if note.get('pinned', False))
+        is_currently_pinned = self._notes_cache[note_id].pinned
         
-        is_currently_pinned = self._notes_cache[note_id].get('pinned', False)
-        
-        if not is_currently_pinned and pinned_count >= 3:
+        if not is_currently_pinned and self._notes_cache.pinned_count >= 3:
             QMessageBox.information(self, "Ошибка", "Можно закрепить не более 3 заметок")
             return
 
         new_pinned_status = 0 if is_currently_pinned else 1
         try:
-            with sqlite3.connect(DB_FILE) as conn:
+            with connect_db(DB_FILE) as conn:
                 cursor = conn.cursor()
                 cursor.execute("UPDATE notes SET pinned = ? WHERE id = ?",
                             (new_pinned_status, note_id))
                 conn.commit()
                 
-                self._notes_cache[note_id]['pinned'] = not is_currently_pinned
-                
-                self.load_notes()
+                self._notes_cache.set_pinned(note_id, not is_currently_pinned)
                 
-                for i in range(self.notes_list.count()):
-                    item = self.notes_list.item(i)
-                    if item and item.data(Qt.ItemDataRole.UserRole) == note_id:
-                        self.notes_list.setCurrentItem(item)
-                        break
+                self.load_notes(select_id=note_id)
             
         except sqlite3.Error as e:
             QMessageBox.warning(self, "Ошибка", f"Не удалось обновить статус закрепления: {str(e)}")
 
-    def _add_note_item(self, note, is_pinned, categories=None):
-        note_id = note[0]
-        title = note[1] if note[1] else "Без Названия"
-        date_obj = datetime.strptime(note[2].split('.')[0], '%Y-%m-%d %H:%M:%S')
-        date = f"{date_obj.day} {MONTHS[date_obj.month]} {date_obj.year} {date_obj.hour:02d}:{date_obj.minute:02d}"
-        
-        category_icons = {
-            "personal": "📓",
-            "study": "📚",
-            "work": "👔",
-            "daily": "🏡",
-            "inspiration": "☁️"
-        }
-        
-        category_display = ""
-        if categories:
-            category_display = " ".join([category_icons.get(cat, "") for cat in categories[:2]])
-        
-        if is_pinned:
-            display_title = f"⭐ {category_display} {title}" if category_display else f"⭐ {title}"
-        else:
-            display_title = f"{category_display} {title}" if category_display else title
+    def _add_note_item(self, note, is_pinned):
+        note_id, title, created_ts, tag_ids, date, icons = note
         
-        item = QListWidgetItem()
-        item.setText(f"{display_title}\n{date}")
+        item = QListWidgetItem(title if title else "Без Названия")
         item.setData(Qt.ItemDataRole.UserRole, note_id)
+        item.setData(NOTE_DATE_ROLE, date)
+        item.setData(NOTE_ICONS_ROLE, icons)
+        item.setData(NOTE_PINNED_ROLE, is_pinned)
         
         item.setFlags(item.flags() | Qt.ItemFlag.ItemNeverHasChildren)
         
-        if is_pinned:
-            if self.current_theme == "light":
-                item.setBackground(QColor("#f1dbea"))  
-            else:
-                item.setBackground(QColor("#484444"))  
-        
         self.notes_list.addItem(item)
+        self._list_items[note_id] = item
+        self._list_items_created += 1
         
-        if note_id not in self._notes_cache:
-            self._notes_cache[note_id] = {'title': note[1], 'content': None, 'pinned': is_pinned, 'categories': categories or []}
-        else:
-            self._notes_cache[note_id]['pinned'] = is_pinned
-            self._notes_cache[note_id]['categories'] = categories or []
+        search_text = self.search_bar.text().strip().lower()
+        if search_text:
+            item.setHidden(not self.note_matches_search(item, search_text))
+        
+        self._notes_cache.update(note_id, title=None if note_id in self._notes_cache else (title or ""),
+                                 pinned=is_pinned, tag_ids=tag_ids, created_ts=created_ts)
 
-    def on_item_selection_changed(self, current, previous):
-        for i in range(self.notes_list.count()):
-            item = self.notes_list.item(i)
-            if not item or not item.data(Qt.ItemDataRole.UserRole) in self._notes_cache:
-                continue
-                
-            note_id = item.data(Qt.ItemDataRole.UserRole)
-            is_pinned = self._notes_cache[note_id].get('pinned', False)
-            
-            if is_pinned:
-                is_selected = (item == current)
-                
-                if self.current_theme == "light":
-                    if is_selected:
-                        item.setBackground(QColor("#eecbe3"))  
-                    else:
-                        item.setBackground(QColor("#f1dbea"))  
-                else:
-                    if is_selected:
-                        item.setBackground(QColor("#858585")) 
-                    else:
-                        item.setBackground(QColor("#484444"))  
+        if note_id == self._list_select_id:
+            self._list_select_id = None
+            self.notes_list.setCurrentItem(item)
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    commands = parse_arguments(sys.argv[1:])
+    server_name = instance_server_name(DB_FILE)
+    # Окно уже открыто: передаём ему команды и выходим, не поднимая Qt-приложение
+    if send_to_running_instance(server_name, commands):
+        sys.exit(0)
+
     app = QApplication(sys.argv)
+    instance_server = InstanceServer(server_name)
+    if not instance_server.listen():
+        # Другое окно запустилось одновременно с этим и уже заняло сервер
+        sys.exit(0 if send_to_running_instance(server_name, commands) else 1)
+    instance_server.add_commands(commands)
     app.setWindowIcon(QIcon(resource_path('icon.ico')))
     app.setStyle('Fusion')
     app.setHighDpiScaleFactorRoundingPolicy(Qt.HighDpiScaleFactorRoundingPolicy.PassThrough)
-    window = NotesApp()
+    window = NotesApp(instance_server)
     window.show()
     sys.exit(app.exec())
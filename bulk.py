@@ -0,0 +1,108 @@
+import json
+
+
+BULK_UNDO_DEPTH = 10
+
+# Список id передаётся одним JSON-параметром, поэтому размер выборки не упирается в лимит переменных SQLite
+IDS_SUBQUERY = "SELECT value FROM json_each(?)"
+
+# Строки, которые удаляются вместе с заметкой и возвращаются при отмене (таблица, столбец с id заметки)
+DELETED_NOTE_TABLES = (
+    ("notes", "id"),
+    ("note_revisions", "note_id"),
+    ("note_tags", "note_id"),
+)
+
+
+def id_list(note_ids):
+    return json.dumps(list(note_ids))
+
+
+class BulkChange:
+    """
+    Массовое действие над заметками, которое можно отменить одним шагом.
+    rows — снимки строк по таблицам: {таблица: (столбцы, строки)}; pinned — прежние значения закрепления.
+    """
+
+    __slots__ = ("kind", "description", "note_ids", "rows", "pinned", "tag_id")
+
+    def __init__(self, kind, description, note_ids, rows=None, pinned=None, tag_id=None):
+        self.kind = kind
+        self.description = description
+        self.note_ids = list(note_ids)
+        self.rows = rows or {}
+        self.pinned = pinned or {}
+        self.tag_id = tag_id
+
+
+def _snapshot(cursor, table, column, note_ids):
+    cursor.execute(f"SELECT * FROM {table} WHERE {column} IN ({IDS_SUBQUERY})", (id_list(note_ids),))
+    return [description[0] for description in cursor.description], cursor.fetchall()
+
+
+def _insert_rows(cursor, table, columns, rows):
+    if rows:
+        cursor.executemany(
+            f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows)
+
+
+def bulk_delete_notes(cursor, note_ids, description):
+    """Удаляет заметки вместе с историей и тегами, сохранив все их строки для отмены"""
+    rows = {table: _snapshot(cursor, table, column, note_ids) for table, column in DELETED_NOTE_TABLES}
+    ids = id_list(note_ids)
+    cursor.execute(f"DELETE FROM note_revisions WHERE note_id IN ({IDS_SUBQUERY})", (ids,))
+    cursor.execute(f"DELETE FROM notes WHERE id IN ({IDS_SUBQUERY})", (ids,))
+    return BulkChange("delete", description, note_ids, rows=rows)
+
+
+def bulk_set_pinned(cursor, note_ids, pinned, description):
+    cursor.execute(f"SELECT id, pinned FROM notes WHERE id IN ({IDS_SUBQUERY})", (id_list(note_ids),))
+    previous = dict(cursor.fetchall())
+    cursor.execute(f"UPDATE notes SET pinned = ? WHERE id IN ({IDS_SUBQUERY})",
+                   (1 if pinned else 0, id_list(note_ids)))
+    return BulkChange("pin", description, note_ids, pinned=previous)
+
+
+def bulk_add_tag(cursor, note_ids, tag_id, description):
+    """Добавляет тег; в записи для отмены остаются только заметки, у которых тега раньше не было"""
+    cursor.execute("""
+        SELECT value FROM json_each(?)
+        WHERE value NOT IN (SELECT note_id FROM note_tags WHERE tag_id = ?)
+    """, (id_list(note_ids), tag_id))
+    added = [row[0] for row in cursor.fetchall()]
+    cursor.executemany("INSERT OR IGNORE INTO note_tags (tag_id, note_id) VALUES (?, ?)",
+                       [(tag_id, note_id) for note_id in added])
+    return BulkChange("add_tag", description, added, tag_id=tag_id)
+
+
+def bulk_remove_tag(cursor, note_ids, tag_id, description):
+    cursor.execute(f"SELECT note_id FROM note_tags WHERE tag_id = ? AND note_id IN ({IDS_SUBQUERY})",
+                   (tag_id, id_list(note_ids)))
+    removed = [row[0] for row in cursor.fetchall()]
+    cursor.execute(f"DELETE FROM note_tags WHERE tag_id = ? AND note_id IN ({IDS_SUBQUERY})",
+                   (tag_id, id_list(removed)))
+    return BulkChange("remove_tag", description, removed, tag_id=tag_id)
+
+
+def undo_bulk_change(cursor, change):
+    """Возвращает базу к состоянию до массового действия (в транзакции вызывающего)"""
+    if change.kind == "delete":
+        for table, column in DELETED_NOTE_TABLES:
+            columns, rows = change.rows[table]
+            if table == "note_tags":
+                # Теги, удалённые после этого действия, не восстанавливаются
+                cursor.execute("SELECT id FROM tags")
+                existing = {row[0] for row in cursor.fetchall()}
+                rows = [row for row in rows if row[columns.index("tag_id")] in existing]
+            _insert_rows(cursor, table, columns, rows)
+    elif change.kind == "pin":
+        cursor.executemany("UPDATE notes SET pinned = ? WHERE id = ?",
+                           [(pinned, note_id) for note_id, pinned in change.pinned.items()])
+    elif change.kind == "add_tag":
+        cursor.execute(f"DELETE FROM note_tags WHERE tag_id = ? AND note_id IN ({IDS_SUBQUERY})",
+                       (change.tag_id, id_list(change.note_ids)))
+    elif change.kind == "remove_tag":
+        cursor.executemany("""
+            INSERT OR IGNORE INTO note_tags (tag_id, note_id)
+            SELECT ?, id FROM notes WHERE id = ? AND EXISTS (SELECT 1 FROM tags WHERE id = ?)
+        """, [(change.tag_id, note_id, change.tag_id) for note_id in change.note_ids])
@@ -0,0 +1,139 @@
+import sqlite3
+from contextlib import contextmanager
+
+from bulk import IDS_SUBQUERY, id_list
+from tags import NOTE_TAGS_COLUMN, parse_tag_ids
+
+
+CHANGE_POLL_INTERVAL_MS = 300
+CHANGE_REFRESH_LIMIT = 200
+CHANGE_LOG_KEEP = 10_000
+
+# Изменения, которые видит список: порядок (rank) и служебные столбцы (accessed_ts, plain_text) не пишутся,
+# иначе перебалансировка порядка или отметка об открытии заметки заполняли бы журнал впустую
+CHANGE_LOG_TRIGGERS = (
+    ("change_log_notes_insert", "AFTER INSERT ON notes", "NEW.id", "insert"),
+    ("change_log_notes_update", "AFTER UPDATE OF title, content, pinned ON notes", "NEW.id", "update"),
+    ("change_log_notes_delete", "AFTER DELETE ON notes", "OLD.id", "delete"),
+    ("change_log_tags_insert", "AFTER INSERT ON note_tags", "NEW.note_id", "tags"),
+    ("change_log_tags_delete", "AFTER DELETE ON note_tags", "OLD.note_id", "tags"),
+)
+
+
+def create_change_log(cursor):
+    """
+    Журнал изменений заметок (seq, note_id, op), который заполняют триггеры — в том числе
+    при записи из других процессов. seq только растёт (AUTOINCREMENT), поэтому окно
+    читает лишь строки после последней увиденной.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            note_id INTEGER NOT NULL,
+            op TEXT NOT NULL
+        )
+    """)
+    for name, event, note_id, op in CHANGE_LOG_TRIGGERS:
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN
+                INSERT INTO change_log (note_id, op) VALUES ({note_id}, '{op}');
+            END
+        """)
+
+
+def change_log_sequence(conn):
+    # sqlite_sequence помнит последний выданный seq, даже если журнал обрезан целиком
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+
+@contextmanager
+def own_changes(conn, watcher):
+    """
+    Транзакция, записи журнала которой watcher пропустит: после массовых действий окно
+    само перестраивает список, и повторная перезагрузка по журналу не нужна.
+    Транзакция открывается сразу на запись, поэтому чужие записи в этот диапазон seq не попадут.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    first_seq = change_log_sequence(conn)
+    yield
+    last_seq = change_log_sequence(conn)
+    conn.commit()
+    if watcher is not None and last_seq > first_seq:
+        watcher.skip(first_seq + 1, last_seq)
+
+
+def trim_change_log(cursor, keep=CHANGE_LOG_KEEP):
+    cursor.execute("DELETE FROM change_log WHERE seq <= (SELECT MAX(seq) FROM change_log) - ?", (keep,))
+    return cursor.rowcount
+
+
+class ChangeWatcher:
+    """
+    Замечает изменения базы, сделанные другими соединениями. PRAGMA data_version в одном
+    постоянном соединении меняется только после чужого коммита и стоит микросекунды,
+    поэтому опрашивать его можно каждые CHANGE_POLL_INTERVAL_MS.
+    """
+
+    def __init__(self, db_file, limit=CHANGE_REFRESH_LIMIT):
+        self.conn = sqlite3.connect(db_file)
+        self.limit = limit
+        self.data_version = None
+        self.last_seq = 0
+        self.skipped = []
+        self.reset()
+
+    def reset(self):
+        """Считает текущее состояние базы уже увиденным"""
+        self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        self.last_seq = change_log_sequence(self.conn)
+        self.skipped = []
+
+    def skip(self, first_seq, last_seq):
+        self.skipped.append((first_seq, last_seq))
+
+    def poll(self):
+        """
+        None, если база не менялась. Иначе ({note_id: {op, ...}}, complete): complete равен False,
+        если изменений больше limit или часть журнала уже обрезана — тогда нужна полная перезагрузка.
+        """
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self.data_version:
+            return None
+        self.data_version = version
+
+        first_seq = self.conn.execute("SELECT MIN(seq) FROM change_log").fetchone()[0]
+        skipped = "".join(" AND seq NOT BETWEEN ? AND ?" for _ in self.skipped)
+        params = [self.last_seq] + [seq for seq_range in self.skipped for seq in seq_range] + [self.limit + 1]
+        rows = self.conn.execute(f"SELECT seq, note_id, op FROM change_log WHERE seq > ?{skipped} ORDER BY seq LIMIT ?",
+                                 params).fetchall()
+        complete = len(rows) <= self.limit and (first_seq is None or first_seq <= self.last_seq + 1)
+        if not complete:
+            self.last_seq = change_log_sequence(self.conn)
+            self.skipped = []
+            return {}, False
+
+        changes = {}
+        for seq, note_id, op in rows:
+            changes.setdefault(note_id, set()).add(op)
+        self.last_seq = max([self.last_seq] + [row[0] for row in rows[-1:]] + [last for first, last in self.skipped])
+        self.skipped = [seq_range for seq_range in self.skipped if seq_range[1] > self.last_seq]
+        return changes, True
+
+    def close(self):
+        self.conn.close()
+
+
+def fetch_changed_notes(cursor, note_ids):
+    """Текущее состояние изменённых заметок: {id: (title, created_ts, pinned, tag_ids)}; удалённых в ответе нет"""
+    cursor.execute(f"""
+        SELECT n.id, n.title, n.created_ts, n.pinned, {NOTE_TAGS_COLUMN}
+        FROM notes n WHERE n.id IN ({IDS_SUBQUERY})
+    """, (id_list(note_ids),))
+    return {note_id: (title or "", created_ts, bool(pinned), parse_tag_ids(tag_ids))
+            for note_id, title, created_ts, pinned, tag_ids in cursor.fetchall()}
+
+
+def fetch_note_contents(cursor, note_ids):
+    cursor.execute(f"SELECT id, content FROM notes WHERE id IN ({IDS_SUBQUERY})", (id_list(note_ids),))
+    return dict(cursor.fetchall())
@@ -0,0 +1,160 @@
+import os
+import sqlite3
+import sys
+import tracemalloc
+from datetime import datetime
+
+
+DIAGNOSTICS_TRACE_FRAMES = 1
+DIAGNOSTICS_TOP_ALLOCATIONS = 15
+
+
+class MemorySnapshot:
+    """Снимок памяти: учёт самого приложения (stats) и, если включён, снимок tracemalloc"""
+
+    __slots__ = ("taken_at", "stats", "traced")
+
+    def __init__(self, stats, traced=None):
+        self.taken_at = datetime.now()
+        self.stats = stats
+        self.traced = traced
+
+
+def start_tracing(frames=DIAGNOSTICS_TRACE_FRAMES):
+    """
+    Включает tracemalloc, если он ещё не запущен. Аллокации, сделанные до включения,
+    в снимки не попадают; для полного учёта приложение можно запустить с PYTHONTRACEMALLOC=1.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def take_snapshot(stats):
+    traced = None
+    if tracemalloc.is_tracing():
+        traced = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+    return MemorySnapshot(stats, traced)
+
+
+def string_bytes(values):
+    return sum(sys.getsizeof(value) for value in values if value is not None)
+
+
+def store_stats(store):
+    """Размеры хранилища метаданных заметок: заголовки и загруженное содержимое отдельно"""
+    notes = list(store.values())
+    contents = [note.content for note in notes if note.content is not None]
+    return {
+        "notes": len(notes),
+        "title_bytes": string_bytes(note.title for note in notes),
+        "loaded_contents": len(contents),
+        "content_bytes": string_bytes(contents),
+    }
+
+
+def sqlite_cache_stats(db_file):
+    """
+    Параметры страничного кэша SQLite. Приложение открывает соединение на каждый запрос,
+    поэтому кэш живёт недолго; cache_limit_bytes — верхняя граница на одно соединение.
+    """
+    try:
+        with sqlite3.connect(db_file) as conn:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            cache_size = conn.execute("PRAGMA cache_size").fetchone()[0]
+    except sqlite3.Error as e:
+        return {"error": str(e)}
+    # Отрицательный cache_size задаётся в КиБ, положительный — в страницах
+    cache_limit = -cache_size * 1024 if cache_size < 0 else cache_size * page_size
+    return {
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_count": freelist_count,
+        "file_bytes": os.path.getsize(db_file) if os.path.exists(db_file) else 0,
+        "cache_limit_bytes": cache_limit,
+    }
+
+
+def format_bytes(size):
+    for unit in ("Б", "КБ", "МБ"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "Б" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ГБ"
+
+
+def _format_value(key, value):
+    if isinstance(value, int) and key.endswith("bytes"):
+        return format_bytes(value)
+    return str(value)
+
+
+def _format_stats(stats):
+    lines = []
+    for section, values in stats.items():
+        lines.append(f"[{section}]")
+        for key, value in values.items():
+            lines.append(f"  {key}: {_format_value(key, value)}")
+    return lines
+
+
+def _top_lines(statistics, limit, with_diff):
+    lines = []
+    for stat in statistics[:limit]:
+        frame = stat.traceback[0]
+        location = f"{os.path.basename(frame.filename)}:{frame.lineno}"
+        if with_diff:
+            lines.append(f"  {'+' if stat.size_diff >= 0 else '-'}{format_bytes(abs(stat.size_diff))}"
+                         f" ({stat.count_diff:+d} блоков), всего {format_bytes(stat.size)} — {location}")
+        else:
+            lines.append(f"  {format_bytes(stat.size)} ({stat.count} блоков) — {location}")
+    return lines
+
+
+def diff_stats(old, new):
+    """Изменения числовых показателей между двумя снимками"""
+    lines = []
+    for section, values in new.items():
+        old_values = old.get(section, {})
+        for key, value in values.items():
+            old_value = old_values.get(key)
+            if isinstance(value, int) and isinstance(old_value, int) and value != old_value:
+                delta = value - old_value
+                shown = format_bytes(abs(delta)) if key.endswith("bytes") else str(abs(delta))
+                lines.append(f"  {section}.{key}: {'+' if delta > 0 else '-'}{shown}")
+    return lines
+
+
+def format_report(snapshot, previous=None, limit=DIAGNOSTICS_TOP_ALLOCATIONS):
+    lines = [f"Отчёт о памяти BoraNotes — {snapshot.taken_at.isoformat(timespec='seconds')}", ""]
+    lines.extend(_format_stats(snapshot.stats))
+
+    lines.append("")
+    if snapshot.traced is None:
+        lines.append("tracemalloc выключен: показан только учёт приложения.")
+    else:
+        traced_total = sum(stat.size for stat in snapshot.traced.statistics("filename"))
+        lines.append(f"tracemalloc: отслеживается {format_bytes(traced_total)}, крупнейшие места выделения:")
+        lines.extend(_top_lines(snapshot.traced.statistics("lineno"), limit, with_diff=False))
+
+    if previous is not None:
+        minutes = (snapshot.taken_at - previous.taken_at).total_seconds() / 60
+        lines.append("")
+        lines.append(f"Изменения с предыдущего снимка ({previous.taken_at:%H:%M:%S}, {minutes:.1f} мин. назад):")
+        stat_lines = diff_stats(previous.stats, snapshot.stats)
+        lines.extend(stat_lines or ["  показатели приложения не изменились"])
+        if snapshot.traced is not None and previous.traced is not None:
+            lines.append("Рост выделений по местам (tracemalloc):")
+            growth = [stat for stat in snapshot.traced.compare_to(previous.traced, "lineno") if stat.size_diff]
+            lines.extend(_top_lines(growth, limit, with_diff=True) or ["  без изменений"])
+    return "\n".join(lines)
+
+
+def write_report(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.write("\n")
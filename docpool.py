@@ -0,0 +1,88 @@
+from collections import OrderedDict
+
+
+DOCUMENT_POOL_SIZE = 8
+DOCUMENT_POOL_MAX_CHARACTERS = 2_000_000
+
+
+class PooledDocument:
+    __slots__ = ("note_id", "document", "cursor_position", "scroll_value")
+
+    def __init__(self, note_id, document):
+        self.note_id = note_id
+        self.document = document
+        self.cursor_position = 0
+        self.scroll_value = 0
+
+
+class DocumentPool:
+    """
+    LRU-пул разобранных QTextDocument для недавно открытых заметок.
+
+    Документы живут вместе со своей историей отмены, позицией курсора и прокруткой.
+    Пул ограничен и числом документов, и суммарным числом символов; перед вытеснением
+    документа вызывается on_evict(note_id, document), чтобы сохранить несохранённые изменения.
+    """
+
+    def __init__(self, on_evict=None, max_documents=DOCUMENT_POOL_SIZE, max_characters=DOCUMENT_POOL_MAX_CHARACTERS):
+        self.on_evict = on_evict
+        self.max_documents = max_documents
+        self.max_characters = max_characters
+        self._entries = OrderedDict()
+        self.active_note_id = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, note_id):
+        return note_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, note_id):
+        entry = self._entries.get(note_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(note_id)
+        return entry
+
+    def peek(self, note_id):
+        return self._entries.get(note_id)
+
+    def add(self, note_id, document):
+        self.remove(note_id)
+        entry = PooledDocument(note_id, document)
+        self._entries[note_id] = entry
+        self.evict()
+        return entry
+
+    def remove(self, note_id):
+        entry = self._entries.pop(note_id, None)
+        if entry is not None:
+            entry.document.deleteLater()
+        return entry
+
+    def entries(self):
+        return list(self._entries.values())
+
+    def total_characters(self):
+        return sum(entry.document.characterCount() for entry in self._entries.values())
+
+    def evict(self):
+        while len(self._entries) > 1 and (len(self._entries) > self.max_documents
+                                          or self.total_characters() > self.max_characters):
+            victim = next((note_id for note_id in self._entries if note_id != self.active_note_id), None)
+            if victim is None:
+                break
+            entry = self._entries[victim]
+            if self.on_evict:
+                self.on_evict(victim, entry.document)
+            self.remove(victim)
+            self.evictions += 1
+
+    def clear(self):
+        for note_id in list(self._entries):
+            self.remove(note_id)
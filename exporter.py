@@ -0,0 +1,351 @@
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from html.parser import HTMLParser
+
+
+EXPORT_FORMATS = {
+    "txt": ".txt",
+    "md": ".md",
+    "html": ".html",
+}
+EXPORT_TARGETS = ("directory", "zip", "jsonl")
+
+FETCH_BATCH_SIZE = 200
+PARALLEL_THRESHOLD = 500
+NO_TAG_FOLDER = "Без тегов"
+TAG_NAME_SEPARATOR = "\x1f"
+MANIFEST_NAME = "notes.jsonl"
+
+_BLOCK_TAGS = {"p", "li", "div", "h1", "h2", "h3", "h4", "h5", "h6", "tr", "pre"}
+_SKIP_TAGS = {"head", "style", "script", "title"}
+_UNSAFE_FILENAME_CHARS = re.compile(r'[\\/:*?"<>|\r\n\t]+')
+
+
+class _NoteHtmlConverter(HTMLParser):
+    """Потоковый разбор HTML заметки (из QTextEdit.toHtml) в текст или Markdown."""
+
+    def __init__(self, markdown=False):
+        super().__init__(convert_charrefs=True)
+        self.markdown = markdown
+        self.lines = []
+        self.current = []
+        self.in_block = False
+        self.skip_depth = 0
+        self.span_marks = []
+        self.list_stack = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self.skip_depth += 1
+            return
+        if tag in ("ul", "ol"):
+            self.list_stack.append([tag, 0])
+        elif tag in _BLOCK_TAGS:
+            self._flush_line()
+            self.in_block = True
+            if tag == "li" and self.markdown and self.list_stack:
+                self.list_stack[-1][1] += 1
+                kind, index = self.list_stack[-1]
+                indent = "  " * (len(self.list_stack) - 1)
+                self.current.append(f"{indent}{index}. " if kind == "ol" else f"{indent}- ")
+        elif tag == "br":
+            self._flush_line(force=True)
+        elif tag in ("span", "b", "strong", "i", "em", "s", "del"):
+            marks = self._marks_for(tag, dict(attrs).get("style") or "")
+            self.span_marks.append(marks)
+            self.current.append(marks)
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if tag in ("ul", "ol"):
+            if self.list_stack:
+                self.list_stack.pop()
+        elif tag in _BLOCK_TAGS:
+            self._flush_line(force=True)
+            self.in_block = False
+        elif tag in ("span", "b", "strong", "i", "em", "s", "del"):
+            marks = self.span_marks.pop() if self.span_marks else ""
+            if marks and self.current and self.current[-1] == marks:
+                self.current.pop()
+            else:
+                self.current.append(marks[::-1])
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        if not self.in_block and not data.strip():
+            return
+        if self.markdown:
+            data = re.sub(r"([\\`*_~\[\]#])", r"\\\1", data)
+        self.current.append(data)
+
+    def _marks_for(self, tag, style):
+        if not self.markdown:
+            return ""
+        style = style.replace(" ", "")
+        marks = ""
+        if tag in ("b", "strong") or re.search(r"font-weight:(6|7|8|9)00|font-weight:bold", style):
+            marks += "**"
+        if tag in ("i", "em") or "font-style:italic" in style:
+            marks += "_"
+        if tag in ("s", "del") or "line-through" in style:
+            marks += "~~"
+        return marks
+
+    def _flush_line(self, force=False):
+        if self.current or force:
+            self.lines.append("".join(self.current))
+        self.current = []
+
+    def result(self):
+        self._flush_line()
+        self.close()
+        while self.lines and not self.lines[-1].strip():
+            self.lines.pop()
+        return "\n".join(self.lines)
+
+
+def html_to_text(content):
+    """Возвращает простой текст заметки из её HTML"""
+    if not content:
+        return ""
+    if "<" not in content:
+        return content
+    converter = _NoteHtmlConverter(markdown=False)
+    converter.feed(content)
+    return converter.result()
+
+
+def html_to_markdown(content):
+    """Возвращает Markdown-представление заметки из её HTML"""
+    if not content:
+        return ""
+    if "<" not in content:
+        return content
+    converter = _NoteHtmlConverter(markdown=True)
+    converter.feed(content)
+    return converter.result()
+
+
+def _note_filter(note_ids):
+    """Условие отбора заметок по списку id (None — все заметки); список передаётся одним JSON-параметром"""
+    if note_ids is None:
+        return "", ()
+    return "WHERE n.id IN (SELECT value FROM json_each(?))", (json.dumps(list(note_ids)),)
+
+
+def iter_note_rows(db_file, batch_size=FETCH_BATCH_SIZE, note_ids=None):
+    """
+    Построчно отдаёт заметки из базы, читая их пачками через fetchmany,
+    чтобы в памяти никогда не находилась вся таблица целиком.
+    """
+    condition, params = _note_filter(note_ids)
+    conn = sqlite3.connect(db_file)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT n.id, n.title, n.content, n.created_ts, n.modified_ts, n.accessed_ts, n.pinned,
+                   (SELECT group_concat(t.name, char(31)) FROM note_tags nt JOIN tags t ON t.id = nt.tag_id
+                    WHERE nt.note_id = n.id),
+                   n.plain_text
+            FROM notes n
+            {condition}
+            ORDER BY n.id
+        """, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        conn.close()
+
+
+def iter_batches(rows, batch_size=FETCH_BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def safe_filename(note_id, title, extension):
+    title = _UNSAFE_FILENAME_CHARS.sub("_", (title or "").strip()).strip(". ")
+    title = title[:80] if title else "Без Названия"
+    return f"{note_id} - {title}{extension}"
+
+
+def safe_folder(name):
+    return _UNSAFE_FILENAME_CHARS.sub("_", name).strip(". ") or NO_TAG_FOLDER
+
+
+def _isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat(sep=" ") if timestamp else None
+
+
+def convert_note(row, export_format):
+    """Преобразует одну строку из базы в запись для экспорта (выполняется и в дочерних процессах)"""
+    note_id, title, content, created_ts, modified_ts, accessed_ts, pinned, tags, plain_text = row
+    content = content or ""
+    if export_format == "txt":
+        body = plain_text if plain_text is not None else html_to_text(content)
+    elif export_format == "md":
+        body = html_to_markdown(content)
+    else:
+        body = content
+
+    return {
+        "id": note_id,
+        "title": title or "",
+        "tags": tags.split(TAG_NAME_SEPARATOR) if tags else [],
+        "pinned": bool(pinned),
+        "created_at": _isoformat(created_ts),
+        "modified_at": _isoformat(modified_ts),
+        "last_accessed": _isoformat(accessed_ts),
+        "filename": safe_filename(note_id, title, EXPORT_FORMATS[export_format]),
+        "body": body,
+    }
+
+
+def _convert_batch(batch, export_format):
+    return [convert_note(row, export_format) for row in batch]
+
+
+def iter_converted(rows, export_format, workers=0, batch_size=FETCH_BATCH_SIZE):
+    """
+    Конвейер конвертации. При workers > 0 пачки обрабатываются в пуле процессов,
+    но в работе одновременно держится не больше workers * 2 пачек,
+    поэтому расход памяти не зависит от размера базы.
+    """
+    batches = iter_batches(rows, batch_size)
+    if not workers:
+        for batch in batches:
+            yield from _convert_batch(batch, export_format)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append(executor.submit(_convert_batch, batch, export_format))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _manifest_line(record, path):
+    metadata = {key: value for key, value in record.items() if key not in ("body", "filename")}
+    metadata["path"] = path
+    return json.dumps(metadata, ensure_ascii=False) + "\n"
+
+
+def _record_path(record):
+    folder = safe_folder(record["tags"][0]) if record["tags"] else NO_TAG_FOLDER
+    return f"{folder}/{record['filename']}"
+
+
+def write_directory(records, target_path):
+    count = 0
+    os.makedirs(target_path, exist_ok=True)
+    with open(os.path.join(target_path, MANIFEST_NAME), "w", encoding="utf-8") as manifest:
+        for record in records:
+            relative_path = _record_path(record)
+            full_path = os.path.join(target_path, *relative_path.split("/"))
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, "w", encoding="utf-8") as f:
+                f.write(record["body"])
+            manifest.write(_manifest_line(record, relative_path))
+            count += 1
+            yield count
+
+
+def write_zip(records, target_path):
+    count = 0
+    with zipfile.ZipFile(target_path, "w", compression=zipfile.ZIP_DEFLATED) as archive, \
+            tempfile.TemporaryFile("w+", encoding="utf-8") as manifest:
+        for record in records:
+            relative_path = _record_path(record)
+            archive.writestr(relative_path, record["body"])
+            manifest.write(_manifest_line(record, relative_path))
+            count += 1
+            yield count
+
+        manifest.seek(0)
+        with archive.open(MANIFEST_NAME, "w") as entry:
+            for line in manifest:
+                entry.write(line.encode("utf-8"))
+
+
+def write_jsonl(records, target_path):
+    count = 0
+    with open(target_path, "w", encoding="utf-8") as f:
+        for record in records:
+            record = dict(record)
+            del record["filename"]
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+            yield count
+
+
+WRITERS = {
+    "directory": write_directory,
+    "zip": write_zip,
+    "jsonl": write_jsonl,
+}
+
+
+def count_notes(db_file, note_ids=None):
+    condition, params = _note_filter(note_ids)
+    with sqlite3.connect(db_file) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM notes n {condition}", params).fetchone()[0]
+
+
+def export_notes(db_file, target_path, target="zip", export_format="md", workers=None, progress=None, note_ids=None):
+    """
+    Экспортирует заметки из базы: все или только note_ids.
+
+    Args:
+        db_file (str): Путь к базе заметок
+        target_path (str): Папка, ZIP-архив или JSONL-файл назначения
+        target (str): 'directory', 'zip' или 'jsonl'
+        export_format (str): 'txt', 'md' или 'html'
+        workers (int | None): Число процессов конвертации (None — выбрать автоматически, 0 — без пула)
+        progress (callable | None): progress(done, total) -> bool; False прерывает экспорт
+        note_ids (list | None): id экспортируемых заметок (None — все заметки)
+
+    Returns:
+        int: Количество экспортированных заметок
+    """
+    if target not in WRITERS:
+        raise ValueError(f"Неизвестный способ экспорта: {target}")
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат экспорта: {export_format}")
+
+    total = count_notes(db_file, note_ids)
+    if workers is None:
+        workers = min(os.cpu_count() or 1, 8) if total >= PARALLEL_THRESHOLD else 0
+
+    records = iter_converted(iter_note_rows(db_file, note_ids=note_ids), export_format, workers=workers)
+    writer = WRITERS[target](records, target_path)
+    done = 0
+    try:
+        for done in writer:
+            if progress and progress(done, total) is False:
+                break
+    finally:
+        writer.close()
+        records.close()
+    return done
@@ -0,0 +1,132 @@
+import argparse
+import hashlib
+import json
+import os
+
+from PyQt6.QtCore import QObject
+from PyQt6.QtNetwork import QLocalServer, QLocalSocket
+
+
+INSTANCE_SERVER_PREFIX = "boranotes-"
+INSTANCE_CONNECT_TIMEOUT_MS = 200
+INSTANCE_REPLY_TIMEOUT_MS = 10000
+INSTANCE_ACK = b"ok\n"
+
+
+def instance_server_name(db_file):
+    """Имя локального сервера зависит от пути к базе: окна с разными базами друг другу не мешают"""
+    digest = hashlib.sha1(os.path.abspath(db_file).encode("utf-8")).hexdigest()[:12]
+    return f"{INSTANCE_SERVER_PREFIX}{digest}"
+
+
+def parse_arguments(argv):
+    """
+    Команды из командной строки: [{"command": ...}, ...]. Заметка (NOTE) задаётся id или точным названием.
+    Неизвестные аргументы (например, параметры Qt) пропускаются.
+    """
+    parser = argparse.ArgumentParser(prog="boranotes", description="BORA NOTES")
+    parser.add_argument("--new", nargs="?", const="", metavar="TITLE", help="создать заметку")
+    parser.add_argument("--open", metavar="NOTE", help="открыть заметку")
+    parser.add_argument("--append", nargs=2, metavar=("NOTE", "TEXT"), help="дописать текст в конец заметки")
+    args, _ = parser.parse_known_args(argv)
+
+    commands = []
+    if args.open is not None:
+        commands.append({"command": "open", "note": args.open})
+    if args.append is not None:
+        commands.append({"command": "append", "note": args.append[0], "text": args.append[1]})
+    if args.new is not None:
+        commands.append({"command": "new", "title": args.new})
+    return commands
+
+
+def send_to_running_instance(server_name, commands):
+    """
+    Передаёт команды уже запущенному окну. Возвращает True, если окно их приняло —
+    тогда этот процесс можно завершать. QApplication для этого не нужен.
+    """
+    socket = QLocalSocket()
+    socket.connectToServer(server_name)
+    if not socket.waitForConnected(INSTANCE_CONNECT_TIMEOUT_MS):
+        return False
+    socket.write(json.dumps({"commands": commands}, ensure_ascii=False).encode("utf-8") + b"\n")
+    socket.flush()
+    reply = b""
+    while not reply.endswith(b"\n") and socket.waitForReadyRead(INSTANCE_REPLY_TIMEOUT_MS):
+        reply += bytes(socket.readAll())
+    socket.disconnectFromServer()
+    return reply == INSTANCE_ACK
+
+
+class InstanceServer(QObject):
+    """
+    Принимает команды от повторных запусков. Пока окно не готово (set_handler ещё не вызван),
+    команды копятся в очереди и выполняются по порядку, как только обработчик появится.
+    """
+
+    def __init__(self, server_name, parent=None):
+        super().__init__(parent)
+        self.server_name = server_name
+        self.pending = []
+        self.handler = None
+        self._buffers = {}
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.SocketOption.UserAccessOption)
+        self.server.newConnection.connect(self._accept)
+
+    def listen(self):
+        """
+        Начинает слушать. Если имя занято, а подключиться к нему нельзя, значит, прошлый процесс
+        завершился аварийно и оставил сокет — он удаляется. Возвращает False, если сервер уже есть.
+        """
+        if self.server.listen(self.server_name):
+            return True
+        probe = QLocalSocket()
+        probe.connectToServer(self.server_name)
+        if probe.waitForConnected(INSTANCE_CONNECT_TIMEOUT_MS):
+            probe.disconnectFromServer()
+            return False
+        QLocalServer.removeServer(self.server_name)
+        if not self.server.listen(self.server_name):
+            print(f"Ошибка запуска локального сервера: {self.server.errorString()}")
+        return True
+
+    def add_commands(self, commands):
+        if self.handler is None:
+            self.pending.extend(commands)
+            return
+        for command in commands:
+            self.handler(command)
+
+    def set_handler(self, handler):
+        self.handler = handler
+        pending, self.pending = self.pending, []
+        self.add_commands(pending)
+
+    def _accept(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            self._buffers[socket] = b""
+            socket.readyRead.connect(lambda s=socket: self._read(s))
+            socket.disconnected.connect(lambda s=socket: self._forget(s))
+
+    def _read(self, socket):
+        self._buffers[socket] = self._buffers.get(socket, b"") + bytes(socket.readAll())
+        if not self._buffers[socket].endswith(b"\n"):
+            return
+        try:
+            message = json.loads(self._buffers.pop(socket).decode("utf-8"))
+            commands = [command for command in message.get("commands", []) if isinstance(command, dict)]
+        except (ValueError, AttributeError) as e:
+            print(f"Ошибка разбора команды другого запуска: {e}")
+            socket.disconnectFromServer()
+            return
+        socket.write(INSTANCE_ACK)
+        socket.flush()
+        socket.disconnectFromServer()
+        # Повторный запуск без аргументов просто поднимает окно
+        self.add_commands([{"command": "activate"}] + commands)
+
+    def _forget(self, socket):
+        self._buffers.pop(socket, None)
+        socket.deleteLater()
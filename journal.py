@@ -0,0 +1,122 @@
+import json
+import os
+import time
+
+
+JOURNAL_FILE_NAME = "notes.oplog"
+FSYNC_INTERVAL_MS = 200
+SNAPSHOT_INTERVAL_MS = 10000
+
+
+def journal_path_for(db_file):
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), JOURNAL_FILE_NAME)
+
+
+class EditJournal:
+    """
+    Журнал операций редактирования между полными сохранениями заметки.
+
+    Каждая строка файла — JSON-запись одного изменения документа:
+        {"n": id, "p": позиция, "r": удалено символов, "t": вставленный текст}
+        {"n": id, "p": позиция, "r": удалено символов, "h": HTML вставленного фрагмента}
+        {"n": id, "title": новый заголовок}
+        {"n": id, "c": 1} — контрольная точка: заметка полностью сохранена в базе.
+    Запись идёт в буфер, fsync выполняется пачками через flush().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._pending_notes = set()
+        self._dirty = False
+        self.records_written = 0
+        self.bytes_written = 0
+        self.fsync_count = 0
+        self.fsync_time = 0.0
+
+    def _append(self, record):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        self._file.write(line)
+        self._dirty = True
+        self.records_written += 1
+        self.bytes_written += len(line)
+
+    def record_change(self, note_id, position, removed, text=None, html=None):
+        record = {"n": note_id, "p": position, "r": removed}
+        if html is not None:
+            record["h"] = html
+        else:
+            record["t"] = text or ""
+        self._append(record)
+        self._pending_notes.add(note_id)
+
+    def record_title(self, note_id, title):
+        self._append({"n": note_id, "title": title})
+        self._pending_notes.add(note_id)
+
+    def has_pending(self, note_id=None):
+        if note_id is None:
+            return bool(self._pending_notes)
+        return note_id in self._pending_notes
+
+    def flush(self):
+        if not self._dirty:
+            return
+        started = time.perf_counter()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._dirty = False
+        self.fsync_count += 1
+        self.fsync_time += time.perf_counter() - started
+
+    def checkpoint(self, note_id):
+        """Отмечает, что заметка целиком сохранена; когда несохранённых заметок не остаётся, журнал обнуляется"""
+        if note_id not in self._pending_notes:
+            return
+        self._pending_notes.discard(note_id)
+        if self._pending_notes:
+            self._append({"n": note_id, "c": 1})
+            self.flush()
+        else:
+            self.truncate()
+
+    def truncate(self):
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending_notes.clear()
+        self._dirty = False
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+def read_pending_operations(path):
+    """
+    Читает журнал и возвращает несохранённые операции по заметкам:
+    {note_id: {"ops": [...], "title": str | None}}. Оборванная последняя строка игнорируется.
+    """
+    pending = {}
+    if not os.path.exists(path):
+        return pending
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            note_id = record.get("n")
+            if note_id is None:
+                continue
+            if record.get("c"):
+                pending.pop(note_id, None)
+                continue
+            entry = pending.setdefault(note_id, {"ops": [], "title": None})
+            if "title" in record:
+                entry["title"] = record["title"]
+            else:
+                entry["ops"].append(record)
+    return pending
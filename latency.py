@@ -0,0 +1,172 @@
+import json
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+
+LATENCY_WINDOW = 500
+LATENCY_MIN_SAMPLES = 30
+LATENCY_WARN_P95_MS = 50.0
+LATENCY_SLOW_SAMPLES = 50
+LATENCY_REFRESH_MS = 1000
+
+KEYPRESS_METRIC = "keypress_paint"
+
+SIZE_BUCKETS = (
+    (10_000, "до 10 тыс. символов"),
+    (100_000, "до 100 тыс. символов"),
+    (1_000_000, "до 1 млн символов"),
+    (None, "больше 1 млн символов"),
+)
+
+
+def size_bucket(char_count):
+    for limit, name in SIZE_BUCKETS:
+        if limit is None or char_count <= limit:
+            return name
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class RollingHistogram:
+    """Последние window замеров в миллисекундах; перцентили считаются по ним при запросе"""
+
+    __slots__ = ("samples", "total")
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.total = 0
+
+    def add(self, value_ms):
+        self.samples.append(value_ms)
+        self.total += 1
+
+    def percentiles(self):
+        values = sorted(self.samples)
+        return {
+            "count": self.total,
+            "p50": round(percentile(values, 0.50), 2),
+            "p95": round(percentile(values, 0.95), 2),
+            "p99": round(percentile(values, 0.99), 2),
+            "max": round(values[-1], 2) if values else 0.0,
+        }
+
+
+class LatencyMonitor:
+    """
+    Замеры отзывчивости редактора: время от нажатия клавиши до отрисовки области текста
+    и время каждого обработчика изменения текста. Замеры раскладываются по корзинам
+    размера заметки; для каждой пары (метрика, корзина) держится скользящая гистограмма.
+
+    Когда p95 задержки ввода в какой-то корзине превышает warn_p95_ms, вызывается
+    on_warning(корзина, p95) — один раз, пока значение снова не опустится ниже порога.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW, warn_p95_ms=LATENCY_WARN_P95_MS, on_warning=None):
+        self.window = window
+        self.warn_p95_ms = warn_p95_ms
+        self.on_warning = on_warning
+        self.enabled = False
+        self.histograms = {}
+        self.slow_samples = deque(maxlen=LATENCY_SLOW_SAMPLES)
+        self.last_bucket = None
+        self._warned = set()
+        self._pending_key = None
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        self._pending_key = None
+
+    def reset(self):
+        self.histograms.clear()
+        self.slow_samples.clear()
+        self._warned.clear()
+        self._pending_key = None
+
+    def _histogram(self, metric, bucket):
+        histogram = self.histograms.get((metric, bucket))
+        if histogram is None:
+            histogram = self.histograms[(metric, bucket)] = RollingHistogram(self.window)
+        return histogram
+
+    def key_pressed(self, char_count, format_count):
+        """Нажатие клавиши в редакторе; засекается только первое нажатие до ближайшей отрисовки"""
+        if self.enabled and self._pending_key is None:
+            self._pending_key = (time.perf_counter(), char_count, format_count)
+
+    def painted(self):
+        if self._pending_key is None:
+            return
+        started, char_count, format_count = self._pending_key
+        self._pending_key = None
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        bucket = size_bucket(char_count)
+        self.last_bucket = bucket
+        histogram = self._histogram(KEYPRESS_METRIC, bucket)
+        histogram.add(elapsed_ms)
+
+        if elapsed_ms > self.warn_p95_ms:
+            self.slow_samples.append({
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "ms": round(elapsed_ms, 2),
+                "chars": char_count,
+                "formats": format_count,
+            })
+        self._check_threshold(bucket, histogram)
+
+    def _check_threshold(self, bucket, histogram):
+        if len(histogram.samples) < LATENCY_MIN_SAMPLES:
+            return
+        p95 = histogram.percentiles()["p95"]
+        if p95 <= self.warn_p95_ms:
+            self._warned.discard(bucket)
+        elif bucket not in self._warned:
+            self._warned.add(bucket)
+            if self.on_warning:
+                self.on_warning(bucket, p95)
+
+    @contextmanager
+    def _measure(self, metric, char_count):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._histogram(metric, size_bucket(char_count)).add((time.perf_counter() - started) * 1000)
+
+    def measure(self, metric, char_count):
+        """Контекстный менеджер для замера обработчика; при выключенном мониторе ничего не делает"""
+        if not self.enabled:
+            return nullcontext()
+        return self._measure(metric, char_count)
+
+    def summary(self):
+        result = {}
+        for (metric, bucket), histogram in self.histograms.items():
+            result.setdefault(metric, {})[bucket] = histogram.percentiles()
+        return result
+
+    def status_text(self):
+        histogram = self.histograms.get((KEYPRESS_METRIC, self.last_bucket))
+        if histogram is None:
+            return ""
+        stats = histogram.percentiles()
+        warning = "⚠ " if self.last_bucket in self._warned else ""
+        return (f"{warning}Ввод: p50 {stats['p50']:.0f} мс · p95 {stats['p95']:.0f} мс · "
+                f"p99 {stats['p99']:.0f} мс ({self.last_bucket})")
+
+    def export_json(self, path):
+        data = {
+            "exported_at": datetime.now().isoformat(timespec="seconds"),
+            "window": self.window,
+            "warn_p95_ms": self.warn_p95_ms,
+            "metrics": self.summary(),
+            "slow_samples": list(self.slow_samples),
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
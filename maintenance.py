@@ -0,0 +1,237 @@
+import sqlite3
+import threading
+import time
+
+
+MAINTENANCE_CHECK_INTERVAL_MS = 60_000
+MAINTENANCE_IDLE_SECONDS = 30
+MAINTENANCE_STEP_BUDGET = 0.25
+MAINTENANCE_CONVERT_BUDGET = 5.0
+MAINTENANCE_PROGRESS_OPS = 1000
+MAINTENANCE_STEPS_PER_RUN = 20
+MAINTENANCE_STEP_PAUSE = 0.05
+
+VACUUM_STEP_PAGES = 256
+VACUUM_MIN_FREE_PAGES = 64
+ANALYSIS_LIMIT = 400
+
+# Как часто повторять задачи, в секундах; инкрементальная очистка идёт, пока есть свободные страницы
+ORPHANS_INTERVAL = 24 * 60 * 60
+ANALYZE_INTERVAL = 24 * 60 * 60
+QUICK_CHECK_INTERVAL = 7 * 24 * 60 * 60
+CONVERT_RETRY_INTERVAL = 24 * 60 * 60
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class MaintenanceInterrupted(Exception):
+    """Задача не уложилась в бюджет времени или пользователь снова начал печатать"""
+
+
+def connect_db(db_file, **kwargs):
+    """Соединение с базой, в котором работают ON DELETE CASCADE внешних ключей"""
+    conn = sqlite3.connect(db_file, **kwargs)
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+class _Budget:
+    """
+    Ограничивает время запроса через обработчик прогресса SQLite: по истечении бюджета
+    или по событию stop запрос прерывается, а его транзакция откатывается.
+    """
+
+    def __init__(self, conn, seconds, stop=None):
+        self.conn = conn
+        self.deadline = time.perf_counter() + seconds
+        self.stop = stop
+        self.exceeded = False
+
+    def __enter__(self):
+        self.conn.set_progress_handler(self._check, MAINTENANCE_PROGRESS_OPS)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.conn.set_progress_handler(None, 0)
+        if exc_type is not None and issubclass(exc_type, sqlite3.OperationalError) and self.exceeded:
+            raise MaintenanceInterrupted(str(exc)) from exc
+        return False
+
+    def _check(self):
+        if time.perf_counter() > self.deadline or (self.stop is not None and self.stop.is_set()):
+            self.exceeded = True
+            return 1
+        return 0
+
+
+def remove_orphans(conn):
+    """
+    Удаляет строки, потерявшие свою заметку или тег (остались от времени, когда внешние ключи
+    не проверялись), и пересчитывает число заметок у тегов. Возвращает число удалённых строк.
+    """
+    removed = 0
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM note_revisions WHERE note_id NOT IN (SELECT id FROM notes)")
+    removed += cursor.rowcount
+    cursor.execute("""
+        DELETE FROM note_tags
+        WHERE note_id NOT IN (SELECT id FROM notes) OR tag_id NOT IN (SELECT id FROM tags)
+    """)
+    removed += cursor.rowcount
+    while True:
+        cursor.execute("DELETE FROM tags WHERE parent_id IS NOT NULL AND parent_id NOT IN (SELECT id FROM tags)")
+        if cursor.rowcount <= 0:
+            break
+        removed += cursor.rowcount
+    cursor.execute("""
+        UPDATE tags SET note_count = (SELECT COUNT(*) FROM note_tags nt WHERE nt.tag_id = tags.id)
+        WHERE note_count <> (SELECT COUNT(*) FROM note_tags nt WHERE nt.tag_id = tags.id)
+    """)
+    conn.commit()
+    return removed
+
+
+def enable_incremental_vacuum(conn):
+    """
+    Переводит базу в auto_vacuum=INCREMENTAL. Для уже созданной базы режим меняется
+    только полным VACUUM, поэтому это делается один раз и с отдельным бюджетом.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL:
+        return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+
+def incremental_vacuum_step(conn, pages=VACUUM_STEP_PAGES):
+    """Возвращает в файловую систему до pages свободных страниц; возвращает, сколько свободных осталось"""
+    conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    conn.commit()
+    return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def refresh_statistics(conn):
+    """
+    Обновляет статистику планировщика. PRAGMA optimize в коротком соединении ничего не делает
+    (ему нужна история запросов этого соединения), поэтому запускается ANALYZE по выборке
+    из analysis_limit строк на индекс — приблизительно, но быстро и на большой базе.
+    """
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def quick_check_table(conn, table):
+    """PRAGMA quick_check по одной таблице; возвращает список найденных проблем"""
+    rows = conn.execute(f"PRAGMA quick_check({table})").fetchall()
+    return [row[0] for row in rows if row[0] != "ok"]
+
+
+class MaintenanceState:
+    """Время последнего запуска задач и позиция проверки целостности — в таблице settings"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def get(self, key, default=0):
+        row = self.conn.execute("SELECT value FROM settings WHERE key = ?", (f"maintenance_{key}",)).fetchone()
+        try:
+            return int(row[0]) if row else default
+        except ValueError:
+            return default
+
+    def set(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                          (f"maintenance_{key}", str(int(value))))
+        self.conn.commit()
+
+    def due(self, key, interval, now):
+        return now - self.get(key) >= interval
+
+
+def run_maintenance_step(db_file, stop=None, budget=MAINTENANCE_STEP_BUDGET, now=None):
+    """
+    Выполняет одну ближайшую по очереди задачу обслуживания, не дольше budget секунд.
+    Порядок: мусорные строки, перевод в инкрементальный режим, очистка свободных страниц,
+    ANALYZE, quick_check очередной таблицы. Возвращает (задача, итог) или None, если делать нечего.
+    """
+    now = int(time.time()) if now is None else now
+    conn = connect_db(db_file, timeout=1)
+    try:
+        state = MaintenanceState(conn)
+
+        if state.due("orphans_ts", ORPHANS_INTERVAL, now):
+            with _Budget(conn, budget, stop):
+                removed = remove_orphans(conn)
+            state.set("orphans_ts", now)
+            return "orphans", f"удалено строк: {removed}"
+
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if auto_vacuum != AUTO_VACUUM_INCREMENTAL and state.due("convert_ts", CONVERT_RETRY_INTERVAL, now):
+            try:
+                with _Budget(conn, max(budget, MAINTENANCE_CONVERT_BUDGET), stop):
+                    enable_incremental_vacuum(conn)
+            except MaintenanceInterrupted:
+                if stop is None or not stop.is_set():
+                    # База слишком велика для бюджета — следующая попытка не раньше чем через CONVERT_RETRY_INTERVAL
+                    state.set("convert_ts", now)
+                raise
+            return "auto_vacuum", "включён режим INCREMENTAL"
+
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if auto_vacuum == AUTO_VACUUM_INCREMENTAL and free_pages >= VACUUM_MIN_FREE_PAGES:
+            with _Budget(conn, budget, stop):
+                left = incremental_vacuum_step(conn)
+            return "incremental_vacuum", f"свободных страниц: {free_pages} → {left}"
+
+        if state.due("analyze_ts", ANALYZE_INTERVAL, now):
+            with _Budget(conn, budget, stop):
+                refresh_statistics(conn)
+            state.set("analyze_ts", now)
+            return "analyze", "статистика обновлена"
+
+        if state.due("quick_check_ts", QUICK_CHECK_INTERVAL, now):
+            tables = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+            position = state.get("quick_check_position")
+            if position >= len(tables):
+                position = 0
+            table = tables[position]
+            # Таблица, не уложившаяся в бюджет, пропускается до следующего круга проверки
+            state.set("quick_check_position", position + 1)
+            with _Budget(conn, budget, stop):
+                problems = quick_check_table(conn, table)
+            if position + 1 >= len(tables):
+                state.set("quick_check_ts", now)
+                state.set("quick_check_position", 0)
+            return "quick_check", f"{table}: " + ("; ".join(problems[:5]) if problems else "ok")
+
+        return None
+    finally:
+        conn.close()
+
+
+def start_maintenance_thread(db_file, stop=None, on_finished=None):
+    """
+    Выполняет в фоновом потоке до MAINTENANCE_STEPS_PER_RUN шагов с паузами, в которые базу может
+    занять автосохранение. Останавливается, когда делать нечего, при ошибке или по событию stop.
+    on_finished(результат, ошибка) вызывается из этого потока после каждого шага.
+    """
+    def run():
+        for _ in range(MAINTENANCE_STEPS_PER_RUN):
+            if stop is not None and stop.is_set():
+                return
+            result = error = None
+            try:
+                result = run_maintenance_step(db_file, stop)
+            except (MaintenanceInterrupted, sqlite3.Error) as e:
+                error = e
+            if on_finished and (result is not None or error is not None):
+                on_finished(result, error)
+            if result is None:
+                return
+            time.sleep(MAINTENANCE_STEP_PAUSE)
+
+    thread = threading.Thread(target=run, name="boranotes-maintenance", daemon=True)
+    thread.start()
+    return thread
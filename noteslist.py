@@ -0,0 +1,63 @@
+import sqlite3
+
+from ranks import RANK_ORDER
+from tags import NOTE_TAGS_COLUMN
+
+
+LIST_BATCH_SIZE = 300
+LIST_FILL_INTERVAL_MS = 10
+UNTITLED_SORT_TITLE = "Без названия"
+
+# COLLATE NOCASE приводит к нижнему регистру только латиницу
+_ASCII_LOWERCASE = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+SORT_CLAUSES = {
+    "date_desc": "ORDER BY n.created_ts DESC",
+    "date_asc": "ORDER BY n.created_ts ASC",
+    "name_asc": "ORDER BY CASE WHEN n.title = '' THEN 'Без названия' ELSE n.title END COLLATE NOCASE ASC",
+    "name_desc": "ORDER BY CASE WHEN n.title = '' THEN 'Без названия' ELSE n.title END COLLATE NOCASE DESC",
+    "modified_desc": "ORDER BY n.modified_ts DESC",
+    "modified_asc": "ORDER BY n.modified_ts ASC",
+    "custom": RANK_ORDER,
+}
+
+
+def name_sort_key(title):
+    """Ключ, упорядочивающий названия так же, как сортировка по имени из SORT_CLAUSES"""
+    return (title or UNTITLED_SORT_TITLE).translate(_ASCII_LOWERCASE)
+
+
+def count_list_notes(cursor, condition="", params=()):
+    cursor.execute(f"SELECT COUNT(*) FROM notes n WHERE 1 = 1 {condition}", params)
+    return cursor.fetchone()[0]
+
+
+def iter_list_batches(db_file, condition, params, sort, batch_size=LIST_BATCH_SIZE):
+    """
+    Отдаёт строки списка заметок пачками: (закреплены ли, [(id, title, created_ts, id тегов через запятую), ...]).
+    Сначала идут закреплённые заметки (по дате создания, а в своём порядке — по нему же), затем остальные.
+    condition — условие фильтра по тегам из tag_filter_clause.
+    """
+    sort_clause = SORT_CLAUSES.get(sort, SORT_CLAUSES["modified_asc"])
+    queries = (
+        (True, RANK_ORDER if sort == "custom" else "ORDER BY n.created_ts DESC"),
+        (False, sort_clause),
+    )
+
+    conn = sqlite3.connect(db_file)
+    try:
+        cursor = conn.cursor()
+        for is_pinned, order_clause in queries:
+            cursor.execute(f"""
+                SELECT n.id, n.title, n.created_ts, {NOTE_TAGS_COLUMN}
+                FROM notes n
+                WHERE n.pinned = ? {condition}
+                {order_clause}
+            """, (1 if is_pinned else 0,) + params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield is_pinned, rows
+    finally:
+        conn.close()
@@ -0,0 +1,101 @@
+class NoteMeta:
+    """Компактная запись о заметке в памяти; content равен None, пока текст не загружен"""
+
+    __slots__ = ("id", "title", "content", "pinned", "tag_ids", "created_ts", "modified_ts")
+
+    def __init__(self, note_id, title="", content=None, pinned=False, tag_ids=(), created_ts=0, modified_ts=0):
+        self.id = note_id
+        self.title = title
+        self.content = content
+        self.pinned = pinned
+        self.tag_ids = tag_ids
+        self.created_ts = created_ts
+        self.modified_ts = modified_ts
+
+    def has_tag(self, tag_id):
+        return tag_id in self.tag_ids
+
+
+class NoteStore:
+    """
+    Хранилище метаданных заметок: поиск по id за O(1) и счётчик закреплённых заметок,
+    который поддерживается при каждом изменении, а не пересчитывается обходом.
+    update() меняет только переданные поля, остальные сохраняются.
+    """
+
+    def __init__(self):
+        self._notes = {}
+        self.pinned_count = 0
+
+    def __contains__(self, note_id):
+        return note_id in self._notes
+
+    def __len__(self):
+        return len(self._notes)
+
+    def __getitem__(self, note_id):
+        return self._notes[note_id]
+
+    def get(self, note_id):
+        return self._notes.get(note_id)
+
+    def values(self):
+        return self._notes.values()
+
+    def update(self, note_id, title=None, content=None, pinned=None, tag_ids=None,
+               created_ts=None, modified_ts=None):
+        note = self._notes.get(note_id)
+        if note is None:
+            note = self._notes[note_id] = NoteMeta(note_id, title or "")
+        elif title is not None:
+            note.title = title
+        if content is not None:
+            note.content = content
+        if pinned is not None:
+            self.set_pinned(note_id, pinned)
+        if tag_ids is not None:
+            note.tag_ids = tuple(tag_ids)
+        if created_ts is not None:
+            note.created_ts = created_ts
+        if modified_ts is not None:
+            note.modified_ts = modified_ts
+        return note
+
+    def drop_content(self, note_id):
+        """Забывает загруженный текст заметки — например, если его изменили в другой программе"""
+        note = self._notes.get(note_id)
+        if note is not None:
+            note.content = None
+
+    def set_pinned(self, note_id, pinned):
+        note = self._notes[note_id]
+        pinned = bool(pinned)
+        if note.pinned != pinned:
+            self.pinned_count += 1 if pinned else -1
+            note.pinned = pinned
+
+    def add_tag(self, note_id, tag_id):
+        note = self._notes.get(note_id)
+        if note is not None and tag_id not in note.tag_ids:
+            note.tag_ids += (tag_id,)
+
+    def remove_tag(self, note_id, tag_id):
+        note = self._notes.get(note_id)
+        if note is not None:
+            note.tag_ids = tuple(t for t in note.tag_ids if t != tag_id)
+
+    def drop_tags(self, tag_ids):
+        """Убирает удалённые теги у всех заметок"""
+        for note in self._notes.values():
+            if note.tag_ids and not tag_ids.isdisjoint(note.tag_ids):
+                note.tag_ids = tuple(t for t in note.tag_ids if t not in tag_ids)
+
+    def remove(self, note_id):
+        note = self._notes.pop(note_id, None)
+        if note is not None and note.pinned:
+            self.pinned_count -= 1
+        return note
+
+    def clear(self):
+        self._notes.clear()
+        self.pinned_count = 0
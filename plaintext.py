@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PyQt6.QtGui import QTextDocument
+
+
+BACKFILL_CHUNK_SIZE = 200
+BACKFILL_PARALLEL_THRESHOLD = 1000
+BACKFILL_PAUSE = 0.02
+
+
+def create_plain_text_columns(cursor):
+    cursor.execute("PRAGMA table_info(notes)")
+    columns = {row[1] for row in cursor.fetchall()}
+    if "plain_text" not in columns:
+        cursor.execute("ALTER TABLE notes ADD COLUMN plain_text TEXT")
+    if "word_count" not in columns:
+        cursor.execute("ALTER TABLE notes ADD COLUMN word_count INTEGER")
+    if "char_count" not in columns:
+        cursor.execute("ALTER TABLE notes ADD COLUMN char_count INTEGER")
+
+
+def text_stats(plain_text):
+    """Возвращает (текст, число слов, число символов) — так же, как их считает счётчик под редактором"""
+    plain_text = plain_text or ""
+    return plain_text, len(plain_text.split()), len(plain_text)
+
+
+def document_text(content):
+    """
+    Простой текст заметки так, как его отдаёт редактор (QTextDocument.toPlainText): иначе счётчики,
+    заполненные при переносе, менялись бы после первого сохранения заметки.
+    QGuiApplication для этого не нужен, поэтому разбор идёт и в процессах пула.
+    """
+    document = QTextDocument()
+    document.setHtml(content or "")
+    return document.toPlainText()
+
+
+def _strip_chunk(rows):
+    return [(note_id, content) + text_stats(document_text(content)) for note_id, content in rows]
+
+
+def _iter_chunks(db_file, chunk_size):
+    last_id = 0
+    while True:
+        with sqlite3.connect(db_file) as conn:
+            rows = conn.execute("""
+                SELECT id, content FROM notes
+                WHERE plain_text IS NULL AND id > ?
+                ORDER BY id LIMIT ?
+            """, (last_id, chunk_size)).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+
+
+def _iter_stripped(chunks, workers):
+    if not workers:
+        for rows in chunks:
+            yield _strip_chunk(rows)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for rows in chunks:
+            pending.append(executor.submit(_strip_chunk, rows))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def count_pending(db_file):
+    with sqlite3.connect(db_file) as conn:
+        return conn.execute("SELECT COUNT(*) FROM notes WHERE plain_text IS NULL").fetchone()[0]
+
+
+def backfill_plain_text(db_file, chunk_size=BACKFILL_CHUNK_SIZE, workers=None, pause=BACKFILL_PAUSE,
+                        should_stop=None, progress=None):
+    """
+    Заполняет plain_text, word_count и char_count у заметок, где их ещё нет.
+
+    HTML разбирается пачками (при большом объёме — в пуле процессов), а каждая пачка
+    записывается отдельной короткой транзакцией. Строка обновляется, только если её
+    содержимое не изменилось с момента чтения, поэтому задачу можно прервать в любой момент
+    и продолжить при следующем запуске.
+
+    Returns:
+        int: Количество заполненных заметок
+    """
+    total = count_pending(db_file)
+    if not total:
+        return 0
+    if workers is None:
+        workers = min(os.cpu_count() or 1, 4) if total >= BACKFILL_PARALLEL_THRESHOLD else 0
+
+    done = 0
+    stripped = _iter_stripped(_iter_chunks(db_file, chunk_size), workers)
+    try:
+        for chunk in stripped:
+            if should_stop and should_stop():
+                break
+            with sqlite3.connect(db_file) as conn:
+                cursor = conn.executemany("""
+                    UPDATE notes SET plain_text = ?, word_count = ?, char_count = ?
+                    WHERE id = ? AND plain_text IS NULL AND content IS ?
+                """, [(plain_text, word_count, char_count, note_id, content)
+                      for note_id, content, plain_text, word_count, char_count in chunk])
+                done += cursor.rowcount
+                conn.commit()
+            if progress:
+                progress(done, total)
+            time.sleep(pause)
+    finally:
+        stripped.close()
+    return done
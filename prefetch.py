@@ -0,0 +1,145 @@
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+PREFETCH_IDLE_MS = 300
+PREFETCH_NEIGHBOURS = 2
+PREFETCH_MAX_NOTES = 6
+PREFETCH_MAX_BYTES = 1_000_000
+PREFETCH_CACHE_BYTES = 4_000_000
+PREFETCH_DOCUMENTS = 2
+
+
+class NotePrefetcher:
+    """
+    Фоновая подгрузка заметок, которые, скорее всего, откроют следующими.
+
+    Рабочий поток читает содержимое заметок через собственное соединение только для чтения
+    и складывает результаты в очередь results, которую разбирает поток интерфейса.
+    За один проход читается не больше max_notes заметок и max_bytes байт, а всё
+    подгруженное, но ещё не открытое, держится в пределах cache_bytes.
+    Новый запрос или cancel() прерывает текущий проход.
+    """
+
+    def __init__(self, db_file, max_notes=PREFETCH_MAX_NOTES, max_bytes=PREFETCH_MAX_BYTES,
+                 cache_bytes=PREFETCH_CACHE_BYTES):
+        self.db_file = db_file
+        self.max_notes = max_notes
+        self.max_bytes = max_bytes
+        self.cache_bytes = cache_bytes
+        self.results = queue.Queue()
+        self._requests = queue.Queue()
+        self._generation = 0
+        self._thread = None
+        self.busy = False
+        self._unused = OrderedDict()
+        self.requested = 0
+        self.loaded = 0
+        self.bytes_loaded = 0
+        self.cancelled = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0
+
+    def schedule(self, note_ids):
+        if not note_ids:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="boranotes-prefetch", daemon=True)
+            self._thread.start()
+        self._generation += 1
+        self.busy = True
+        self.requested += len(note_ids)
+        self._requests.put((self._generation, list(note_ids)))
+
+    def cancel(self):
+        self._generation += 1
+        if self.busy:
+            self.busy = False
+            self.cancelled += 1
+
+    def stop(self):
+        self.cancel()
+        if self._thread is not None:
+            self._requests.put(None)
+            self._thread = None
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        try:
+            conn.execute("PRAGMA query_only = ON")
+            while True:
+                request = self._requests.get()
+                if request is None:
+                    break
+                generation, note_ids = request
+                budget = self.max_bytes
+                for note_id in note_ids[:self.max_notes]:
+                    if generation != self._generation or budget <= 0:
+                        break
+                    try:
+                        row = conn.execute("SELECT title, content FROM notes WHERE id = ?", (note_id,)).fetchone()
+                    except sqlite3.Error as e:
+                        print(f"Ошибка при подгрузке заметки: {e}")
+                        break
+                    if row is None:
+                        continue
+                    content = row[1] or ""
+                    budget -= len(content)
+                    self.results.put((generation, note_id, row[0], content))
+                self.results.put((generation, None, None, None))
+        finally:
+            conn.close()
+
+    def take_results(self):
+        """Забирает готовые результаты текущего запроса (устаревшие отбрасываются)"""
+        results = []
+        while True:
+            try:
+                generation, note_id, title, content = self.results.get_nowait()
+            except queue.Empty:
+                return results
+            if generation != self._generation:
+                continue
+            if note_id is None:
+                self.busy = False
+            else:
+                results.append((note_id, title, content))
+
+    def remember(self, note_id, size):
+        """
+        Учитывает подгруженную заметку. Возвращает id заметок, которые нужно выгрузить,
+        чтобы неиспользованные подгрузки уложились в cache_bytes.
+        """
+        self.loaded += 1
+        self.bytes_loaded += size
+        self._unused[note_id] = size
+        self._unused.move_to_end(note_id)
+
+        released = []
+        total = sum(self._unused.values())
+        while total > self.cache_bytes and len(self._unused) > 1:
+            old_note_id, old_size = self._unused.popitem(last=False)
+            total -= old_size
+            released.append(old_note_id)
+            self.wasted += 1
+        return released
+
+    def record_open(self, note_id):
+        if self._unused.pop(note_id, None) is not None:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def forget(self, note_id):
+        self._unused.pop(note_id, None)
+
+    def unused_bytes(self):
+        return sum(self._unused.values())
+
+    def hit_rate(self):
+        opened = self.hits + self.misses
+        return self.hits / opened if opened else 0.0
@@ -0,0 +1,143 @@
+import sqlite3
+
+
+# Цифры ключей в порядке ASCII, поэтому строки сравниваются так же, как в SQLite (BINARY)
+RANK_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+RANK_BASE = len(RANK_ALPHABET)
+RANK_REBALANCE_LENGTH = 12
+RANK_PREPEND_WIDTH = 4
+RANK_ORDER = "ORDER BY n.rank, n.id"
+
+
+def _rank_value(rank, width):
+    value = 0
+    for position in range(width):
+        value = value * RANK_BASE + (RANK_ALPHABET.index(rank[position]) if position < len(rank) else 0)
+    return value
+
+
+def _rank_digits(value, width):
+    digits = []
+    for _ in range(width):
+        value, digit = divmod(value, RANK_BASE)
+        digits.append(RANK_ALPHABET[digit])
+    return "".join(reversed(digits)).rstrip("0")
+
+
+def rank_below(after):
+    """
+    Ключ перед after для новой заметки в начале списка: after (не короче RANK_PREPEND_WIDTH цифр)
+    минус единица младшего разряда, как в LexoRank. Деление промежутка пополам удлиняло бы ключ
+    на цифру каждые 5–6 заметок, а так длина растёт, только когда место под первым ключом кончилось.
+    """
+    width = max(len(after), RANK_PREPEND_WIDTH)
+    while _rank_value(after, width) <= 1:
+        width += 1
+    return _rank_digits(_rank_value(after, width) - 1, width)
+
+
+def rank_between(before=None, after=None):
+    """
+    Ключ, который сортируется строго между before и after (None — начало или конец списка).
+    Ключи не заканчиваются на «0», поэтому между любыми двумя соседями всегда найдётся место.
+    """
+    if not before and after:
+        return rank_below(after)
+    before = before or ""
+    if after is not None and not before < after:
+        raise ValueError(f"Ключи порядка не возрастают: {before!r} >= {after!r}")
+    digits = []
+    position = 0
+    while True:
+        low = RANK_ALPHABET.index(before[position]) if position < len(before) else 0
+        high = RANK_ALPHABET.index(after[position]) if after is not None and position < len(after) else RANK_BASE
+        if high - low > 1:
+            digits.append(RANK_ALPHABET[(low + high) // 2])
+            return "".join(digits)
+        digits.append(RANK_ALPHABET[low])
+        if high - low == 1:
+            # Префикс уже меньше after, дальше ограничивает только before
+            after = None
+        position += 1
+
+
+def spread_ranks(count):
+    """
+    count ключей одинаковой длины, равномерно распределённых по верхней половине пространства ключей.
+    Нижняя половина остаётся под новые заметки в начале списка (см. rank_below).
+    """
+    width = 1
+    while RANK_BASE ** width <= count * 4:
+        width += 1
+    half = RANK_BASE ** width // 2
+    step = half // (count + 1)
+    return [_rank_digits(half + index * step, width) for index in range(1, count + 1)]
+
+
+def create_rank_column(cursor):
+    """
+    Столбец ручного порядка заметок. Существующим заметкам ключи раздаются в порядке
+    «от новых к старым», заметкам без ключа — в конец списка.
+    """
+    try:
+        cursor.execute("SELECT rank FROM notes LIMIT 1")
+    except sqlite3.OperationalError:
+        cursor.execute("ALTER TABLE notes ADD COLUMN rank TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_rank ON notes(pinned, rank)")
+
+    cursor.execute("SELECT id FROM notes WHERE rank IS NULL ORDER BY created_ts DESC, id DESC")
+    missing = [row[0] for row in cursor.fetchall()]
+    if not missing:
+        return
+    cursor.execute("SELECT MAX(rank) FROM notes")
+    last = cursor.fetchone()[0]
+    # Все новые ключи получают общий префикс после последнего ключа, чтобы не удлиняться с каждой заметкой
+    prefix = rank_between(last, None) if last is not None else ""
+    cursor.executemany("UPDATE notes SET rank = ? WHERE id = ?",
+                       [(prefix + rank, note_id) for rank, note_id in zip(spread_ranks(len(missing)), missing)])
+
+
+def first_rank(cursor, pinned=False):
+    """Ключ для новой заметки — перед первой заметкой своего раздела"""
+    cursor.execute("SELECT MIN(rank) FROM notes WHERE pinned = ?", (1 if pinned else 0,))
+    return rank_between(None, cursor.fetchone()[0])
+
+
+def move_note(cursor, note_id, before_id, after_id):
+    """
+    Ставит заметку между before_id и after_id (любой из них может быть None).
+    Пишет одну строку; возвращает новый ключ или None, если соседи нарушают порядок и нужна перебалансировка.
+    Список загружается пачками, поэтому если after_id нет, следующий ключ берётся из базы:
+    заметка, брошенная после последней загруженной строки, не должна уйти за ещё не показанные.
+    """
+    neighbour_ids = [neighbour_id for neighbour_id in (before_id, after_id) if neighbour_id is not None]
+    ranks = {}
+    if neighbour_ids:
+        cursor.execute(f"SELECT id, rank FROM notes WHERE id IN ({','.join('?' * len(neighbour_ids))})", neighbour_ids)
+        ranks = dict(cursor.fetchall())
+    before = ranks.get(before_id)
+    after = ranks.get(after_id)
+    if after_id is None and before is not None:
+        cursor.execute("""
+            SELECT MIN(rank) FROM notes
+            WHERE pinned = (SELECT pinned FROM notes WHERE id = ?) AND rank > ? AND id != ?
+        """, (note_id, before, note_id))
+        after = cursor.fetchone()[0]
+    if before is not None and after is not None and not before < after:
+        return None
+    rank = rank_between(before, after)
+    cursor.execute("UPDATE notes SET rank = ? WHERE id = ?", (rank, note_id))
+    return rank
+
+
+def rebalance_ranks(db_file):
+    """Переписывает все ключи короткими и равномерными, сохраняя порядок. Возвращает число заметок."""
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        note_ids = [row[0] for row in conn.execute("SELECT id FROM notes ORDER BY rank, id")]
+        conn.executemany("UPDATE notes SET rank = ? WHERE id = ?", zip(spread_ranks(len(note_ids)), note_ids))
+        conn.commit()
+        return len(note_ids)
+    finally:
+        conn.close()
@@ -0,0 +1,228 @@
+import difflib
+import json
+import time
+import zlib
+from collections import OrderedDict
+
+
+REVISION_MIN_INTERVAL = 60
+KEYFRAME_INTERVAL = 20
+KEEP_ALL_SECONDS = 24 * 60 * 60
+KEEP_HOURLY_SECONDS = 30 * 24 * 60 * 60
+REVISION_CACHE_SIZE = 32
+
+# Текст последней ревизии недавно сохранявшихся заметок, чтобы не собирать его из дельт при каждом сохранении
+_last_revision_cache = OrderedDict()
+
+
+def _remember_revision(note_id, revision_id, content):
+    _last_revision_cache[note_id] = (revision_id, content)
+    _last_revision_cache.move_to_end(note_id)
+    while len(_last_revision_cache) > REVISION_CACHE_SIZE:
+        _last_revision_cache.popitem(last=False)
+
+
+def create_revisions_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS note_revisions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            note_id INTEGER NOT NULL,
+            created_at INTEGER NOT NULL,
+            is_keyframe INTEGER NOT NULL,
+            title TEXT,
+            data BLOB NOT NULL,
+            FOREIGN KEY (note_id) REFERENCES notes(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_note_revisions_note ON note_revisions(note_id, id)")
+
+
+def encode_delta(previous, current):
+    """
+    Построчная дельта между двумя версиями HTML:
+    ["=", n] — взять n строк из предыдущей версии, ["-", n] — пропустить n строк, ["+", [...]] — вставить строки.
+    """
+    old_lines = previous.split("\n")
+    new_lines = current.split("\n")
+    operations = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            operations.append(["=", i2 - i1])
+            continue
+        if i2 > i1:
+            operations.append(["-", i2 - i1])
+        if j2 > j1:
+            operations.append(["+", new_lines[j1:j2]])
+    return zlib.compress(json.dumps(operations, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def apply_delta(previous, data):
+    old_lines = previous.split("\n")
+    new_lines = []
+    index = 0
+    for op, value in json.loads(zlib.decompress(data).decode("utf-8")):
+        if op == "=":
+            new_lines.extend(old_lines[index:index + value])
+            index += value
+        elif op == "-":
+            index += value
+        else:
+            new_lines.extend(value)
+    return "\n".join(new_lines)
+
+
+def encode_keyframe(content):
+    return zlib.compress(content.encode("utf-8"))
+
+
+def decode_keyframe(data):
+    return zlib.decompress(data).decode("utf-8")
+
+
+def _decode_chain(rows):
+    content = ""
+    for is_keyframe, data in rows:
+        content = decode_keyframe(data) if is_keyframe else apply_delta(content, data)
+    return content
+
+
+def get_revision_content(cursor, note_id, revision_id):
+    """Восстанавливает HTML ревизии от ближайшего предшествующего ключевого кадра"""
+    cursor.execute("""
+        SELECT is_keyframe, data FROM note_revisions
+        WHERE note_id = ? AND id <= ? AND id >= (
+            SELECT MAX(id) FROM note_revisions WHERE note_id = ? AND id <= ? AND is_keyframe = 1
+        )
+        ORDER BY id
+    """, (note_id, revision_id, note_id, revision_id))
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    return _decode_chain(rows)
+
+
+def list_revisions(cursor, note_id):
+    cursor.execute("""
+        SELECT id, created_at, title, is_keyframe, length(data)
+        FROM note_revisions WHERE note_id = ? ORDER BY id DESC
+    """, (note_id,))
+    return cursor.fetchall()
+
+
+def _last_revision(cursor, note_id):
+    cursor.execute("""
+        SELECT id, created_at, (SELECT COUNT(*) FROM note_revisions r
+                                WHERE r.note_id = ? AND r.id > (SELECT MAX(id) FROM note_revisions
+                                                               WHERE note_id = ? AND is_keyframe = 1))
+        FROM note_revisions WHERE note_id = ? ORDER BY id DESC LIMIT 1
+    """, (note_id, note_id, note_id))
+    return cursor.fetchone()
+
+
+def record_revision(cursor, note_id, title, content, now=None, force=False):
+    """
+    Записывает ревизию заметки, если с прошлой прошло не меньше REVISION_MIN_INTERVAL секунд
+    (или force=True) и содержимое изменилось. Каждая KEYFRAME_INTERVAL-я ревизия хранится целиком.
+
+    Returns:
+        bool: Была ли записана новая ревизия
+    """
+    now = int(now if now is not None else time.time())
+    content = content or ""
+    last = _last_revision(cursor, note_id)
+
+    if last is None:
+        cursor.execute("INSERT INTO note_revisions (note_id, created_at, is_keyframe, title, data) VALUES (?, ?, 1, ?, ?)",
+                    (note_id, now, title, encode_keyframe(content)))
+        _remember_revision(note_id, cursor.lastrowid, content)
+        return True
+
+    last_id, last_created_at, deltas_since_keyframe = last
+    if not force and now - last_created_at < REVISION_MIN_INTERVAL:
+        return False
+
+    cached = _last_revision_cache.get(note_id)
+    previous = cached[1] if cached and cached[0] == last_id else get_revision_content(cursor, note_id, last_id)
+    if previous == content:
+        _remember_revision(note_id, last_id, content)
+        return False
+
+    if deltas_since_keyframe + 1 >= KEYFRAME_INTERVAL:
+        cursor.execute("INSERT INTO note_revisions (note_id, created_at, is_keyframe, title, data) VALUES (?, ?, 1, ?, ?)",
+                    (note_id, now, title, encode_keyframe(content)))
+        _remember_revision(note_id, cursor.lastrowid, content)
+        thin_revisions(cursor, note_id, now)
+    else:
+        cursor.execute("INSERT INTO note_revisions (note_id, created_at, is_keyframe, title, data) VALUES (?, ?, 0, ?, ?)",
+                    (note_id, now, title, encode_delta(previous, content)))
+        _remember_revision(note_id, cursor.lastrowid, content)
+    return True
+
+
+def _retention_bucket(created_at, now):
+    age = now - created_at
+    if age < KEEP_ALL_SECONDS:
+        return None
+    if age < KEEP_HOURLY_SECONDS:
+        return ("hour", created_at // 3600)
+    return ("day", created_at // 86400)
+
+
+def thin_revisions(cursor, note_id, now=None):
+    """
+    Прореживает историю заметки: за последние сутки хранятся все ревизии,
+    до 30 дней — последняя ревизия каждого часа, дальше — последняя ревизия каждого дня.
+    Оставшиеся ревизии перекодируются в новую цепочку дельт.
+
+    Returns:
+        int: Количество удалённых ревизий
+    """
+    now = int(now if now is not None else time.time())
+    cursor.execute("SELECT id, created_at, is_keyframe, title, data FROM note_revisions WHERE note_id = ? ORDER BY id",
+                (note_id,))
+    rows = cursor.fetchall()
+
+    keep_index = {}
+    for index, row in enumerate(rows):
+        bucket = _retention_bucket(row[1], now)
+        keep_index[bucket if bucket is not None else ("all", index)] = index
+    survivors = set(keep_index.values())
+    if len(survivors) == len(rows):
+        return 0
+
+    first_changed = min(index for index in range(len(rows)) if index not in survivors)
+    content = ""
+    rewritten = []
+    previous_kept = None
+    deltas_since_keyframe = 0
+    for index, (revision_id, created_at, is_keyframe, title, data) in enumerate(rows):
+        content = decode_keyframe(data) if is_keyframe else apply_delta(content, data)
+        if index < first_changed:
+            previous_kept = content
+            deltas_since_keyframe = 0 if is_keyframe else deltas_since_keyframe + 1
+            continue
+        if index not in survivors:
+            continue
+        if previous_kept is None or deltas_since_keyframe + 1 >= KEYFRAME_INTERVAL:
+            rewritten.append((revision_id, created_at, 1, title, encode_keyframe(content)))
+            deltas_since_keyframe = 0
+        else:
+            rewritten.append((revision_id, created_at, 0, title, encode_delta(previous_kept, content)))
+            deltas_since_keyframe += 1
+        previous_kept = content
+
+    cursor.execute("DELETE FROM note_revisions WHERE note_id = ? AND id >= ?", (note_id, rows[first_changed][0]))
+    cursor.executemany("INSERT INTO note_revisions (id, note_id, created_at, is_keyframe, title, data) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(revision_id, note_id, created_at, is_keyframe, title, data)
+                     for revision_id, created_at, is_keyframe, title, data in rewritten])
+    _last_revision_cache.pop(note_id, None)
+    return len(rows) - len(survivors)
+
+
+def thin_all_revisions(cursor, now=None):
+    cursor.execute("SELECT DISTINCT note_id FROM note_revisions")
+    removed = 0
+    for (note_id,) in cursor.fetchall():
+        removed += thin_revisions(cursor, note_id, now)
+    return removed
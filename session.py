@@ -0,0 +1,54 @@
+import json
+import os
+import struct
+
+
+SESSION_FILE_NAME = "session.json"
+SESSION_VERSION = 2
+SESSION_LIST_ROWS = 40
+SESSION_MAX_CONTENT = 512 * 1024
+
+
+def session_path_for(db_file):
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), SESSION_FILE_NAME)
+
+
+def database_fingerprint(db_file):
+    """
+    Отпечаток состояния базы без единого запроса: счётчик изменений из заголовка файла SQLite
+    (увеличивается при каждой пишущей транзакции), размер и время изменения файла.
+    """
+    try:
+        stat = os.stat(db_file)
+        with open(db_file, "rb") as f:
+            header = f.read(28)
+    except OSError:
+        return None
+    change_counter = struct.unpack(">I", header[24:28])[0] if len(header) == 28 else 0
+    return f"{change_counter}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def write_session(path, session):
+    """Записывает снимок сеанса во временный файл и атомарно заменяет им старый"""
+    session = dict(session, version=SESSION_VERSION)
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(session, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Ошибка при сохранении снимка сеанса: {e}")
+
+
+def read_session(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            session = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(session, dict) or session.get("version") != SESSION_VERSION:
+        return None
+    return session
+
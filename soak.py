@@ -0,0 +1,369 @@
+"""
+Долгий прогон BoraNotes без окна: имитирует часы работы с заметками и проверяет,
+что память, число объектов Qt, размер базы и время автосохранения не растут со временем.
+
+    python soak.py --minutes 120 --output soak.json
+
+Прогон идёт во временной папке со своей базой. Код выхода 1 — какой-то показатель
+растёт сильнее допуска.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtCore import QEvent, QMimeData, QObject, Qt, QTimer
+from PyQt6.QtGui import QKeyEvent, QTextCursor, QTextDocument
+from PyQt6.QtTest import QTest
+from PyQt6.QtWidgets import QApplication, QMenu
+
+
+SOAK_MINUTES = 60
+SOAK_SAMPLE_SECONDS = 30
+SOAK_ACTION_PAUSE_MS = 20
+SOAK_WARMUP_FRACTION = 0.2
+SOAK_TARGET_NOTES = 40
+SOAK_MAX_NOTE_CHARS = 4000
+
+# Допустимый рост показателя за весь прогон по линейному тренду: (доля от среднего, абсолютный запас).
+# Срабатывает, только если рост больше обоих порогов — так небольшие счётчики не падают от ±1 объекта.
+SOAK_TOLERANCES = {
+    "rss_bytes": (0.10, 16 * 1024 * 1024),
+    "qt_objects": (0.05, 20),
+    "widgets": (0.05, 5),
+    "documents": (0.10, 4),
+    "db_bytes": (0.25, 1024 * 1024),
+    "autosave_ms": (0.50, 2.0),
+}
+
+WORDS = ("заметка", "список", "идея", "привет", "музыка", "кофе", "план", "завтра", "книга", "дом")
+SORTS = ("date_desc", "date_asc", "name_asc", "name_desc", "modified_desc", "modified_asc")
+
+
+def current_rss():
+    """Текущий объём резидентной памяти процесса в байтах (0, если узнать не удалось)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+    return 0
+
+
+def type_text(widget, text):
+    """Посылает нажатия клавиш с произвольными символами (QTest.keyClicks понимает только ASCII)"""
+    for char in text:
+        key = Qt.Key.Key_Return if char == "\n" else Qt.Key.Key_unknown
+        for event_type in (QEvent.Type.KeyPress, QEvent.Type.KeyRelease):
+            QApplication.sendEvent(widget, QKeyEvent(event_type, key, Qt.KeyboardModifier.NoModifier, char))
+
+
+def linear_slope(points):
+    count = len(points)
+    if count < 2:
+        return 0.0
+    mean_x = sum(x for x, _ in points) / count
+    mean_y = sum(y for _, y in points) / count
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def find_trends(samples, tolerances=SOAK_TOLERANCES, warmup=SOAK_WARMUP_FRACTION):
+    """
+    Оценивает рост каждого показателя после разогрева: наклон линейного тренда, умноженный
+    на длительность. Возвращает {показатель: (рост, среднее, допустимый рост)}.
+    """
+    steady = samples[int(len(samples) * warmup):]
+    trends = {}
+    if len(steady) < 3:
+        return trends
+    duration = steady[-1]["t"] - steady[0]["t"]
+    for metric, tolerance in tolerances.items():
+        points = [(sample["t"], sample[metric]) for sample in steady if sample.get(metric) is not None]
+        if len(points) < 3:
+            continue
+        mean = sum(y for _, y in points) / len(points)
+        relative, absolute = tolerance
+        trends[metric] = (linear_slope(points) * duration, mean, max(relative * mean, absolute))
+    return trends
+
+
+class SoakDriver:
+    """Случайные, но воспроизводимые (по seed) действия пользователя над окном NotesApp"""
+
+    def __init__(self, app, window, seed=0):
+        self.app = app
+        self.window = window
+        self.random = random.Random(seed)
+        self.autosave_times = []
+        self.actions_done = 0
+        self.actions = (
+            (30, self.type_burst),
+            (8, self.toggle_format),
+            (6, self.paste_text),
+            (15, self.switch_note),
+            (2, self.flip_theme),
+            (3, self.change_sort),
+            (3, self.change_tag_filter),
+            (3, self.toggle_tag),
+            (2, self.toggle_pin),
+            (3, self.new_note),
+            (3, self.delete_note),
+            (3, self.open_menu),
+        )
+        self._weights = [weight for weight, _ in self.actions]
+        window.skip_delete_confirmation = True
+
+    def pump(self, limit=5.0):
+        deadline = time.monotonic() + limit
+        self.app.processEvents()
+        while self.window._list_loading and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.001)
+
+    def step(self):
+        action = self.random.choices(self.actions, weights=self._weights)[0][1]
+        action()
+        self.pump()
+        self.autosave()
+        self.actions_done += 1
+
+    def autosave(self):
+        window = self.window
+        if not window.need_save:
+            return
+        window._save_timer.stop()
+        started = time.perf_counter()
+        window._perform_auto_save()
+        self.autosave_times.append((time.perf_counter() - started) * 1000)
+
+    def _random_text(self, words):
+        return " ".join(self.random.choice(WORDS) for _ in range(words))
+
+    def populate(self):
+        """Создаёт заметки до целевого числа, чтобы их количество не росло во время замеров"""
+        while len(self.window._notes_cache) < SOAK_TARGET_NOTES:
+            self.window.new_note()
+            self.pump()
+            self.type_burst()
+            self.autosave()
+
+    def _ensure_note(self):
+        if self.window.current_note_id is None:
+            self.window.new_note()
+            self.pump()
+
+    def type_burst(self):
+        self._ensure_note()
+        editor = self.window.text_editor
+        editor.setFocus()
+        cursor = editor.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        editor.setTextCursor(cursor)
+        type_text(editor, self._random_text(self.random.randint(3, 15)) + " ")
+        if self.random.random() < 0.3:
+            type_text(editor, "\n")
+        self.trim_note()
+
+    def trim_note(self):
+        """Держит заметки в пределах SOAK_MAX_NOTE_CHARS, удаляя начало — как при обычной правке"""
+        editor = self.window.text_editor
+        excess = editor.document().characterCount() - SOAK_MAX_NOTE_CHARS
+        if excess <= 0:
+            return
+        cursor = QTextCursor(editor.document())
+        cursor.setPosition(excess + SOAK_MAX_NOTE_CHARS // 4, QTextCursor.MoveMode.KeepAnchor)
+        cursor.removeSelectedText()
+
+    def toggle_format(self):
+        self._ensure_note()
+        editor = self.window.text_editor
+        length = editor.document().characterCount() - 1
+        if length < 2:
+            return
+        start = self.random.randrange(0, length - 1)
+        cursor = editor.textCursor()
+        cursor.setPosition(start)
+        cursor.setPosition(self.random.randint(start + 1, length), QTextCursor.MoveMode.KeepAnchor)
+        editor.setTextCursor(cursor)
+        self.random.choice((
+            self.window.toggle_bold, self.window.toggle_italic, self.window.toggle_underline,
+            self.window.toggle_strikethrough, self.window.toggle_highlight,
+        ))()
+
+    def paste_text(self):
+        self._ensure_note()
+        data = QMimeData()
+        data.setText("\n".join(self._random_text(8) for _ in range(self.random.randint(1, 10))))
+        self.window.text_editor.insertFromMimeData(data)
+
+    def switch_note(self):
+        notes_list = self.window.notes_list
+        if notes_list.count() < 2:
+            return
+        item = notes_list.item(self.random.randrange(notes_list.count()))
+        if item is None or item.isHidden():
+            return
+        notes_list.setCurrentItem(item)
+        self.window.load_note()
+
+    def flip_theme(self):
+        self.window.apply_theme("dark" if self.window.current_theme == "light" else "light")
+
+    def change_sort(self):
+        self.window.sort_notes(self.random.choice(SORTS))
+
+    def change_tag_filter(self):
+        tag_ids = list(self.window._tags.tags)
+        choice = self.random.randrange(5)
+        if choice == 0 or not tag_ids:
+            self.window.set_tag_filter({})
+        elif choice == 1:
+            self.window.set_tag_filter({"untagged": True})
+        else:
+            mode = ("any", "all", "none")[choice - 2]
+            self.window.set_tag_filter({mode: self.random.sample(tag_ids, min(2, len(tag_ids)))})
+
+    def toggle_tag(self):
+        note_id = self.window.current_note_id
+        note = self.window._notes_cache.get(note_id)
+        if note is None or not self.window._tags.tags:
+            return
+        tag_id = self.random.choice(list(self.window._tags.tags))
+        if note.has_tag(tag_id):
+            self.window.remove_note_tag(note_id, tag_id)
+        else:
+            self.window.add_note_tag(note_id, tag_id)
+
+    def toggle_pin(self):
+        note_id = self.window.current_note_id
+        note = self.window._notes_cache.get(note_id)
+        if note is None or (not note.pinned and self.window._notes_cache.pinned_count >= 3):
+            return
+        self.window.toggle_pin_status(note_id)
+
+    def new_note(self):
+        if len(self.window._notes_cache) < SOAK_TARGET_NOTES * 5 // 4:
+            self.window.new_note()
+            self.pump()
+            self.type_burst()
+
+    def delete_note(self):
+        if len(self.window._notes_cache) > SOAK_TARGET_NOTES * 3 // 4:
+            self.window.delete_note()
+
+    def open_menu(self):
+        QTimer.singleShot(0, self._close_popup)
+        self.random.choice((
+            self.window.show_sort_menu, self.window.show_tag_menu, self.window.show_settings,
+        ))()
+
+    def _close_popup(self):
+        popup = QApplication.activePopupWidget()
+        if popup is None:
+            QTimer.singleShot(5, self._close_popup)
+        else:
+            popup.close()
+
+
+def sample(started, window, driver, db_file):
+    autosave_times = driver.autosave_times
+    driver.autosave_times = []
+    return {
+        "t": round(time.monotonic() - started, 1),
+        "actions": driver.actions_done,
+        "rss_bytes": current_rss() or None,
+        "qt_objects": len(window.findChildren(QObject)),
+        "widgets": len(QApplication.allWidgets()),
+        "documents": len(window.findChildren(QTextDocument)),
+        "menus": len(window.findChildren(QMenu)),
+        "notes": len(window._notes_cache),
+        "db_bytes": os.path.getsize(db_file) if os.path.exists(db_file) else 0,
+        "autosave_ms": round(sum(autosave_times) / len(autosave_times), 3) if autosave_times else None,
+    }
+
+
+def run_soak(minutes=SOAK_MINUTES, sample_seconds=SOAK_SAMPLE_SECONDS, seed=0, workdir=None, output=None):
+    """Прогоняет сеанс и возвращает (снимки показателей, тренды, провалившиеся показатели)"""
+    workdir = workdir or tempfile.mkdtemp(prefix="boranotes-soak-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    import boranotes
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = boranotes.NotesApp()
+    window.show()
+    driver = SoakDriver(app, window, seed)
+    driver.pump()
+    driver.populate()
+    db_file = os.path.abspath(boranotes.DB_FILE)
+
+    samples = []
+    started = time.monotonic()
+    deadline = started + minutes * 60
+    next_sample = started
+    while time.monotonic() < deadline:
+        if time.monotonic() >= next_sample:
+            samples.append(sample(started, window, driver, db_file))
+            print(json.dumps(samples[-1], ensure_ascii=False), flush=True)
+            next_sample += sample_seconds
+        driver.step()
+        QTest.qWait(SOAK_ACTION_PAUSE_MS)
+    samples.append(sample(started, window, driver, db_file))
+    window.close()
+
+    trends = find_trends(samples)
+    failed = {metric: trend for metric, trend in trends.items() if trend[0] > trend[2]}
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"workdir": workdir, "seed": seed, "samples": samples,
+                       "trends": {metric: {"growth": round(growth, 3), "mean": round(mean, 3), "allowed": round(allowed, 3)}
+                                  for metric, (growth, mean, allowed) in trends.items()}},
+                      f, ensure_ascii=False, indent=2)
+    return samples, trends, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Долгий прогон BoraNotes с проверкой утечек")
+    parser.add_argument("--minutes", type=float, default=SOAK_MINUTES)
+    parser.add_argument("--sample-seconds", type=float, default=SOAK_SAMPLE_SECONDS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="папка для базы прогона (по умолчанию временная)")
+    parser.add_argument("--output", help="JSON-файл для снимков и трендов")
+    args = parser.parse_args()
+
+    samples, trends, failed = run_soak(args.minutes, args.sample_seconds, args.seed, args.workdir, args.output)
+    for metric, (growth, mean, allowed) in sorted(trends.items()):
+        status = "РОСТ" if metric in failed else "ок"
+        share = f" ({growth / mean:+.1%})" if mean else ""
+        print(f"{metric}: рост {growth:+.1f}{share} при допуске {allowed:.1f} — {status}")
+    print(f"Снимков: {len(samples)}, действий: {samples[-1]['actions'] if samples else 0}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+import json
+
+
+DEFAULT_TAG_ICON = "🏷️"
+TAG_PATH_SEPARATOR = "/"
+
+# Теги новой базы — они же пять бывших фиксированных категорий: (старый id, название, значок)
+DEFAULT_TAGS = (
+    ("personal", "Личное", "📓"),
+    ("study", "Учеба", "📚"),
+    ("work", "Работа", "👔"),
+    ("daily", "Ежедневное", "🏡"),
+    ("inspiration", "Вдохновение", "☁️"),
+)
+
+NOTE_TAGS_COLUMN = "(SELECT group_concat(nt.tag_id) FROM note_tags nt WHERE nt.note_id = n.id)"
+
+
+def create_tag_tables(cursor):
+    """
+    Теги и их связи с заметками. Первичный ключ note_tags начинается с tag_id, поэтому выборка
+    заметок по тегу идёт по индексу; обратный индекс нужен для тегов конкретной заметки.
+    Число заметок у тега поддерживают триггеры. В новую базу добавляются теги DEFAULT_TAGS.
+    """
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'tags'")
+    is_new = cursor.fetchone() is None
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            parent_id INTEGER REFERENCES tags(id) ON DELETE CASCADE,
+            icon TEXT NOT NULL DEFAULT '',
+            note_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tags_parent_name ON tags(IFNULL(parent_id, 0), name)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS note_tags (
+            tag_id INTEGER NOT NULL REFERENCES tags(id) ON DELETE CASCADE,
+            note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+            PRIMARY KEY (tag_id, note_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_note_tags_note ON note_tags(note_id, tag_id)")
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS note_tags_count_insert AFTER INSERT ON note_tags BEGIN
+            UPDATE tags SET note_count = note_count + 1 WHERE id = NEW.tag_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS note_tags_count_delete AFTER DELETE ON note_tags BEGIN
+            UPDATE tags SET note_count = note_count - 1 WHERE id = OLD.tag_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS notes_delete_tags AFTER DELETE ON notes BEGIN
+            DELETE FROM note_tags WHERE note_id = OLD.id;
+        END
+    """)
+    if is_new:
+        cursor.executemany("INSERT INTO tags (name, parent_id, icon) VALUES (?, NULL, ?)",
+                           [(name, icon) for legacy_id, name, icon in DEFAULT_TAGS])
+
+
+def migrate_categories(cursor):
+    """
+    Переносит старую таблицу categories в теги: каждая из пяти категорий становится обычным
+    тегом, а выбранная категория в настройках — фильтром по тегу. Возвращает число перенесённых связей.
+    """
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'categories'")
+    if cursor.fetchone() is None:
+        return 0
+
+    tag_ids = {}
+    for legacy_id, name, icon in DEFAULT_TAGS:
+        cursor.execute("INSERT OR IGNORE INTO tags (name, parent_id, icon) VALUES (?, NULL, ?)", (name, icon))
+        cursor.execute("SELECT id FROM tags WHERE parent_id IS NULL AND name = ?", (name,))
+        tag_ids[legacy_id] = cursor.fetchone()[0]
+
+    migrated = 0
+    for legacy_id, tag_id in tag_ids.items():
+        cursor.execute("""
+            INSERT OR IGNORE INTO note_tags (tag_id, note_id)
+            SELECT ?, c.note_id FROM categories c
+            WHERE c.category = ? AND c.note_id IN (SELECT id FROM notes)
+        """, (tag_id, legacy_id))
+        migrated += cursor.rowcount
+    cursor.execute("DROP TABLE categories")
+
+    cursor.execute("SELECT value FROM settings WHERE key = 'current_category'")
+    row = cursor.fetchone()
+    if row is not None:
+        category = row[0]
+        if category == "no_category":
+            tag_filter = {"untagged": True}
+        elif category in tag_ids:
+            tag_filter = {"any": [tag_ids[category]]}
+        else:
+            tag_filter = {}
+        cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('tag_filter', ?)",
+                       (dump_tag_filter(tag_filter),))
+        cursor.execute("DELETE FROM settings WHERE key = 'current_category'")
+    return migrated
+
+
+class Tag:
+    __slots__ = ("id", "name", "parent_id", "icon", "note_count")
+
+    def __init__(self, tag_id, name, parent_id=None, icon="", note_count=0):
+        self.id = tag_id
+        self.name = name
+        self.parent_id = parent_id
+        self.icon = icon
+        self.note_count = note_count
+
+    @property
+    def display_icon(self):
+        return self.icon or DEFAULT_TAG_ICON
+
+
+class TagRegistry:
+    """Все теги в памяти: дерево, пути вида «Работа/Проекты» и значки для строк списка"""
+
+    def __init__(self):
+        self.tags = {}
+        self._children = {}
+
+    def load(self, cursor):
+        cursor.execute("SELECT id, name, parent_id, icon, note_count FROM tags")
+        self.tags = {row[0]: Tag(*row) for row in cursor.fetchall()}
+        self._children = {}
+        for tag in self.tags.values():
+            self._children.setdefault(tag.parent_id, []).append(tag)
+        for children in self._children.values():
+            children.sort(key=lambda tag: tag.name.lower())
+
+    def refresh_counts(self, cursor):
+        cursor.execute("SELECT id, note_count FROM tags")
+        for tag_id, note_count in cursor.fetchall():
+            tag = self.tags.get(tag_id)
+            if tag is not None:
+                tag.note_count = note_count
+
+    def __contains__(self, tag_id):
+        return tag_id in self.tags
+
+    def get(self, tag_id):
+        return self.tags.get(tag_id)
+
+    def tree(self, parent_id=None, depth=0):
+        """Теги в порядке обхода дерева: [(тег, глубина), ...]"""
+        result = []
+        for tag in self._children.get(parent_id, ()):
+            result.append((tag, depth))
+            result.extend(self.tree(tag.id, depth + 1))
+        return result
+
+    def path(self, tag_id):
+        names = []
+        tag = self.tags.get(tag_id)
+        while tag is not None:
+            names.append(tag.name)
+            tag = self.tags.get(tag.parent_id)
+        return TAG_PATH_SEPARATOR.join(reversed(names))
+
+    def descendants(self, tag_id):
+        """Сам тег и все вложенные в него"""
+        result = [tag_id]
+        for tag in self._children.get(tag_id, ()):
+            result.extend(self.descendants(tag.id))
+        return result
+
+    def icon_map(self):
+        """Снимок {id: значок} для фонового потока загрузки списка"""
+        return {tag_id: tag.display_icon for tag_id, tag in self.tags.items()}
+
+
+def icons_from_map(icon_map, tag_ids, limit=2):
+    return " ".join(icon_map[tag_id] for tag_id in tag_ids[:limit] if tag_id in icon_map)
+
+
+def parse_tag_ids(text):
+    return tuple(int(tag_id) for tag_id in text.split(",")) if text else ()
+
+
+def create_tag(cursor, path, icon=""):
+    """Создаёт тег по пути «Родитель/Ребёнок», добавляя недостающих родителей; возвращает id последнего"""
+    parent_id = None
+    names = [name.strip() for name in path.split(TAG_PATH_SEPARATOR) if name.strip()]
+    if not names:
+        raise ValueError("Пустое название тега")
+    for index, name in enumerate(names):
+        cursor.execute("SELECT id FROM tags WHERE IFNULL(parent_id, 0) = IFNULL(?, 0) AND name = ?", (parent_id, name))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute("INSERT INTO tags (name, parent_id, icon) VALUES (?, ?, ?)",
+                           (name, parent_id, icon if index == len(names) - 1 else ""))
+            parent_id = cursor.lastrowid
+        else:
+            parent_id = row[0]
+    return parent_id
+
+
+def delete_tag(cursor, registry, tag_id):
+    """Удаляет тег вместе с вложенными; сами заметки не трогает"""
+    tag_ids = registry.descendants(tag_id)
+    placeholders = ",".join("?" * len(tag_ids))
+    cursor.execute(f"DELETE FROM note_tags WHERE tag_id IN ({placeholders})", tag_ids)
+    cursor.execute(f"DELETE FROM tags WHERE id IN ({placeholders})", tag_ids)
+
+
+def dump_tag_filter(tag_filter):
+    return json.dumps({key: value for key, value in tag_filter.items() if value}, sort_keys=True)
+
+
+def parse_tag_filter(text):
+    """
+    Фильтр по тегам: all — заметка должна иметь каждый из тегов (И), any — хотя бы один (ИЛИ),
+    none — ни одного (НЕ), untagged — только заметки без тегов. Пустой фильтр пропускает всё.
+    """
+    try:
+        data = json.loads(text) if text else {}
+    except ValueError:
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    try:
+        return {
+            "all": [int(tag_id) for tag_id in data.get("all", [])],
+            "any": [int(tag_id) for tag_id in data.get("any", [])],
+            "none": [int(tag_id) for tag_id in data.get("none", [])],
+            "untagged": bool(data.get("untagged")),
+        }
+    except (TypeError, ValueError):
+        return {"all": [], "any": [], "none": [], "untagged": False}
+
+
+def tag_filter_clause(tag_filter, registry):
+    """
+    Условие WHERE для фильтра (с ведущим AND) и его параметры. Тег совпадает и со всеми
+    вложенными в него. Каждое условие — выборка по первичному ключу note_tags (tag_id, note_id).
+    """
+    conditions = []
+    params = []
+
+    def notes_with(tag_ids):
+        expanded = []
+        for tag_id in tag_ids:
+            if tag_id in registry:
+                expanded.extend(registry.descendants(tag_id))
+        if not expanded:
+            return None
+        params.extend(expanded)
+        return f"SELECT note_id FROM note_tags WHERE tag_id IN ({','.join('?' * len(expanded))})"
+
+    if tag_filter.get("untagged"):
+        conditions.append("NOT EXISTS (SELECT 1 FROM note_tags nt WHERE nt.note_id = n.id)")
+    for tag_id in tag_filter.get("all", ()):
+        subquery = notes_with([tag_id])
+        conditions.append(f"n.id IN ({subquery})" if subquery else "0")
+    if tag_filter.get("any"):
+        subquery = notes_with(tag_filter["any"])
+        conditions.append(f"n.id IN ({subquery})" if subquery else "0")
+    if tag_filter.get("none"):
+        subquery = notes_with(tag_filter["none"])
+        if subquery:
+            conditions.append(f"n.id NOT IN ({subquery})")
+
+    if not conditions:
+        return "", ()
+    return "AND " + " AND ".join(conditions), tuple(params)
@@ -54,6 +54,13 @@ def get_theme(theme_name):
                 }
             """,
             
+            "note_row": {
+                "background": "#EDE7F6", "border": "#efe2e7", "text": "#000000",
+                "selected_background": "#cfbdf0", "selected_border": "#c7b4e9", "selected_text": "#FFFFFF",
+                "pinned_background": "#f1dbea", "pinned_selected_background": "#eecbe3",
+                "separator": "#e0e0e0"
+            },
+            
             "search_bar": "background-color: #d9cdf0; padding-left: 10px; border: 0.5px solid #efe2e7; border-radius: 4px; color: #686274;",
             
             "editor_container": "background-color: #FFFFFF; border-radius: 8px; border: 0.5px solid #efe2e7; box-shadow: 0 2px 4px rgba(248, 241, 243, 0.3);",
@@ -263,6 +270,13 @@ def get_theme(theme_name):
                 }
             """,
             
+            "note_row": {
+                "background": "#3C3C3C", "border": "#3C3C3C", "text": "#CCCCCC",
+                "selected_background": "#5C5C5C", "selected_border": "#3C3C3C", "selected_text": "#FFFFFF",
+                "pinned_background": "#484444", "pinned_selected_background": "#858585",
+                "separator": "#444444"
+            },
+            
             "search_bar": "background-color: #2D2D2D; padding-left: 10px; border: 0.2px solid #3C3C3C; border-radius: 4px; color: #CCCCCC;",
             
             "editor_container": "background-color: #2D2D2D; border-radius: 8px; border: 0.2px solid #3C3C3C; box-shadow: 0 2px 4px rgba(248, 241, 243, 0.3);",